@@ -0,0 +1,72 @@
+"""
+Measure how building and encoding a large personalized campaign scales with the number of worker processes used by
+`ProcessCampaignSender`, and the end-to-end time for sending it to the local stand-in.
+
+    python benchmarks/campaign_encoding.py --messages 200000 --processes 0 1 2 4
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intellipush.campaign import ProcessCampaignSender  # noqa: E402
+from intellipush.client import Intellipush  # noqa: E402
+from intellipush.messages import SMS  # noqa: E402
+
+from standin import StandinServer  # noqa: E402
+
+
+def personalize(sms, receiver):
+    return 'Hi customer %s! %s' % (receiver[1][-4:], sms.text_message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--processes', type=int, nargs='+', default=[0, 1, 2, 4])
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--send', action='store_true', help='also send the campaign to the stand-in')
+    args = parser.parse_args()
+
+    smses = [
+        SMS(
+            message='Your appointment at Example Clinic is tomorrow at 10:00. Reply STOP to opt out.',
+            receivers=[('0047', str(90000000 + index)) for index in range(start, min(start + 100, args.messages))],
+        )
+        for start in range(0, args.messages, 100)
+    ]
+    baseline = None
+
+    for processes in args.processes:
+        sender = ProcessCampaignSender(None, processes=processes, chunk_size=args.chunk_size, personalize=personalize)
+
+        started = time.perf_counter()
+        size = sum(len(body) for body in sender.encoded_chunks(smses))
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+
+        line = '{0:>2} processes   encoded {1:10.1f} KiB in {2:8.1f} ms   speedup {3:5.2f}x'.format(
+            processes,
+            size / 1024,
+            elapsed * 1000,
+            baseline / elapsed,
+        )
+
+        if args.send:
+            server = StandinServer().start()
+            sender.client = Intellipush(key='key', secret='secret', base_url=server.base_url)
+
+            started = time.perf_counter()
+            rows = sender.send_smses(smses)
+            line += '   sent in {0:8.1f} ms'.format((time.perf_counter() - started) * 1000)
+
+            assert len(rows) == args.messages
+            server.shutdown()
+
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
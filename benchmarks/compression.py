@@ -0,0 +1,54 @@
+"""
+Measure bytes on the wire and end-to-end time for large `createBatch` requests with and without request body
+compression, against the local stand-in with a simulated constrained upload link.
+
+    python benchmarks/compression.py --messages 20000 --bandwidth 2000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intellipush.client import Intellipush  # noqa: E402
+from intellipush.messages import SMS  # noqa: E402
+
+from standin import StandinServer  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--bandwidth', type=float, default=2000000, help='simulated upload bandwidth in bytes/second')
+    args = parser.parse_args()
+
+    smses = [
+        SMS(
+            message='Hi! Your appointment at Example Clinic is tomorrow at 10:00. Reply STOP to opt out.',
+            receivers=[('0047', str(90000000 + index))],
+        )
+        for index in range(args.messages)
+    ]
+
+    for compression in (None, 'deflate', 'gzip'):
+        server = StandinServer(bandwidth=args.bandwidth, compress_responses=True).start()
+        client = Intellipush(key='key', secret='secret', base_url=server.base_url, compression=compression)
+
+        started = time.perf_counter()
+        rows = client.send_smses(smses)
+        elapsed = time.perf_counter() - started
+
+        assert len(rows) == args.messages
+        print('{0:<8} uploaded {1:10.1f} KiB   downloaded {2:10.1f} KiB   {3:8.1f} ms'.format(
+            compression or 'none',
+            server.bytes_received / 1024,
+            server.bytes_sent / 1024,
+            elapsed * 1000,
+        ))
+
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
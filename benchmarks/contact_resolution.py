@@ -0,0 +1,62 @@
+"""
+Measure resolving many phone numbers to contacts with `Intellipush.contacts_by_phone` against the local stand-in,
+compared to one `contact()` call after the other, and again with the numbers served from a `ContactCache`.
+
+    python benchmarks/contact_resolution.py --numbers 50000 --workers 32 --delay 0.01
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intellipush.client import Intellipush  # noqa: E402
+from intellipush.contactcache import ContactCache  # noqa: E402
+from intellipush.transports import RequestsTransport  # noqa: E402
+
+from standin import StandinServer  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--numbers', type=int, default=50000)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--delay', type=float, default=0.01, help='stand-in delay before each response in seconds')
+    parser.add_argument('--sequential', type=int, default=500, help='numbers to look up one by one for comparison')
+    args = parser.parse_args()
+
+    server = StandinServer(delay=args.delay).start()
+    client = Intellipush(
+        key='key',
+        secret='secret',
+        base_url=server.base_url,
+        transport=RequestsTransport(pool_size=args.workers),
+        contact_cache=ContactCache(),
+    )
+    # Every number is given twice, as recipients lists often repeat numbers
+    numbers = [('0047', str(90000000 + index % args.numbers)) for index in range(args.numbers * 2)]
+
+    uncached = Intellipush(key='key', secret='secret', base_url=server.base_url)
+    started = time.perf_counter()
+
+    for countrycode, phonenumber in numbers[:args.sequential]:
+        uncached.contact(countrycode=countrycode, phonenumber=phonenumber)
+
+    sequential = (time.perf_counter() - started) / args.sequential
+    print('one by one      {0:8.2f} s (estimated from {1} numbers)'.format(sequential * args.numbers, args.sequential))
+
+    for label in ('concurrent', 'cached'):
+        requests = server.requests
+        started = time.perf_counter()
+        contacts = client.contacts_by_phone(numbers, max_workers=args.workers)
+        elapsed = time.perf_counter() - started
+
+        assert len(contacts) == args.numbers
+        print('{0:<15} {1:8.2f} s   {2} requests'.format(label, elapsed, server.requests - requests))
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
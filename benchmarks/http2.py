@@ -0,0 +1,242 @@
+"""
+Compare the HTTP/2 transport (`HTTP2Transport`) with the pooled HTTP/1.1 transports for concurrent single message
+sends against local stand-ins, reporting the number of connections opened, the latency and the throughput.
+
+    python benchmarks/http2.py --requests 2000 --concurrency 64 --delay 0.01
+
+Requires `pip install httpx[http2]` - the HTTP/2 stand-in is built on `h2`.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intellipush.capture import percentile  # noqa: E402
+from intellipush.client import Intellipush  # noqa: E402
+from intellipush.messages import SMS  # noqa: E402
+from intellipush.transports import HTTP2Transport, HTTPClientTransport, RequestsTransport  # noqa: E402
+
+from standin import StandinAPI, StandinServer  # noqa: E402
+
+
+class H2StandinServer(StandinAPI):
+    """
+    The stand-in API served over cleartext HTTP/2 (prior knowledge, no upgrade), with every stream answered from an
+    asyncio event loop in a background thread.
+    """
+    def __init__(self, address=('127.0.0.1', 0), delay=0.0):
+        StandinAPI.__init__(self)
+        self.address = address
+        self.delay = delay
+        self.server_address = None
+        self._started = threading.Event()
+
+    def start(self):
+        thread = threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True)
+        thread.start()
+        self._started.wait()
+        return self
+
+    async def _serve(self):
+        loop = asyncio.get_running_loop()
+        server = await loop.create_server(lambda: _H2Protocol(self), *self.address)
+        self.server_address = server.sockets[0].getsockname()
+        self._started.set()
+
+        async with server:
+            await server.serve_forever()
+
+
+class _H2Protocol(asyncio.Protocol):
+    def __init__(self, server):
+        import h2.config
+        import h2.connection
+
+        self.server = server
+        self.connection = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=False, header_encoding='utf-8'),
+        )
+        self.transport = None
+        self.streams = {}
+        self.windows = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.opened_connection()
+        self.connection.initiate_connection()
+        self.transport.write(self.connection.data_to_send())
+
+    def data_received(self, data):
+        import h2.events
+        import h2.exceptions
+
+        try:
+            events = self.connection.receive_data(data)
+        except h2.exceptions.ProtocolError:
+            self.transport.write(self.connection.data_to_send())
+            self.transport.close()
+            return
+
+        for event in events:
+            if isinstance(event, h2.events.RequestReceived):
+                self.streams[event.stream_id] = (dict(event.headers), bytearray())
+            elif isinstance(event, h2.events.DataReceived):
+                self.streams[event.stream_id][1].extend(event.data)
+                self.connection.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+            elif isinstance(event, h2.events.StreamEnded):
+                headers, body = self.streams.pop(event.stream_id)
+                asyncio.ensure_future(self.respond(event.stream_id, headers, bytes(body)))
+            elif isinstance(event, h2.events.WindowUpdated):
+                # A connection level update (stream 0) can unblock any stream
+                for stream_id, waiter in list(self.windows.items()):
+                    if event.stream_id in (0, stream_id):
+                        waiter.set()
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                self.transport.close()
+
+        self.transport.write(self.connection.data_to_send())
+
+    def connection_lost(self, exc):
+        for waiter in self.windows.values():
+            waiter.set()
+
+    async def respond(self, stream_id, headers, body):
+        self.server.bytes_received += len(body)
+        encoding = headers.get('content-encoding')
+
+        if encoding in ('gzip', 'deflate'):
+            body = zlib.decompress(body, 31 if encoding == 'gzip' else 15)
+
+        if self.server.delay:
+            await asyncio.sleep(self.server.delay)
+
+        endpoint = headers[':path'].split('/api/', 1)[-1]
+        payload = self.server.respond(endpoint, urllib.parse.parse_qs(body.decode('utf-8')))
+
+        if not isinstance(payload, bytes):
+            payload = json.dumps(payload).encode('utf-8')
+
+        self.server.bytes_sent += len(payload)
+        self.connection.send_headers(stream_id, [
+            (':status', '200'),
+            ('content-type', 'application/json'),
+            ('content-length', str(len(payload))),
+        ])
+
+        # Send the body as the flow control windows allow, waiting for the client to open them up again
+        while payload and not self.transport.is_closing():
+            size = min(
+                len(payload),
+                self.connection.local_flow_control_window(stream_id),
+                self.connection.max_outbound_frame_size,
+            )
+
+            if size <= 0:
+                self.transport.write(self.connection.data_to_send())
+                waiter = self.windows[stream_id] = asyncio.Event()
+                await waiter.wait()
+                del self.windows[stream_id]
+                continue
+
+            self.connection.send_data(stream_id, payload[:size])
+            payload = payload[size:]
+
+        if not self.transport.is_closing():
+            self.connection.end_stream(stream_id)
+            self.transport.write(self.connection.data_to_send())
+
+
+def run_threads(client, count, concurrency):
+    latencies = []
+
+    def send(index):
+        started = time.perf_counter()
+        client.send_sms(SMS(message='Your code is %06d' % index, receivers=[('0047', str(90000000 + index))]))
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(send, range(count)))
+
+    return time.perf_counter() - started, latencies
+
+
+def run_async(client, count, concurrency):
+    latencies = []
+
+    async def send(index, semaphore):
+        async with semaphore:
+            started = time.perf_counter()
+            await client.send_sms_async(
+                SMS(message='Your code is %06d' % index, receivers=[('0047', str(90000000 + index))]),
+            )
+            latencies.append(time.perf_counter() - started)
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+        await asyncio.gather(*(send(index, semaphore) for index in range(count)))
+        await client.transport.aclose()
+
+    started = time.perf_counter()
+    asyncio.run(run())
+    return time.perf_counter() - started, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=64, help='number of requests in flight')
+    parser.add_argument('--delay', type=float, default=0.01, help='seconds the stand-ins wait before each response')
+    parser.add_argument('--http2-connections', type=int, default=1, help='pool size of the HTTP/2 transport')
+    args = parser.parse_args()
+
+    try:
+        HTTP2Transport._httpx()
+    except ImportError as e:
+        sys.exit(str(e))
+
+    cases = (
+        ('requests (HTTP/1.1)', StandinServer, lambda: RequestsTransport(pool_size=args.concurrency), run_threads),
+        ('http.client (HTTP/1.1)', StandinServer, lambda: HTTPClientTransport(pool_size=args.concurrency), run_threads),
+        (
+            'httpx (HTTP/2, threads)',
+            H2StandinServer,
+            lambda: HTTP2Transport(pool_size=args.http2_connections, prior_knowledge=True),
+            run_threads,
+        ),
+        (
+            'httpx (HTTP/2, asyncio)',
+            H2StandinServer,
+            lambda: HTTP2Transport(pool_size=args.http2_connections, prior_knowledge=True),
+            run_async,
+        ),
+    )
+
+    print('%-24s %12s %12s %12s %12s' % ('transport', 'connections', 'p50 ms', 'p99 ms', 'requests/s'))
+
+    for name, server_class, transport, run in cases:
+        server = server_class(delay=args.delay).start()
+        client = Intellipush(key='key', secret='secret', base_url=server.base_url, transport=transport())
+        seconds, latencies = run(client, args.requests, args.concurrency)
+        latencies.sort()
+
+        print('%-24s %12d %12.2f %12.2f %12.0f' % (
+            name,
+            server.connections,
+            percentile(latencies, 0.5) * 1000,
+            percentile(latencies, 0.99) * 1000,
+            args.requests / seconds,
+        ))
+
+
+if __name__ == '__main__':
+    main()
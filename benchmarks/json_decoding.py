@@ -0,0 +1,76 @@
+"""
+Compare JSON decoding strategies for large `createBatch` responses served by the local stand-in: the standard library
+decoder, `orjson` (if installed) and incremental decoding through `send_smses_iter`, which makes the first rows
+available before the whole response has been received.
+
+    python benchmarks/json_decoding.py --rows 10000 100000
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intellipush.client import Intellipush  # noqa: E402
+from intellipush.utils import fast_json_loads  # noqa: E402
+
+from standin import StandinServer  # noqa: E402
+
+
+def timed(func, runs):
+    timings = []
+
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    server = StandinServer().start()
+    decoders = [('json', json.loads)]
+
+    if fast_json_loads() is not json.loads:
+        decoders.append(('orjson', fast_json_loads()))
+
+    for rows in args.rows:
+        server.synthetic_batch(rows)
+        data = {'rows': str(rows)}
+
+        for name, loads in decoders:
+            client = Intellipush(key='key', secret='secret', base_url=server.base_url, json_loads=loads)
+            total = timed(lambda: client._post('synthetic/batch', data=dict(data), expect_list_return=True), args.runs)
+            print('{0:>7} rows  {1:<16} total {2:8.1f} ms'.format(rows, name, total * 1000))
+
+        client = Intellipush(key='key', secret='secret', base_url=server.base_url)
+        first_rows = []
+
+        def streamed():
+            started = time.perf_counter()
+            rows_iter = client._post_stream('synthetic/batch', data=dict(data))
+            next(rows_iter)
+            first_rows.append(time.perf_counter() - started)
+
+            for _ in rows_iter:
+                pass
+
+        total = timed(streamed, args.runs)
+        print('{0:>7} rows  {1:<16} total {2:8.1f} ms   first row {3:6.1f} ms'.format(
+            rows, 'streamed (json)', total * 1000, statistics.median(first_rows) * 1000,
+        ))
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Measure how long transactional messages wait while a large campaign is being sent, with every send sharing one lane
+compared to separate priority lanes in `PriorityDispatcher`, against the local stand-in.
+
+    python benchmarks/priority_lanes.py --campaign 20000 --urgent 50 --delay 0.05
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intellipush.client import Intellipush  # noqa: E402
+from intellipush.dispatch import Lane, PriorityDispatcher  # noqa: E402
+from intellipush.messages import SMS  # noqa: E402
+from intellipush.transports import RequestsTransport  # noqa: E402
+
+from standin import StandinServer  # noqa: E402
+
+
+def run(client, lanes, args):
+    smses = [
+        SMS(message='Campaign message', receivers=[('0047', str(90000000 + index))])
+        for index in range(args.campaign)
+    ]
+    urgent_lane = lanes[0].name
+
+    with PriorityDispatcher(client, lanes=lanes, max_workers=args.workers, chunk_size=args.chunk_size) as dispatcher:
+        campaign = dispatcher.send_smses(smses, lane=lanes[-1].name)
+        latencies = []
+
+        for index in range(args.urgent):
+            started = time.perf_counter()
+            sms = SMS(message='Your code is %04d' % index, receivers=[('0047', '40000000')])
+            dispatcher.send_sms(sms, lane=urgent_lane).result()
+            latencies.append(time.perf_counter() - started)
+            time.sleep(args.interval)
+
+        campaign.result()
+
+    latencies.sort()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--campaign', type=int, default=20000, help='number of campaign messages')
+    parser.add_argument('--urgent', type=int, default=50, help='number of transactional messages')
+    parser.add_argument('--interval', type=float, default=0.02, help='seconds between transactional messages')
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--delay', type=float, default=0.05, help='stand-in delay before each response in seconds')
+    args = parser.parse_args()
+
+    server = StandinServer(delay=args.delay).start()
+    client = Intellipush(
+        key='key',
+        secret='secret',
+        base_url=server.base_url,
+        transport=RequestsTransport(pool_size=args.workers),
+    )
+
+    for label, lanes in (
+        ('shared lane', (Lane('shared', 0, args.workers, None), )),
+        ('priority lanes', (Lane('transactional', 0, args.workers, None), Lane('bulk', 1, args.workers - 2, None))),
+    ):
+        latencies = run(client, lanes, args)
+        print('{0:<16} transactional latency   p50 {1:8.1f} ms   p95 {2:8.1f} ms   max {3:8.1f} ms'.format(
+            label,
+            latencies[len(latencies) // 2] * 1000,
+            latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+            latencies[-1] * 1000,
+        ))
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
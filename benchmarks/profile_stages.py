@@ -0,0 +1,69 @@
+"""
+Profile a mix of single and batch sends against the local stand-in and print where the time goes for each endpoint
+(see `intellipush.profiling.StageProfiler`), optionally writing collapsed stacks for a flamegraph.
+
+    python benchmarks/profile_stages.py --transport http.client --collapsed stages.folded
+    flamegraph.pl stages.folded > stages.svg
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intellipush.client import Intellipush  # noqa: E402
+from intellipush.messages import SMS  # noqa: E402
+from intellipush.profiling import StageProfiler  # noqa: E402
+from intellipush.transports import HTTPClientTransport, RequestsTransport  # noqa: E402
+
+from standin import StandinServer  # noqa: E402
+
+
+TRANSPORTS = {
+    'requests': RequestsTransport,
+    'http.client': HTTPClientTransport,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--singles', type=int, default=200, help='number of single message sends')
+    parser.add_argument('--batches', type=int, default=20, help='number of batch sends')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--transport', choices=sorted(TRANSPORTS), default='requests')
+    parser.add_argument('--compression', choices=('gzip', 'deflate'), default=None)
+    parser.add_argument('--collapsed', help='write collapsed stacks to this file')
+    args = parser.parse_args()
+
+    server = StandinServer().start()
+    profiler = StageProfiler()
+    client = Intellipush(
+        key='key',
+        secret='secret',
+        base_url=server.base_url,
+        transport=TRANSPORTS[args.transport](),
+        compression=args.compression,
+        profiler=profiler,
+    )
+
+    for index in range(args.singles):
+        client.send_sms(SMS(message='Your code is %06d' % index, receivers=[('0047', str(90000000 + index))]))
+
+    for _ in range(args.batches):
+        client.send_smses([
+            SMS(
+                message='Your appointment at Example Clinic is tomorrow at 10:00. Reply STOP to opt out.',
+                receivers=[('0047', str(90000000 + index)) for index in range(args.batch_size)],
+            ),
+        ])
+
+    print(profiler.format_table())
+
+    if args.collapsed:
+        profiler.write_collapsed(args.collapsed)
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
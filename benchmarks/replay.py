@@ -0,0 +1,83 @@
+"""
+Replay captured SDK traffic (see `intellipush.capture.TrafficRecorder`) against the local stand-in, or any other
+base URL, and print the latency distribution for each endpoint. Without a capture file, a synthetic one is recorded
+against the stand-in first.
+
+    python benchmarks/replay.py --capture traffic.jsonl.gz --speed 10
+    python benchmarks/replay.py --requests 2000 --speed max
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intellipush.capture import TrafficRecorder, replay  # noqa: E402
+from intellipush.client import Intellipush  # noqa: E402
+from intellipush.messages import SMS  # noqa: E402
+
+from standin import StandinServer  # noqa: E402
+
+
+def record_synthetic(path, base_url, requests):
+    with TrafficRecorder(path) as recorder:
+        client = Intellipush(key='key', secret='secret', base_url=base_url, recorder=recorder)
+
+        for index in range(requests):
+            if index % 10 == 0:
+                client.send_smses([
+                    SMS(message='Batch message', receivers=[('0047', str(90000000 + i)) for i in range(100)]),
+                ])
+            else:
+                client.send_sms(SMS(message='Single message', receivers=[('0047', str(90000000 + index))]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--capture', help='capture file to replay (a synthetic capture is recorded if not given)')
+    parser.add_argument('--requests', type=int, default=1000, help='number of requests in the synthetic capture')
+    parser.add_argument('--base-url', help='base URL to replay against (the local stand-in if not given)')
+    parser.add_argument('--speed', default='max', help='multiplier for the recorded pace, or "max"')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--delay', type=float, default=0.0, help='stand-in delay before each response in seconds')
+    args = parser.parse_args()
+
+    server = StandinServer(delay=args.delay).start()
+    base_url = args.base_url or server.base_url
+    capture = args.capture
+
+    if not capture:
+        capture = os.path.join(tempfile.mkdtemp(), 'capture.jsonl')
+        record_synthetic(capture, server.base_url, args.requests)
+
+    speed = None if args.speed == 'max' else float(args.speed)
+    report = replay(capture, base_url, speed=speed, max_workers=args.workers)
+
+    print('{0} requests ({1} errors) in {2:.2f} s - {3:.0f} requests/s, up to {4:.1f} ms behind schedule'.format(
+        report['requests'],
+        report['errors'],
+        report['seconds'],
+        report['requests'] / report['seconds'] if report['seconds'] else 0,
+        report['max_lag'] * 1000,
+    ))
+    print('{0:<36} {1:>7} {2:>9} {3:>9} {4:>9} {5:>9} {6:>9}'.format(
+        'endpoint', 'count', 'mean ms', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms',
+    ))
+
+    for endpoint, latency in sorted(report['latency'].items()):
+        print('{0:<36} {1:>7} {2:9.2f} {3:9.2f} {4:9.2f} {5:9.2f} {6:9.2f}'.format(
+            endpoint,
+            latency['count'],
+            latency['mean'] * 1000,
+            latency['p50'] * 1000,
+            latency['p90'] * 1000,
+            latency['p99'] * 1000,
+            latency['max'] * 1000,
+        ))
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Measure the client-side overhead of a single API call - building, encoding and handling a request - with a transport
+that answers instantly without touching the network, comparing the prepared request templates (see
+`Intellipush._template`) with building the URL, headers and default parameters for every call.
+
+    python benchmarks/request_overhead.py --calls 200000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intellipush.client import Intellipush  # noqa: E402
+from intellipush.transports import Response  # noqa: E402
+from intellipush.utils import php_encode  # noqa: E402
+
+
+class NullTransport:
+    exceptions = ()
+    pool_size = 1
+
+    def __init__(self):
+        self.response = Response(200, 'OK', b'{"success": true, "data": {"id": 1}}')
+
+    def post(self, url, data, headers=None, timings=None):
+        return self.response
+
+
+class RebuildingIntellipush(Intellipush):
+    """
+    The client as it was before request templates - the default parameters are merged into the data and encoded, and
+    the URL and headers are built, on every call.
+    """
+    def _post(self, endpoint, data=None, expect_list_return=False):
+        data = dict(data or {})
+        data.update(self._default_parameters())
+        self.last_error_message = None
+        self.last_error_code = None
+        body = php_encode(data).encode('utf-8')
+        response = self.transport.post(url=self._url(endpoint), data=body, headers={'Accept-Encoding': 'gzip, deflate'})
+        return self._handle_response(endpoint, response, expect_list_return)
+
+
+def measure(client, calls):
+    started = time.perf_counter()
+
+    for index in range(calls):
+        client.fetch_sms(sms_id=index)
+
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=100000)
+    parser.add_argument('--runs', type=int, default=3, help='the fastest run is reported')
+    args = parser.parse_args()
+
+    for name, client_class in (('rebuilt per call', RebuildingIntellipush), ('template', Intellipush)):
+        client = client_class(key='key', secret='secret', transport=NullTransport())
+        seconds = min(measure(client, args.calls) for _ in range(args.runs))
+        print('%-18s %8.2f µs/call' % (name, seconds / args.calls * 1e6))
+
+
+if __name__ == '__main__':
+    main()
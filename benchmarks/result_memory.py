@@ -0,0 +1,74 @@
+"""
+Compare the peak memory used for the response rows of a large campaign when `send_smses` returns them as a list and
+when they're streamed to a `BatchResultStore`, against the local stand-in.
+
+    python benchmarks/result_memory.py --messages 200000 --chunk-size 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intellipush.client import Intellipush  # noqa: E402
+from intellipush.messages import SMS  # noqa: E402
+from intellipush.results import BatchResultStore  # noqa: E402
+
+from standin import StandinServer  # noqa: E402
+
+
+def campaign(messages):
+    for index in range(messages):
+        yield SMS(message='Your appointment is tomorrow at 10:00.', receivers=[('0047', str(90000000 + index))])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    server = StandinServer().start()
+    client = Intellipush(key='key', secret='secret', base_url=server.base_url)
+    path = os.path.join(tempfile.mkdtemp(), 'results.jsonl')
+
+    def in_memory():
+        rows = []
+        chunk = []
+
+        for sms in campaign(args.messages):
+            chunk.append(sms)
+
+            if len(chunk) >= args.chunk_size:
+                rows.extend(client.send_smses(chunk))
+                chunk = []
+
+        if chunk:
+            rows.extend(client.send_smses(chunk))
+
+        return len(rows)
+
+    def on_disk():
+        with BatchResultStore(path) as store:
+            store.send_smses(client, campaign(args.messages), chunk_size=args.chunk_size)
+            return store.total
+
+    for label, func in (('list', in_memory), ('result store', on_disk)):
+        tracemalloc.start()
+        started = time.perf_counter()
+        rows = func()
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        assert rows == args.messages
+        print('{0:<14} peak {1:9.1f} MiB   {2:8.2f} s'.format(label, peak / 1024 / 1024, elapsed))
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+A local stand-in for the Intellipush API used by the benchmarks. It accepts the same form encoded requests as the
+real API and answers with responses of the same shape, without sending anything anywhere.
+
+Run it directly to keep a stand-in running for manual testing:
+
+    python benchmarks/standin.py --port 8765
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import urllib.parse
+import zlib
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+BATCH_INDEX = re.compile(r'^batch\[(\d+)\]\[')
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # The headers and the body are written separately - without this, Nagle's algorithm holds the body back until the
+    # client acknowledges the headers, adding a delayed ACK (~40 ms) to every small response
+    disable_nagle_algorithm = True
+    delay = 0.0
+    bandwidth = None
+    compress_responses = False
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        self.server.bytes_received += length
+
+        if self.bandwidth:
+            # Simulate a constrained link by charging for the bytes transferred
+            time.sleep(length / self.bandwidth)
+
+        encoding = self.headers.get('Content-Encoding')
+
+        if encoding in ('gzip', 'deflate'):
+            body = zlib.decompress(body, 31 if encoding == 'gzip' else 15)
+
+        endpoint = self.path.split('/api/', 1)[-1]
+        fields = urllib.parse.parse_qs(body.decode('utf-8'))
+
+        if self.delay:
+            time.sleep(self.delay)
+
+        payload = self.server.respond(endpoint, fields)
+
+        if not isinstance(payload, bytes):
+            payload = json.dumps(payload).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+
+        if self.compress_responses and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+            payload = compressor.compress(payload) + compressor.flush()
+            self.send_header('Content-Encoding', 'gzip')
+
+        self.server.bytes_sent += len(payload)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def setup(self):
+        super().setup()
+        self.server.opened_connection()
+
+    def log_message(self, *args):
+        pass
+
+
+class StandinAPI:
+    """
+    The responses of the stand-in, independent of the protocol they're served over.
+    """
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self._synthetic = {}
+        self._ids = iter(range(1, 1 << 62))
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return 'http://%s:%d/api' % self.server_address[:2]
+
+    def opened_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def respond(self, endpoint, fields):
+        with self._lock:
+            self.requests += 1
+
+            if endpoint == 'notification/createBatch':
+                rows = {int(match.group(1)) for match in map(BATCH_INDEX.match, fields) if match}
+                return [self._notification(fields, 'batch[%d]' % index) for index in sorted(rows)]
+
+            if endpoint == 'synthetic/batch':
+                return self.synthetic_batch(int(fields['rows'][0]))
+
+            if endpoint == 'contact/getContactByPhoneNumber':
+                return {'success': True, 'data': self._contact_by_phone(fields)}
+
+            if endpoint == 'notification/createNotification':
+                return {'success': True, 'data': self._notification(fields)['data']}
+
+        return {'success': True, 'data': {'id': next(self._ids)}}
+
+    def synthetic_batch(self, rows):
+        """
+        A pre-encoded `createBatch` response with `rows` rows (every 100th row is an error), for benchmarking response
+        handling without paying for encoding a matching request.
+        """
+        if rows not in self._synthetic:
+            self._synthetic[rows] = json.dumps([
+                {'success': False, 'errorcode': 5, 'status_message': 'Invalid phone number'} if index % 100 == 99 else {
+                    'success': True,
+                    'data': {
+                        'id': str(10000000 + index),
+                        'text_message': 'Your appointment is tomorrow at 10:00. Reply STOP to opt out.',
+                        'single_target_countrycode': '0047',
+                        'single_target': str(90000000 + index),
+                        'method': 'sms',
+                        'timetosend': '2030-01-01 10:00',
+                    },
+                }
+                for index in range(rows)
+            ]).encode('utf-8')
+
+        return self._synthetic[rows]
+
+    def _contact_by_phone(self, fields):
+        # Every other number has a contact
+        phonenumber = fields['phonenumber'][0]
+
+        if int(phonenumber[-1:] or 0) % 2:
+            return []
+
+        return [{
+            'id': int(phonenumber),
+            'name': 'Contact ' + phonenumber,
+            'countrycode': fields['countrycode'][0],
+            'phonenumber': phonenumber,
+        }]
+
+    def _notification(self, fields, prefix=None):
+        def field(name):
+            key = '%s[%s]' % (prefix, name) if prefix else name
+            return fields.get(key, [None])[0]
+
+        return {
+            'success': True,
+            'data': {
+                'id': next(self._ids),
+                'text_message': field('text_message'),
+                'single_target_countrycode': field('single_target_countrycode'),
+                'single_target': field('single_target'),
+                'method': 'sms',
+            },
+        }
+
+
+class StandinServer(StandinAPI, ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 resets connections when many clients connect at once
+    request_queue_size = 128
+
+    def __init__(self, address=('127.0.0.1', 0), delay=0.0, bandwidth=None, compress_responses=False):
+        """
+        :param address: Address to listen on - a random port on localhost by default
+        :param delay: Seconds to wait before each response
+        :param bandwidth: Simulated upload bandwidth in bytes per second (None for unlimited)
+        :param compress_responses: Compress responses with gzip for clients that accept it
+        """
+        handler = type('Handler', (StandinHandler, ), {
+            'delay': delay,
+            'bandwidth': bandwidth,
+            'compress_responses': compress_responses,
+        })
+        StandinAPI.__init__(self)
+        ThreadingHTTPServer.__init__(self, address, handler)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds to wait before each response')
+    parser.add_argument('--bandwidth', type=float, default=None, help='simulated upload bandwidth in bytes/second')
+    parser.add_argument('--compress-responses', action='store_true', help='gzip responses when accepted')
+    args = parser.parse_args()
+
+    server = StandinServer(
+        ('127.0.0.1', args.port),
+        delay=args.delay,
+        bandwidth=args.bandwidth,
+        compress_responses=args.compress_responses,
+    )
+    print('Serving a stand-in API at ' + server.base_url)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
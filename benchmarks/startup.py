@@ -0,0 +1,57 @@
+"""
+Measure the cost of `import intellipush.client` in a fresh interpreter - wall time and memory allocated during the
+import - and list which heavy modules end up being loaded.
+
+    python benchmarks/startup.py --runs 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+PROBE = '''
+import json, sys, time, tracemalloc
+tracemalloc.start()
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+current, peak = tracemalloc.get_traced_memory()
+heavy = [name for name in ('requests', 'urllib3', 'ssl', 'http.client', 'concurrent.futures', 'sqlite3') if name in sys.modules]
+print(json.dumps({{'seconds': elapsed, 'peak_bytes': peak, 'loaded': heavy}}))
+'''
+
+
+def measure(module, runs):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = []
+
+    for _ in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, '-c', PROBE.format(module=module)],
+            cwd=root,
+        )
+        results.append(json.loads(output))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    for module in ('intellipush.messages', 'intellipush.client', 'requests'):
+        results = measure(module, args.runs)
+        print('{0:<24} median {1:7.2f} ms   peak {2:8.1f} KiB   loaded: {3}'.format(
+            module,
+            statistics.median(r['seconds'] for r in results) * 1000,
+            statistics.median(r['peak_bytes'] for r in results) / 1024,
+            ', '.join(results[0]['loaded']) or '-',
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+import collections
+import concurrent.futures
+
+from .client import Intellipush
+from .utils import php_encode
+
+
+# The messages of the campaign, set up once in each worker process by `_initialize_worker`
+_worker_state = {}
+
+
+def _initialize_worker(smses, personalize):
+    _worker_state['pairs'] = [(sms, receiver) for sms in smses for receiver in sms.receivers]
+    _worker_state['personalize'] = personalize
+
+
+def _encode_range(bounds):
+    start, end = bounds
+    personalize = _worker_state['personalize']
+    batch = []
+
+    for sms, receiver in _worker_state['pairs'][start:end]:
+        row = Intellipush._sms_as_post_object(sms=sms, receiver=receiver)
+
+        if personalize:
+            row['text_message'] = personalize(sms, receiver)
+
+        batch.append(row)
+
+    # A bytearray lets `Intellipush._with_defaults` append the credentials in place instead of copying the body
+    return bytearray(php_encode({'batch': batch}).encode('utf-8'))
+
+
+class ProcessCampaignSender:
+    def __init__(self, client, processes=None, chunk_size=1000, max_workers=8, max_pending=None, personalize=None):
+        """
+        Send very large campaigns by building and encoding the batch requests in a pool of worker processes, while
+        the encoded requests are sent from a pool of threads in this process - converting, personalizing and
+        encoding the messages is CPU bound and doesn't scale with threads.
+
+        Each worker receives the messages once when it starts and encodes the ranges of receivers it's given into
+        ready-to-send request bodies. The bodies don't contain the API credentials, which never leave this process.
+        At most `max_pending` batches are encoded or sent ahead of the oldest batch still in flight, so a slow API
+        holds back the encoding instead of piling up encoded requests in memory.
+
+        :param client: The `Intellipush` client to send through
+        :param processes: Number of worker processes (the number of CPUs by default). With 0 the requests are
+               encoded in this process.
+        :param chunk_size: Maximum number of receivers in each batch request
+        :param max_workers: Maximum number of concurrent requests
+        :param max_pending: Maximum number of batches being encoded or sent at the same time (twice `max_workers` by
+               default)
+        :param personalize: Callable receiving an `SMS` object and a `(countrycode, number)` tuple and returning the
+               text message for that receiver. It's called in the worker processes, so it must be picklable (i.e. a
+               function defined at module level).
+        """
+        self.client = client
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.max_pending = max_pending or 2 * max_workers
+        self.personalize = personalize
+
+    def encoded_chunks(self, smses):
+        """
+        Encode a campaign into batch request bodies, without sending them.
+
+        :param smses: list of `SMS` objects (`intellipush.messages.SMS`)
+        :return: generator giving the encoded body (bytes) of each batch request, in order
+        """
+        smses = list(smses)
+        total = sum(len(sms.receivers) for sms in smses)
+        ranges = [(start, min(start + self.chunk_size, total)) for start in range(0, total, self.chunk_size)]
+
+        if self.processes == 0:
+            _initialize_worker(smses, self.personalize)
+
+            try:
+                for bounds in ranges:
+                    yield _encode_range(bounds)
+            finally:
+                _worker_state.clear()
+
+            return
+
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.processes,
+            initializer=_initialize_worker,
+            initargs=(smses, self.personalize),
+        ) as executor:
+            pending = collections.deque()
+
+            for bounds in ranges:
+                if len(pending) >= self.max_pending:
+                    yield pending.popleft().result()
+
+                pending.append(executor.submit(_encode_range, bounds))
+
+            while pending:
+                yield pending.popleft().result()
+
+    def send_smses(self, smses, on_error=None):
+        """
+        Send a campaign as batch requests. Requests are sent as soon as they've been encoded, so encoding and sending
+        overlap.
+
+        A batch that fails doesn't stop the rest of the campaign - its rows are None, and the exception is given to
+        `on_error`.
+
+        :param smses: list of `SMS` objects (`intellipush.messages.SMS`)
+        :param on_error: Callable receiving the offsets of the first and last receiver (exclusive) and the exception
+               for each batch that failed
+        :return: list of response rows, one for each receiver in the order given. The rows for a batch that failed
+                 are None.
+        """
+        smses = list(smses)
+        total = sum(len(sms.receivers) for sms in smses)
+        ranges = [(start, min(start + self.chunk_size, total)) for start in range(0, total, self.chunk_size)]
+        futures = []
+        running = set()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for body in self.encoded_chunks(smses):
+                if len(running) >= self.max_pending:
+                    _, running = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                future = executor.submit(
+                    self.client._post_encoded,
+                    'notification/createBatch',
+                    body,
+                    expect_list_return=True,
+                )
+                futures.append(future)
+                running.add(future)
+
+        results = []
+
+        for future, (start, end) in zip(futures, ranges):
+            try:
+                rows = future.result()
+            except Exception as e:
+                rows = None
+
+                if on_error is not None:
+                    on_error(start, end, e)
+
+            results.extend(rows or [None] * (end - start))
+
+        return results
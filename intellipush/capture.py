@@ -0,0 +1,191 @@
+import concurrent.futures
+import gzip
+import json
+import re
+import threading
+import time
+import urllib.parse
+
+from .transports import RequestsTransport
+
+
+REDACTED = 'REDACTED'
+SECRET_FIELD = re.compile(r'(^|&)api_secret=[^&]*')
+
+
+def redact(body):
+    """
+    :param body: A form encoded request body (str)
+    :return: The body with the value of `api_secret` replaced by `REDACTED`
+    """
+    return SECRET_FIELD.sub(r'\1api_secret=' + REDACTED, body)
+
+
+class TrafficRecorder:
+    def __init__(self, path):
+        """
+        Record the requests made by a client (given as `recorder` to `Intellipush`) to an append-only file, one JSON
+        object per line with the time the request was made, the endpoint, the encoded request body with the API secret
+        redacted, the response status and body, and the number of seconds the request took. The file is compressed
+        with gzip if `path` ends with `.gz`.
+
+        :param path: Path of the capture file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        if path.endswith('.gz'):
+            self._file = gzip.open(path, 'at', encoding='utf-8')
+        else:
+            self._file = open(path, 'a', encoding='utf-8')
+
+    def record(self, endpoint, body, status, content, timestamp, elapsed):
+        """
+        :param endpoint: The API endpoint queried
+        :param body: The form encoded request body (str or bytes)
+        :param status: The HTTP status of the response (None if no response was received)
+        :param content: The response body (bytes, or None)
+        :param timestamp: When the request was made (seconds since the epoch)
+        :param elapsed: Seconds the request took
+        """
+        if isinstance(body, (bytes, bytearray)):
+            body = body.decode('utf-8')
+
+        line = json.dumps({
+            'timestamp': timestamp,
+            'endpoint': endpoint,
+            'request': redact(body),
+            'status': status,
+            'response': content.decode('utf-8', errors='replace') if content is not None else None,
+            'elapsed': elapsed,
+        }, separators=(',', ':'))
+
+        with self._lock:
+            self._file.write(line + '\n')
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_capture(path):
+    """
+    :param path: Path of a file written by `TrafficRecorder`
+    :return: generator giving each recorded request as a dict
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def percentile(values, fraction):
+    """
+    :param values: Sorted list of numbers
+    :param fraction: The percentile as a fraction (i.e. 0.99)
+    :return: The value at the percentile (nearest rank), or None for an empty list
+    """
+    if not values:
+        return None
+
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+
+def replay(path, base_url, speed=1.0, secret=None, transport=None, max_workers=16):
+    """
+    Send the requests in a capture file again, i.e. against a local stand-in for the API, and report the latencies.
+
+    Requests are sent at the pace they were recorded at, scaled by `speed` (2.0 is twice as fast), or as fast as
+    possible with `speed` set to None. At most `max_workers` requests are in flight at the same time, so requests that
+    are due while every worker is busy are sent late - the longest delay is reported as `max_lag`.
+
+    :param path: Path of a file written by `TrafficRecorder`
+    :param base_url: The base URL to send the requests to (i.e. `http://127.0.0.1:8765/api`)
+    :param speed: Multiplier for the recorded pace, or None for maximum speed
+    :param secret: API secret to put back into the requests (they're sent with the secret redacted if not given)
+    :param transport: The transport to send through (a `RequestsTransport` is created if not given)
+    :param max_workers: Maximum number of concurrent requests
+    :return: dict with the number of `requests` and `errors` (failed requests and responses with status >= 300), the
+             total number of `seconds` taken, the `max_lag` in seconds behind the recorded pace, and the `latency` of
+             the requests to each endpoint (and `all`) as a dict with `count`, `mean`, `p50`, `p90`, `p99` and `max`
+             in seconds
+    """
+    transport = transport or RequestsTransport(pool_size=max_workers)
+    base_url = base_url.rstrip('/')
+
+    def send(entry, due):
+        sent = time.monotonic()
+        body = entry['request']
+
+        if secret is not None:
+            body = body.replace('api_secret=' + REDACTED, 'api_secret=' + urllib.parse.quote_plus(secret))
+
+        try:
+            status = transport.post(url=base_url + '/' + entry['endpoint'], data=body.encode('utf-8')).status_code
+        except transport.exceptions:
+            status = None
+
+        return entry['endpoint'], status, time.monotonic() - sent, sent - due if due is not None else 0.0
+
+    first = None
+    started = time.monotonic()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+
+        for entry in read_capture(path):
+            if first is None:
+                first = entry['timestamp']
+
+            due = None
+
+            if speed:
+                due = started + (entry['timestamp'] - first) / speed
+                delay = due - time.monotonic()
+
+                if delay > 0:
+                    time.sleep(delay)
+
+            futures.append(executor.submit(send, entry, due))
+
+        results = [future.result() for future in futures]
+
+    elapsed = time.monotonic() - started
+    latencies = {'all': []}
+
+    for endpoint, _, seconds, _ in results:
+        latencies.setdefault(endpoint, []).append(seconds)
+        latencies['all'].append(seconds)
+
+    latency = {}
+
+    for endpoint, values in latencies.items():
+        values.sort()
+        latency[endpoint] = {
+            'count': len(values),
+            'mean': sum(values) / len(values) if values else None,
+            'p50': percentile(values, 0.5),
+            'p90': percentile(values, 0.9),
+            'p99': percentile(values, 0.99),
+            'max': values[-1] if values else None,
+        }
+
+    return {
+        'requests': len(results),
+        'errors': sum(1 for _, status, _, _ in results if status is None or status >= 300),
+        'seconds': elapsed,
+        'max_lag': max((lag for _, _, _, lag in results), default=0.0),
+        'latency': latency,
+    }
@@ -1,15 +1,38 @@
-import json as jsonlib
-import requests
+import collections
+import contextlib
+import functools
 import time
 import datetime
 
-from .utils import php_encode
+from .utils import compress, concurrent_map, fast_json_loads, iter_json_array, php_encode
 from .messages import SMS
-from .contacts import Target
+from .contacts import ContactFilter, Target
+from .transports import RequestsTransport
+
+
+# The parts of a request to an endpoint that stay the same between calls - see `Intellipush._template`
+RequestTemplate = collections.namedtuple('RequestTemplate', ('url', 'prefix', 'headers', 'compressed_headers'))
 
 
 class Intellipush:
-    def __init__(self, key, secret, base_url='https://www.intellipush.com/api', version='4.0'):
+    def __init__(self,
+                 key,
+                 secret,
+                 base_url='https://www.intellipush.com/api',
+                 version='4.0',
+                 idempotency_store=None,
+                 session=None,
+                 shorturl_index=None,
+                 transport=None,
+                 json_loads=None,
+                 compression=None,
+                 compression_min_size=16384,
+                 compression_endpoints=None,
+                 recorder=None,
+                 profiler=None,
+                 contact_cache=None,
+                 contact_mirror=None,
+    ):
         """
         Creat a client instance for communicating with Intellipush.
 
@@ -19,6 +42,32 @@ class Intellipush:
         :param secret: Your API secret
         :param base_url: The base URL of the Intellipush API
         :param version: Version of the API that the client should communicate with
+        :param idempotency_store: An `intellipush.idempotency.IdempotencyStore` used to suppress duplicate sends of
+               `SMS` objects that have an `idempotency_key` set. A previous result is returned instead of sending the
+               message again.
+        :param session: A `requests.Session` to send requests through. A session is created for the client if not
+               given, keeping connections to the API open between requests.
+        :param shorturl_index: An `intellipush.shorturls.ShorturlIndex` that `shorturl()` lookups are served from.
+               Shorturls created through `create_shorturl` are added to the index.
+        :param transport: The transport used for HTTP requests - `intellipush.transports.RequestsTransport` (the
+               default, using `session`) or `intellipush.transports.HTTPClientTransport` (standard library only).
+        :param json_loads: Callable used to decode JSON responses. `orjson` is used if it's installed, otherwise the
+               standard library `json` module.
+        :param compression: Compress request bodies with `gzip` or `deflate` (None disables compression). Responses
+               are always requested with compression.
+        :param compression_min_size: Only compress request bodies of at least this many bytes
+        :param compression_endpoints: Only compress requests to these endpoints (i.e. `{'notification/createBatch'}`) -
+               all endpoints if None. An endpoint answering a compressed request with `415 Unsupported Media Type` is
+               retried uncompressed, and isn't compressed again.
+        :param recorder: An `intellipush.capture.TrafficRecorder` that every request and response is recorded to, for
+               replaying the traffic later with `intellipush.capture.replay`
+        :param profiler: An `intellipush.profiling.StageProfiler` that the time spent in each stage of each request is
+               added to
+        :param contact_cache: An `intellipush.contactcache.ContactCache` that contacts looked up by phone number are
+               served from
+        :param contact_mirror: An `intellipush.mirror.ContactMirror` that `contact()` lookups are served from. Contacts
+               created, updated and deleted through the client are updated in the mirror, and contacts that had to be
+               fetched from the API are added to it.
         """
         self.key = key
         self.secret = secret
@@ -28,6 +77,27 @@ class Intellipush:
         self.last_error = None
         self.last_error_code = None
         self.last_error_message = None
+        self.idempotency_store = idempotency_store
+        self.transport = transport or RequestsTransport(session=session)
+        self.json_loads = json_loads or fast_json_loads()
+        self.shorturl_index = shorturl_index
+        self.compression = compression
+        self.compression_min_size = compression_min_size
+        self.compression_endpoints = set(compression_endpoints) if compression_endpoints else None
+        self._uncompressed_endpoints = set()
+        self.recorder = recorder
+        self.profiler = profiler
+        self.contact_cache = contact_cache
+        self.contact_mirror = contact_mirror
+        self._templates = {}
+        self._template_identity = None
+
+    @property
+    def session(self):
+        """
+        The `requests.Session` used by the default transport (None for other transports).
+        """
+        return getattr(self.transport, 'session', None)
 
     def sms(self, countrycode, phonenumber, message):
         """
@@ -59,32 +129,93 @@ class Intellipush:
         if len(sms.receivers) > 1:
             return self.send_smses((sms, ))
 
-        return self._post(
-            'notification/createNotification',
-            data=self._sms_as_post_object(sms=sms),
-        )
+        if self.idempotency_store is not None and sms.idempotency_key is not None:
+            return self._send_idempotent(sms)
 
-    def send_smses(self, smses):
+        with self._stage('notification/createNotification', 'build'):
+            data = self._sms_as_post_object(sms=sms)
+
+        return self._post('notification/createNotification', data=data)
+
+    def send_smses(self, smses, result_store=None):
         """
         Send a batch of messages by giving a list of `SMS` objects (`intellipush.messages.SMS`).
 
         This will deliver a batch / list of messages to the API, reducing the overhead when sending a single message by
         itself. Useful if you need to deliver a large amount of messages at the same time.
 
+        :param smses: iterable giving an `SMS` object for each iteration
+        :param result_store: An `intellipush.results.BatchResultStore` to write the response rows to as they're
+               received, instead of returning them - for batches too large to keep the response in memory
+        :return: Response from the API with metadata about the queued/delivered message(s), or `result_store` if given
+        """
+        if self.idempotency_store is not None:
+            rows = self._send_smses_idempotent(smses)
+
+            if result_store is None:
+                return rows
+
+            result_store.add(rows or [])
+            return result_store
+
+        if result_store is not None:
+            result_store.add(self.send_smses_iter(smses))
+            return result_store
+
+        batch = []
+
+        with self._stage('notification/createBatch', 'build'):
+            for sms in smses:
+                for receiver in sms.receivers:
+                    batch.append(self._sms_as_post_object(sms=sms, receiver=receiver))
+
+        return self._send_batch(batch)
+
+    async def send_sms_async(self, sms):
+        """
+        Send an SMS object from asyncio code, as for `send_sms`. With a transport that supports asyncio (i.e.
+        `intellipush.transports.HTTP2Transport`) many messages can be in flight at the same time over a few
+        connections without a thread for each.
+
+        :param sms: SMS object (`intellipush.messages.SMS`)
+        :return: Response from the API with metadata about the queued/delivered message(s)
+        """
+        if len(sms.receivers) > 1 or (self.idempotency_store is not None and sms.idempotency_key is not None):
+            return await self._run_async(self.send_sms, sms)
+
+        return await self._post_async('notification/createNotification', data=self._sms_as_post_object(sms=sms))
+
+    async def send_smses_async(self, smses):
+        """
+        Send a batch of messages from asyncio code, as for `send_smses`.
+
         :param smses: iterable giving an `SMS` object for each iteration
         :return: Response from the API with metadata about the queued/delivered message(s)
         """
+        if self.idempotency_store is not None:
+            return await self._run_async(self.send_smses, smses)
+
+        batch = [self._sms_as_post_object(sms=sms, receiver=receiver) for sms in smses for receiver in sms.receivers]
+        return await self._post_async('notification/createBatch', data={'batch': batch}, expect_list_return=True)
+
+    def send_smses_iter(self, smses):
+        """
+        Send a batch of messages like `send_smses`, but return the response rows one by one as they're received
+        instead of waiting for the whole response to be transferred and decoded - useful for very large batches.
+
+        If the API rejects the whole batch, the error is returned as a single failed row.
+
+        :param smses: iterable giving an `SMS` object for each iteration
+        :return: generator giving the response row for each message and receiver, in order
+        """
         batch = []
 
-        for sms in smses:
-            for receiver in sms.receivers:
-                batch.append(self._sms_as_post_object(sms=sms, receiver=receiver))
+        with self._stage('notification/createBatch', 'build'):
+            for sms in smses:
+                for receiver in sms.receivers:
+                    batch.append(self._sms_as_post_object(sms=sms, receiver=receiver))
 
-        return self._post(
-            'notification/createBatch',
-            data={'batch': batch},
-            expect_list_return=True,
-        )
+        return self._post_stream('notification/createBatch', data={'batch': batch})
 
     def delete_sms(self, sms_id):
         """
@@ -216,7 +347,20 @@ class Intellipush:
         }
 
         contact.update(kwargs)
-        return self._post('contact/createContact', contact)
+
+        try:
+            created = self._post('contact/createContact', contact)
+        finally:
+            # Invalidate once the change has been made, so a lookup made meanwhile can't cache the old contact
+            if self.contact_cache is not None and countrycode and phonenumber:
+                self.contact_cache.invalidate(number=(str(countrycode), str(phonenumber)))
+
+        if self.contact_mirror is not None and created and created.get('id') is not None:
+            mirrored = {key: value for key, value in contact.items() if value is not None}
+            mirrored.update(created)
+            self.contact_mirror.upsert(mirrored)
+
+        return created
 
     def contact(self, contact_id=None, countrycode=None, phonenumber=None):
         """
@@ -228,22 +372,81 @@ class Intellipush:
         :param phonenumber: Phone number of the contact to retrieve
         :return:
         """
+        if self.contact_mirror is not None and (contact_id or (countrycode and phonenumber)):
+            if contact_id:
+                mirrored = self.contact_mirror.get(contact_id)
+            else:
+                mirrored = self.contact_mirror.by_phone(countrycode, phonenumber)
+
+            if mirrored is not None:
+                return mirrored
+
         if contact_id:
             fetched = self._post('contact/getContact', data={
                 'contact_id': contact_id,
             })
+            contact = fetched[0] if fetched else None
         elif countrycode and phonenumber:
-            fetched = self._post('contact/getContactByPhoneNumber', data={
-                'countrycode': countrycode,
-                'phonenumber': phonenumber,
-            })
+            contact = self._contact_by_phone((str(countrycode), str(phonenumber)))
         else:
             raise IntellipushException('Missing contact_id or (countrycode and phonenumber)')
 
-        if not fetched:
-            return None
+        # Keep a contact the mirror was missing (i.e. created elsewhere since the last sync) for the next lookup
+        if self.contact_mirror is not None and contact and contact.get('id') is not None:
+            self.contact_mirror.upsert(contact)
 
-        return fetched[0]
+        return contact
+
+    def contacts(self, items=50, page=1):
+        """
+        Retrieve the contacts in your Intellipush account, a page at the time.
+
+        :param items: Number of contacts on each page
+        :param page: The current page (1-based)
+        :return: A list of contacts
+        """
+        return self._post('contact/getContacts', data={
+            'items': items,
+            'page': page,
+        })
+
+    def contacts_by_phone(self, numbers, max_workers=8, retries=2):
+        """
+        Look up the contacts for many phone numbers. Duplicate numbers are only looked up once, numbers in the
+        `contact_cache` are served from it, and the rest are looked up concurrently with at most `max_workers`
+        requests in flight. Each request is retried up to `retries` times if it fails or is rejected by the API.
+
+        :param numbers: iterable of `(countrycode, phonenumber)` tuples
+        :param max_workers: Maximum number of concurrent requests
+        :param retries: Number of retries for each failed request
+        :return: A dict mapping each `(countrycode, phonenumber)` tuple (as strings) to its contact, None if there's
+                 no contact with the number, or the exception if the lookup still failed after its retries
+        """
+        numbers = list(dict.fromkeys((str(countrycode), str(phonenumber)) for countrycode, phonenumber in numbers))
+        contacts = {}
+        missing = []
+
+        for number in numbers:
+            if self.contact_cache is not None:
+                found, contact = self.contact_cache.get(number)
+
+                if found:
+                    contacts[number] = contact
+                    continue
+
+            missing.append(number)
+
+        fetched = concurrent_map(
+            lambda number: self._contact_by_phone(number, raise_on_error=True),
+            missing,
+            max_workers=max_workers,
+            retries=retries,
+            retry_on=(ServerSideException, RejectedRequestException) + tuple(self.transport.exceptions),
+            return_exceptions=True,
+        )
+        contacts.update(zip(missing, fetched))
+
+        return {number: contacts[number] for number in numbers}
 
     def delete_contact(self, contact_id):
         """
@@ -252,9 +455,18 @@ class Intellipush:
         :param contact_id: The id of the contact to remove.
         :return: Reponse from the API
         """
-        return self._post('contact/deleteContact', {
-            'contact_id': contact_id,
-        })
+        try:
+            deleted = self._post('contact/deleteContact', {
+                'contact_id': contact_id,
+            })
+        finally:
+            if self.contact_cache is not None:
+                self.contact_cache.invalidate(contact_id=contact_id)
+
+        if self.contact_mirror is not None and deleted is not None:
+            self.contact_mirror.delete(contact_id)
+
+        return deleted
 
     def update_contact(self, contact_id, name=None, countrycode=None, phonenumber=None, email=None, company=None, sex=None, country=None, param1=None, param2=None, param3=None, **kwargs):
         contact = {
@@ -272,7 +484,22 @@ class Intellipush:
         }
 
         contact.update(kwargs)
-        return self._post('contact/updateContact', contact)
+
+        try:
+            updated = self._post('contact/updateContact', contact)
+        finally:
+            if self.contact_cache is not None:
+                self.contact_cache.invalidate(contact_id=contact_id)
+
+                if countrycode and phonenumber:
+                    self.contact_cache.invalidate(number=(str(countrycode), str(phonenumber)))
+
+        if self.contact_mirror is not None and updated is not None:
+            self.contact_mirror.update(contact_id, {
+                key: value for key, value in contact.items() if value is not None and key != 'contact_id'
+            })
+
+        return updated
 
     def create_contact_list(self, name):
         """
@@ -356,11 +583,16 @@ class Intellipush:
         :param contact_list_filter: Filter the contact list by these values (a `intellipush.contacts.ContactFilter`)
         :return:
         """
-        result = self._post('contactlist/getNumberOfFilteredContactsInContactlist', {
+        data = {
             'contactlist_id': contact_list_id,
-        })
+        }
+
+        if contact_list_filter is not None:
+            data['contactlist_filter'] = self._contact_filter_as_post_object(contact_list_filter)
+
+        result = self._post('contactlist/getNumberOfFilteredContactsInContactlist', data)
 
-        if 'amount' in result:
+        if result and 'amount' in result:
             return int(result['amount'])
 
         return None
@@ -396,6 +628,12 @@ class Intellipush:
         if not shorturl_id and not shorturl:
             raise NoValidIDException('Either shorturl_id or shorturl has to be provided')
 
+        if self.shorturl_index is not None:
+            indexed = self.shorturl_index.get(shorturl_id=shorturl_id, shorturl=shorturl)
+
+            if indexed:
+                return indexed
+
         if shorturl_id:
             return self._post('url/getUrlDetailsById', {
                 'url_id': shorturl_id,
@@ -417,25 +655,74 @@ class Intellipush:
         :param target: A `contacts.Target` object that contains information to associate with the shorturl. If a target is given, `parent_url_id` must be set as well.
         :return: Details about the created shorturl
         """
+        return self._create_shorturl(url, parent_url_id=parent_url_id, target=target)
+
+    def _create_shorturl(self, url, parent_url_id=None, target=None, raise_on_error=False):
+        """
+        Create a shorturl as `create_shorturl`, raising `RejectedRequestException` if the API rejects it and
+        `raise_on_error` is set.
+        """
         if target:
             if not isinstance(target, Target):
                 raise TypeError('A `contacts.Target` object is required for the `target` parameter')
 
-            target = self._target_as_post_object(target=target)
-
         if parent_url_id:
-            return self._post('url/generateChildUrl', {
+            created = self._post('url/generateChildUrl', {
                 'long_url': url,
-                'target': target,
+                'target': self._target_as_post_object(target=target) if target else None,
                 'parent_url_id': parent_url_id,
-            })
-
-        if target:
+            }, raise_on_error=raise_on_error)
+        elif target:
             raise InvalidTargetException('A `target` is only valid for child shorturls (when `parent_url_id` is given).')
+        else:
+            created = self._post('url/generateShortUrl', {
+                'long_url': url,
+            }, raise_on_error=raise_on_error)
 
-        return self._post('url/generateShortUrl', {
-            'long_url': url,
-        })
+        if self.shorturl_index is not None:
+            self.shorturl_index.add(created, target=target)
+
+        return created
+
+    def create_child_shorturls(self, url, parent_url_id, targets, max_workers=8, retries=2):
+        """
+        Create a child shorturl for each target in `targets` - i.e. a personal tracking link for each recipient of a
+        campaign. The shorturls are created concurrently, with at most `max_workers` requests in flight, and each
+        request is retried up to `retries` times if it fails or is rejected by the API.
+
+        :param url: The URL to link the shorturls to
+        :param parent_url_id: The ID of the parent shorturl
+        :param targets: iterable of `contacts.Target` objects - duplicates are only created once
+        :param max_workers: Maximum number of concurrent requests
+        :param retries: Number of retries for each failed request
+        :return: A dict mapping each `Target` to its short URL, or to the exception if it still couldn't be created
+                 after its retries
+        """
+        targets = list(dict.fromkeys(targets))
+
+        for target in targets:
+            if not isinstance(target, Target):
+                raise TypeError('A `contacts.Target` object is required for each target')
+
+        def create(target):
+            # The error is taken from the response, since `last_error_message` is shared with the other threads
+            created = self._create_shorturl(url, parent_url_id=parent_url_id, target=target, raise_on_error=True)
+
+            if not created:
+                raise RejectedRequestException('The shorturl was not created')
+
+            return created.get('short_url')
+
+        short_urls = concurrent_map(
+            create,
+            targets,
+            max_workers=max_workers,
+            retries=retries,
+            retry_on=(ServerSideException, RejectedRequestException) + tuple(self.transport.exceptions),
+            return_exceptions=True,
+        )
+
+        return dict(zip(targets, short_urls))
 
     def shorturls(self, items=50, page=1, include_children=False, parent_shorturl_id=None, target=None):
         """
@@ -523,6 +810,154 @@ class Intellipush:
 
         return False
 
+    def _send_idempotent(self, sms):
+        """
+        Send a single message through `createNotification` unless a message with the same `idempotency_key` has been
+        sent within the store's window, in which case the original result is returned.
+        """
+        owner, result = self.idempotency_store.begin(sms.idempotency_key)
+
+        if not owner:
+            # The key might have been used for a batch send earlier, which stores the batch rows instead
+            if isinstance(result, list):
+                return result[0].get('data') if result else None
+
+            return result
+
+        try:
+            result = self._post(
+                'notification/createNotification',
+                data=self._sms_as_post_object(sms=sms),
+            )
+        except Exception:
+            self.idempotency_store.abort(sms.idempotency_key)
+            raise
+
+        if result is None:
+            # The API rejected the message - allow the caller to retry with the same key
+            self.idempotency_store.abort(sms.idempotency_key)
+        else:
+            self.idempotency_store.complete(sms.idempotency_key, result)
+
+        return result
+
+    def _send_smses_idempotent(self, smses):
+        """
+        Batch version of `_send_idempotent`. Messages with a previously seen `idempotency_key` are left out of the
+        batch, and their original rows are spliced into the returned list in place of a new response.
+        """
+        store = self.idempotency_store
+        batch = []
+        slots = []
+        claimed = {}
+
+        for sms in smses:
+            key = sms.idempotency_key
+
+            if key is not None and key in claimed:
+                slots.append(claimed[key])
+                continue
+
+            if key is not None:
+                try:
+                    owner, previous = store.begin(key)
+                except Exception:
+                    for claimed_key in claimed:
+                        store.abort(claimed_key)
+
+                    raise
+
+                if not owner:
+                    if isinstance(previous, dict):
+                        previous = [{'success': True, 'data': previous}]
+
+                    slots.append(('previous', previous))
+                    continue
+
+            slot = ('batch', key, len(batch), len(sms.receivers))
+
+            for receiver in sms.receivers:
+                batch.append(self._sms_as_post_object(sms=sms, receiver=receiver))
+
+            if key is not None:
+                claimed[key] = slot
+
+            slots.append(slot)
+
+        try:
+            response = self._send_batch(batch) if batch else []
+        except Exception:
+            for key in claimed:
+                store.abort(key)
+
+            raise
+
+        result = []
+        completed = set()
+
+        for slot in slots:
+            if slot[0] == 'previous':
+                result.extend(slot[1])
+                continue
+
+            _, key, offset, count = slot
+            # A batch rejected as a whole gives no rows
+            rows = response[offset:offset + count] if response is not None else [None] * count
+            result.extend(rows)
+
+            if key is None or key in completed:
+                continue
+
+            completed.add(key)
+
+            if rows and all(row and row.get('success') for row in rows):
+                store.complete(key, rows)
+            else:
+                store.abort(key)
+
+        return result
+
+    def _contact_by_phone(self, number, raise_on_error=False):
+        """
+        Look up the contact for a `(countrycode, phonenumber)` tuple through the `contact_cache`. Only successful
+        lookups are cached, so an error isn't remembered as a missing contact. If the API rejects the lookup, None is
+        returned - or `RejectedRequestException` raised if `raise_on_error` is set.
+        """
+        if self.contact_cache is not None:
+            found, contact = self.contact_cache.get(number)
+
+            if found:
+                return contact
+
+        # The error is taken from the response when raising, since `last_error_message` is shared between threads
+        fetched = self._post('contact/getContactByPhoneNumber', data={
+            'countrycode': number[0],
+            'phonenumber': number[1],
+        }, raise_on_error=raise_on_error)
+
+        if fetched is None:
+            return None
+
+        contact = fetched[0] if fetched else None
+
+        if self.contact_cache is not None:
+            self.contact_cache.put(number, contact)
+
+        return contact
+
+    def _send_batch(self, batch):
+        """
+        Submit a list of already converted message objects (see `_sms_as_post_object`) as a single batch.
+
+        :param batch: list of dicts, one for each receiver
+        :return: Response from the API with one entry for each message in the batch
+        """
+        return self._post(
+            'notification/createBatch',
+            data={'batch': batch},
+            expect_list_return=True,
+        )
+
     def _default_parameters(self):
         """
         Get a dictionary containing the default parameters that should be included in every request.
@@ -546,7 +981,58 @@ class Intellipush:
         """
         return self.base_url + '/' + endpoint
 
-    def _post(self, endpoint, data=None, expect_list_return=False):
+    def _template(self, endpoint):
+        """
+        Get the prepared request template for an endpoint - the URL, the headers, and the encoded default parameters
+        except the timestamp, built once and reused for every call to the endpoint. The templates are rebuilt if the
+        credentials, version, base URL or compression of the client are changed.
+
+        :param endpoint: Endpoint for the API request
+        :return: A `RequestTemplate`
+        """
+        identity = (self.base_url, self.key, self.secret, self.version, self.sdk_tag, self.compression)
+
+        if identity != self._template_identity:
+            self._templates = {}
+            self._template_identity = identity
+
+        template = self._templates.get(endpoint)
+
+        if template is None:
+            defaults = self._default_parameters()
+            del defaults['t']
+            headers = {'Accept-Encoding': 'gzip, deflate'}
+            compressed_headers = dict(headers)
+
+            if self.compression:
+                compressed_headers['Content-Encoding'] = self.compression
+
+            template = self._templates[endpoint] = RequestTemplate(
+                url=self._url(endpoint),
+                prefix=(php_encode(defaults) + '&t=').encode('utf-8'),
+                headers=headers,
+                compressed_headers=compressed_headers,
+            )
+
+        return template
+
+    def _with_defaults(self, endpoint, encoded_data):
+        """
+        :param endpoint: Endpoint for the API request
+        :param encoded_data: The form encoded request fields (bytes, or a bytearray that's extended in place)
+        :return: The request body - the encoded default parameters from the endpoint's template, the current
+                 timestamp and `encoded_data`
+        """
+        body = self._template(endpoint).prefix + str(int(time.time())).encode('ascii')
+
+        # A large body prepared elsewhere (see `campaign.ProcessCampaignSender`) is extended in place, not copied
+        if isinstance(encoded_data, bytearray):
+            encoded_data += b'&' + body
+            return encoded_data
+
+        return body + b'&' + encoded_data if encoded_data else body
+
+    def _post(self, endpoint, data=None, expect_list_return=False, raise_on_error=False):
         """
         Internal helper method to send requests to the intellipush service. Wraps error handling and raises exceptions
         for general error conditions (such as HTTP status codes >= 300).
@@ -557,23 +1043,64 @@ class Intellipush:
         :param data: Information to send to the endpoint - depends on what the endpoint expects.
         :param expect_list_return: Expect a list returned from the API endpoint - useful when the response consists of
                multiple messages.
+        :param raise_on_error: Raise `RejectedRequestException` with the error from the response if the API rejects the
+               request, instead of returning None - for requests made from several threads, where `last_error_code`
+               and `last_error_message` may already describe another request.
         :return: The response from the API (returned under the `data` key). `last_error_code` and `last_error_message`
                  will be set to describe any error that occured.
         """
+        with self._stage(endpoint, 'encode'):
+            encoded_data = php_encode(data) if data else ''
+
+        return self._post_encoded(
+            endpoint,
+            encoded_data,
+            expect_list_return=expect_list_return,
+            raise_on_error=raise_on_error,
+        )
+
+    def _post_encoded(self, endpoint, encoded_data, expect_list_return=False, raise_on_error=False):
+        """
+        Send an already encoded request body (see `php_encode`) and handle the response like `_post`. The default
+        parameters (see `_default_parameters`) are added from the endpoint's template (see `_template`), so a body can
+        be prepared (i.e. in another process) without access to the credentials.
+
+        :param endpoint: The API endpoint to query
+        :param encoded_data: The form encoded request body (str, bytes or bytearray)
+        :param expect_list_return: Expect a list returned from the API endpoint
+        :param raise_on_error: Raise `RejectedRequestException` if the API rejects the request, as for `_post`
+        :return: The response from the API, as for `_post`
+        """
         self.last_error_message = None
         self.last_error_code = None
 
-        if not data:
-            data = {}
+        if isinstance(encoded_data, str):
+            encoded_data = encoded_data.encode('utf-8')
 
-        data.update(self._default_parameters())
-        encoded_data = php_encode(data)
+        encoded_data = self._with_defaults(endpoint, encoded_data)
 
-        response = requests.post(
-            url=self._url(endpoint),
-            data=encoded_data,
-        )
+        send = self.transport.post
+        timings = None
+
+        if self.profiler is not None:
+            timings = {}
+            send = functools.partial(send, timings=timings)
+
+        if self.recorder is not None:
+            response = self._send_recorded(endpoint, encoded_data, send)
+        else:
+            response = self._send_request(endpoint, encoded_data, send)
 
+        if timings:
+            for stage, seconds in timings.items():
+                self.profiler.add(endpoint, stage, seconds)
+
+        return self._handle_response(endpoint, response, expect_list_return, raise_on_error)
+
+    def _handle_response(self, endpoint, response, expect_list_return=False, raise_on_error=False):
+        """
+        Check the status of a response, decode it and find any errors - see `_post`.
+        """
         if response.status_code >= 300:
             raise ServerSideException(
                 'Server generated an error code: ' +
@@ -582,30 +1109,297 @@ class Intellipush:
             )
 
         try:
-            response_data = response.json()
-        except jsonlib.JSONDecodeError as e:
+            with self._stage(endpoint, 'decode'):
+                response_data = self.json_loads(response.content)
+        except ValueError:
             raise ServerSideException('Invalid JSON: ' + response.text)
 
         # The `batch` command returns a list, one for each message. We keep the first error we find, but return the
-        # whole list so the client can do what it wants.
-        if expect_list_return:
-            for status_message in response_data:
-                if 'errorcode' in status_message:
-                    self.last_error_code = response_data['errorcode']
-                    self.last_error_message = response_data['status_message']
-                    break
+        # whole list so the client can do what it wants. A batch rejected as a whole (i.e. bad credentials) gets a
+        # single status object instead, handled like any other failed request below.
+        if expect_list_return and isinstance(response_data, list):
+            with self._stage(endpoint, 'error_scan'):
+                for status_message in response_data:
+                    if 'errorcode' in status_message:
+                        self.last_error_code = status_message['errorcode']
+                        self.last_error_message = status_message.get('status_message')
+                        break
 
             return response_data
 
-        if not response_data['success']:
+        if not response_data.get('success'):
             if 'errorcode' in response_data:
                 self.last_error_code = response_data['errorcode']
-                self.last_error_message = response_data['status_message']
+                self.last_error_message = response_data.get('status_message')
+
+            if raise_on_error:
+                raise RejectedRequestException(response_data.get('status_message') or 'The request was rejected')
 
             return None
 
         return response_data['data']
 
+    async def _post_async(self, endpoint, data=None, expect_list_return=False):
+        """
+        Version of `_post` for asyncio code. The request is sent with the transport's `post_async` if it has one (i.e.
+        `intellipush.transports.HTTP2Transport`), otherwise `_post` is run in the default executor. Requests are
+        recorded and profiled as in `_post`, except that the time until the whole response has been received is
+        profiled as a single `request` stage.
+        """
+        post_async = getattr(self.transport, 'post_async', None)
+
+        if post_async is None:
+            return await self._run_async(self._post, endpoint, data, expect_list_return)
+
+        self.last_error_message = None
+        self.last_error_code = None
+
+        with self._stage(endpoint, 'encode'):
+            encoded_data = php_encode(data).encode('utf-8') if data else b''
+
+        body = self._with_defaults(endpoint, encoded_data)
+
+        if self.recorder is None:
+            response = await self._send_request_async(endpoint, body, post_async)
+            return self._handle_response(endpoint, response, expect_list_return)
+
+        timestamp = time.time()
+        started = time.monotonic()
+
+        try:
+            response = await self._send_request_async(endpoint, body, post_async)
+        except Exception:
+            self.recorder.record(endpoint, body, None, None, timestamp, time.monotonic() - started)
+            raise
+
+        self.recorder.record(
+            endpoint,
+            body,
+            response.status_code,
+            response.content,
+            timestamp,
+            time.monotonic() - started,
+        )
+        return self._handle_response(endpoint, response, expect_list_return)
+
+    async def _send_request_async(self, endpoint, body, post_async):
+        """
+        Version of `_send_request` for asyncio code.
+
+        :param endpoint: The API endpoint to query
+        :param body: The form encoded request body (bytes)
+        :param post_async: The transport's `post_async`
+        :return: A `transports.Response`
+        """
+        template = self._template(endpoint)
+
+        if self._should_compress(endpoint, body):
+            with self._stage(endpoint, 'compress'):
+                compressed = compress(body, self.compression)
+
+            with self._stage(endpoint, 'request'):
+                response = await post_async(url=template.url, data=compressed, headers=template.compressed_headers)
+
+            if response.status_code != 415:
+                return response
+
+            self._uncompressed_endpoints.add(endpoint)
+
+        with self._stage(endpoint, 'request'):
+            return await post_async(url=template.url, data=body, headers=template.headers)
+
+    @staticmethod
+    async def _run_async(func, *args):
+        import asyncio
+
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+
+    def _send_request(self, endpoint, encoded_data, send):
+        """
+        Send an encoded request body through the transport, compressing it if compression is enabled for the endpoint.
+        A compressed request rejected with `415 Unsupported Media Type` is sent again uncompressed.
+
+        :param endpoint: The API endpoint to query
+        :param encoded_data: The form encoded request body (str or bytes)
+        :param send: The transport method to use (`post` or `post_stream`)
+        :return: The value returned from `send`
+        """
+        template = self._template(endpoint)
+        body = encoded_data.encode('utf-8') if isinstance(encoded_data, str) else encoded_data
+
+        if self._should_compress(endpoint, body):
+            with self._stage(endpoint, 'compress'):
+                compressed = compress(body, self.compression)
+
+            response = send(url=template.url, data=compressed, headers=template.compressed_headers)
+            status_code = response[0] if isinstance(response, tuple) else response.status_code
+
+            if status_code != 415:
+                return response
+
+            if isinstance(response, tuple):
+                # Read the rest of the streamed error response so the connection can be reused
+                for _ in response[2]:
+                    pass
+
+            self._uncompressed_endpoints.add(endpoint)
+
+        return send(url=template.url, data=body, headers=template.headers)
+
+    def _send_recorded(self, endpoint, encoded_data, send):
+        """
+        Send a request as `_send_request`, and give it to the recorder with its response. A streamed response (see
+        `_post_stream`) is recorded when its body has been read.
+        """
+        timestamp = time.time()
+        started = time.monotonic()
+
+        try:
+            response = self._send_request(endpoint, encoded_data, send)
+        except Exception:
+            self.recorder.record(endpoint, encoded_data, None, None, timestamp, time.monotonic() - started)
+            raise
+
+        if isinstance(response, tuple):
+            status_code, reason, chunks = response
+
+            def recorded():
+                content = bytearray()
+
+                try:
+                    for chunk in chunks:
+                        content += chunk
+                        yield chunk
+                finally:
+                    self.recorder.record(
+                        endpoint,
+                        encoded_data,
+                        status_code,
+                        bytes(content),
+                        timestamp,
+                        time.monotonic() - started,
+                    )
+
+            return status_code, reason, recorded()
+
+        self.recorder.record(
+            endpoint,
+            encoded_data,
+            response.status_code,
+            response.content,
+            timestamp,
+            time.monotonic() - started,
+        )
+        return response
+
+    def _stage(self, endpoint, stage):
+        """
+        :return: A context manager timing the `with` block as a stage of the request if profiling is enabled
+        """
+        if self.profiler is None:
+            return contextlib.nullcontext()
+
+        return self.profiler.stage(endpoint, stage)
+
+    def _should_compress(self, endpoint, body):
+        if not self.compression or len(body) < self.compression_min_size:
+            return False
+
+        if endpoint in self._uncompressed_endpoints:
+            return False
+
+        return self.compression_endpoints is None or endpoint in self.compression_endpoints
+
+    def _post_stream(self, endpoint, data=None):
+        """
+        Version of `_post` for endpoints returning a list, where the elements of the list are decoded and returned as
+        they're received. The first error found is available in `last_error_code` and `last_error_message` once it
+        has been reached.
+
+        :param endpoint: The API endpoint to query (i.e. `notification/createBatch`)
+        :param data: Information to send to the endpoint
+        :return: generator giving each element of the returned list
+        """
+        self.last_error_message = None
+        self.last_error_code = None
+
+        with self._stage(endpoint, 'encode'):
+            encoded_data = php_encode(data).encode('utf-8') if data else b''
+
+        body = self._with_defaults(endpoint, encoded_data)
+        send = self.transport.post_stream
+        timings = None
+
+        if self.profiler is not None:
+            timings = {}
+            send = functools.partial(send, timings=timings)
+
+        if self.recorder is not None:
+            status_code, reason, chunks = self._send_recorded(endpoint, body, send)
+        else:
+            status_code, reason, chunks = self._send_request(endpoint, body, send)
+
+        def add_timings(decoding=0.0, scanning=0.0):
+            if timings is None:
+                return
+
+            for stage, seconds in timings.items():
+                self.profiler.add(endpoint, stage, seconds)
+
+            # The chunks are downloaded while the rows are decoded, so the download time is taken out of the decoding
+            self.profiler.add(endpoint, 'decode', max(decoding - timings.get('download', 0.0), 0.0))
+            self.profiler.add(endpoint, 'error_scan', scanning)
+
+        if status_code >= 300:
+            # Read the error response, so the connection can be reused and the response is recorded
+            for _ in chunks:
+                pass
+
+            add_timings()
+            raise ServerSideException('Server generated an error code: ' + str(status_code) + ': ' + reason)
+
+        def scan(row):
+            if self.last_error_code is None and isinstance(row, dict) and 'errorcode' in row:
+                self.last_error_code = row['errorcode']
+                self.last_error_message = row.get('status_message')
+
+        def profiled(elements):
+            decoding = scanning = 0.0
+
+            try:
+                while True:
+                    started = time.perf_counter()
+
+                    try:
+                        row = next(elements)
+                    except StopIteration:
+                        decoding += time.perf_counter() - started
+                        break
+
+                    decoded = time.perf_counter()
+                    decoding += decoded - started
+                    scan(row)
+                    scanning += time.perf_counter() - decoded
+                    yield row
+            finally:
+                add_timings(decoding, scanning)
+
+        def rows():
+            elements = iter_json_array(chunks)
+
+            try:
+                if timings is not None:
+                    yield from profiled(elements)
+                    return
+
+                for row in elements:
+                    scan(row)
+                    yield row
+            except ValueError as e:
+                raise ServerSideException('Invalid JSON: ' + str(e))
+
+        return rows()
+
     @staticmethod
     def _fix_statistics_keys(statistics):
         """
@@ -660,7 +1454,8 @@ class Intellipush:
                          the server. The tuple would be formatted as `('0047', '900xxxxx').
         :return:
         """
-        data = vars(sms)
+        # Copy the attributes so the SMS object can be reused for the next receiver in a batch
+        data = dict(vars(sms))
 
         if data['when'] and isinstance(data['when'], datetime.datetime):
             data['date'] = data['when'].strftime('%Y-%m-%d')
@@ -672,18 +1467,31 @@ class Intellipush:
         if len(data['receivers']) > 1 and not receiver:
             raise IntellipushException('Attempted to send message with multiple receivers without proper batching')
 
-        if not receiver:
+        if not receiver and data['receivers']:
             receiver = data['receivers'][0]
 
-        data['single_target_countrycode'] = receiver[0]
-        data['single_target'] = receiver[1]
+        # Messages to a contact or a contact list don't have a receiver
+        if receiver:
+            data['single_target_countrycode'] = receiver[0]
+            data['single_target'] = receiver[1]
+
+        if data.get('contact_list_filter') is not None:
+            data['contact_list_filter'] = Intellipush._contact_filter_as_post_object(data['contact_list_filter'])
 
         del data['receivers']
+        data.pop('idempotency_key', None)
         return data
 
     @staticmethod
     def _target_as_post_object(target):
-        return vars(target)
+        return dict(vars(target))
+
+    @staticmethod
+    def _contact_filter_as_post_object(contact_filter):
+        if not isinstance(contact_filter, ContactFilter):
+            raise TypeError('A `contacts.ContactFilter` object is required as a contact list filter')
+
+        return {key: value for key, value in vars(contact_filter).items() if value is not None}
 
 
 class IntellipushException(Exception):
@@ -702,6 +1510,10 @@ class InvalidTargetException(IntellipushException):
     pass
 
 
+class RejectedRequestException(IntellipushException):
+    pass
+
+
 class TwoFactorAuthenticationIsAlreadyActive(IntellipushException):
     pass
 
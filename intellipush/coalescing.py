@@ -0,0 +1,291 @@
+import collections
+import copy
+import threading
+import time
+
+from .client import IntellipushException
+
+
+POLICIES = ('first', 'latest', 'merge')
+
+
+def merge_texts(pending, sms):
+    """
+    The default `merge` for `CoalescingSender` - the distinct texts of the coalesced messages, one on each line.
+
+    :param pending: The `SMS` waiting to be sent
+    :param sms: The `SMS` coalesced into it
+    :return: The `SMS` to send instead
+    """
+    if sms.text_message not in pending.text_message.split('\n'):
+        pending.text_message += '\n' + sms.text_message
+
+    return pending
+
+
+class CoalescingSender:
+    def __init__(self,
+                 client,
+                 window=5.0,
+                 policy='first',
+                 key=None,
+                 merge=None,
+                 chunk_size=500,
+                 max_pending=10000,
+                 on_flush=None,
+    ):
+        """
+        Coalesce bursts of near-identical messages - i.e. the same alert triggered several times within seconds - into
+        a single message for each receiver, and send the coalesced messages together as batches.
+
+        A message is held for `window` seconds from the first time its key is seen. Messages arriving with the same key
+        in that time are coalesced according to `policy`:
+
+        - `first`: keep the first message and drop the rest
+        - `latest`: keep the most recent message
+        - `merge`: combine the messages with `merge` (by default the distinct texts are sent, one on each line)
+
+        The key is the receiver and the text of the message unless a `group_key` is given to `send_sms` (messages with
+        the same group key and receiver are coalesced even if their texts differ) or a `key` callable is given.
+
+        Messages are sent when their window expires, by calling `flush_due` periodically or by running the background
+        thread started with `start`. `flush` sends everything that's pending immediately. Messages without receivers
+        (i.e. to a contact list) are sent right away, without coalescing.
+
+        :param client: The `Intellipush` client to send through
+        :param window: Number of seconds a message is held while duplicates are coalesced into it
+        :param policy: `first`, `latest` or `merge`
+        :param key: Callable receiving an `SMS` and a `(countrycode, number)` tuple and returning the key to coalesce by
+        :param merge: Callable receiving the pending `SMS` and a new `SMS` and returning the `SMS` to send (`merge`
+               policy)
+        :param chunk_size: Maximum number of messages in each batch request
+        :param max_pending: Flush everything when this many messages are pending
+        :param on_flush: Callable receiving the list of messages sent, the response rows (None if the request failed)
+               and the exception raised (or None) for each batch. Without it, the first failure is raised once every
+               batch has been sent.
+        """
+        if policy not in POLICIES:
+            raise IntellipushException('Unknown coalescing policy: ' + str(policy))
+
+        self.client = client
+        self.window = window
+        self.policy = policy
+        self.key = key or (lambda sms, receiver: (receiver, sms.text_message))
+        self.merge = merge or merge_texts
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending
+        self.on_flush = on_flush
+
+        self._condition = threading.Condition()
+        # Insertion order is also deadline order, as every message is held for the same window
+        self._pending = collections.OrderedDict()
+        self._stats = {'received': 0, 'coalesced': 0, 'sent': 0, 'batches': 0, 'failed_batches': 0}
+        self._errors = collections.deque(maxlen=100)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def send_sms(self, sms, group_key=None):
+        """
+        Queue a message for sending, coalescing it with pending messages to the same receivers.
+
+        :param sms: SMS object (`intellipush.messages.SMS`)
+        :param group_key: Coalesce with pending messages to the same receiver that have this group key
+        :return: Response from the API for messages without receivers - otherwise None, as the message is queued
+        """
+        if not sms.receivers:
+            return self.client.send_sms(sms)
+
+        overflow = False
+
+        with self._condition:
+            for receiver in sms.receivers:
+                self._add(sms, tuple(receiver), group_key)
+
+            overflow = len(self._pending) >= self.max_pending
+            self._condition.notify_all()
+
+        if overflow:
+            self.flush()
+
+        return None
+
+    def send_smses(self, smses, group_key=None):
+        """
+        Queue several messages, as for `send_sms`.
+
+        :param smses: iterable giving an `SMS` object for each iteration
+        :param group_key: Coalesce with pending messages to the same receiver that have this group key
+        """
+        for sms in smses:
+            self.send_sms(sms, group_key=group_key)
+
+    def flush_due(self):
+        """
+        Send the messages whose window has expired.
+
+        :return: The number of messages sent
+        """
+        now = time.monotonic()
+
+        with self._condition:
+            due = []
+
+            while self._pending:
+                key, (deadline, sms) = next(iter(self._pending.items()))
+
+                if deadline > now:
+                    break
+
+                del self._pending[key]
+                due.append(sms)
+
+        return self._send(due)
+
+    def flush(self):
+        """
+        Send every pending message immediately.
+
+        :return: The number of messages sent
+        """
+        with self._condition:
+            pending = [sms for _, sms in self._pending.values()]
+            self._pending.clear()
+
+        return self._send(pending)
+
+    def pending(self):
+        """
+        :return: The number of messages waiting to be sent
+        """
+        with self._condition:
+            return len(self._pending)
+
+    def stats(self):
+        """
+        :return: dict with the number of messages `received` (one for each receiver), `coalesced` into other messages,
+                 and `sent`, and the number of `batches` sent and `failed_batches`
+        """
+        with self._condition:
+            return dict(self._stats)
+
+    def errors(self):
+        """
+        Get the exceptions raised by sends from the background thread (when there's no `on_flush` callback to report
+        them to) since the last call. At most the latest 100 are kept.
+
+        :return: list of exceptions
+        """
+        with self._condition:
+            errors = list(self._errors)
+            self._errors.clear()
+
+        return errors
+
+    def start(self):
+        """
+        Send messages as their windows expire from a background (daemon) thread. Failed sends are given to `on_flush`,
+        or kept for `errors`.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='intellipush-coalescing', daemon=True)
+        self._thread.start()
+
+    def stop(self, flush=True, timeout=None):
+        """
+        Stop the background thread.
+
+        :param flush: Send the messages that are still pending
+        """
+        self._stop_event.set()
+
+        with self._condition:
+            self._condition.notify_all()
+
+        if self._thread:
+            self._thread.join(timeout)
+
+        if flush:
+            self.flush()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _add(self, sms, receiver, group_key):
+        key = (receiver, group_key) if group_key is not None else self.key(sms, receiver)
+        self._stats['received'] += 1
+        entry = self._pending.get(key)
+
+        if entry is None:
+            single = copy.copy(sms)
+            single.receivers = [receiver]
+            self._pending[key] = (time.monotonic() + self.window, single)
+            return
+
+        self._stats['coalesced'] += 1
+        deadline, pending = entry
+
+        if self.policy == 'latest':
+            pending = copy.copy(sms)
+            pending.receivers = [receiver]
+        elif self.policy == 'merge':
+            pending = self.merge(pending, sms)
+
+        self._pending[key] = (deadline, pending)
+
+    def _send(self, smses):
+        errors = []
+
+        # Every chunk is sent even if an earlier one failed - the messages have already left the pending queue
+        for offset in range(0, len(smses), self.chunk_size):
+            chunk = smses[offset:offset + self.chunk_size]
+            rows = None
+            error = None
+
+            try:
+                rows = self.client.send_smses(chunk)
+            except Exception as e:
+                error = e
+                errors.append(e)
+
+            with self._condition:
+                self._stats['batches'] += 1
+                self._stats['sent'] += len(chunk) if error is None else 0
+                self._stats['failed_batches'] += 1 if error is not None else 0
+
+            if self.on_flush:
+                self.on_flush(chunk, rows, error)
+
+        if errors and not self.on_flush:
+            raise errors[0]
+
+        return len(smses)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            with self._condition:
+                if self._pending:
+                    deadline = next(iter(self._pending.values()))[0]
+                    timeout = max(0.0, deadline - time.monotonic())
+                else:
+                    timeout = None
+
+                if timeout is None or timeout > 0:
+                    self._condition.wait(timeout)
+
+            if self._stop_event.is_set():
+                break
+
+            try:
+                self.flush_due()
+            except Exception as e:
+                # Without an `on_flush` callback the failure is kept for `errors`, as the background thread has no
+                # caller to raise it to
+                with self._condition:
+                    self._errors.append(e)
@@ -0,0 +1,91 @@
+import collections
+import threading
+import time
+
+
+class ContactCache:
+    def __init__(self, ttl=600, max_entries=100000):
+        """
+        An in-memory cache of contacts by phone number, used by `Intellipush.contact` and
+        `Intellipush.contacts_by_phone` (given as `contact_cache` to `Intellipush`). Numbers without a contact are
+        cached as well.
+
+        Entries expire after `ttl` seconds, and the least recently used entries are dropped when there are more than
+        `max_entries`. Entries are invalidated when the client creates, updates or deletes a contact - changes made
+        elsewhere are seen when the entry expires.
+
+        :param ttl: Number of seconds to keep an entry
+        :param max_entries: Maximum number of entries to keep
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._numbers_by_id = {}
+
+    def get(self, number):
+        """
+        :param number: Tuple of `(countrycode, phonenumber)`
+        :return: Tuple of `(found, contact)` - `found` is False if the number isn't cached
+        """
+        with self._lock:
+            entry = self._entries.get(number)
+
+            if entry is None:
+                return False, None
+
+            expires, contact = entry
+
+            if expires < time.monotonic():
+                self._remove(number)
+                return False, None
+
+            self._entries.move_to_end(number)
+            return True, contact
+
+    def put(self, number, contact):
+        """
+        :param number: Tuple of `(countrycode, phonenumber)`
+        :param contact: The contact as returned from the API, or None if there's no contact with the number
+        """
+        with self._lock:
+            self._remove(number)
+            self._entries[number] = (time.monotonic() + self.ttl, contact)
+
+            if contact and contact.get('id') is not None:
+                self._numbers_by_id[str(contact['id'])] = number
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, number=None, contact_id=None):
+        """
+        Remove the entry for a number, and/or the entry for the contact with `contact_id`.
+
+        :param number: Tuple of `(countrycode, phonenumber)`
+        :param contact_id: ID of a contact
+        """
+        with self._lock:
+            if number is not None:
+                self._remove(number)
+
+            if contact_id is not None:
+                cached_number = self._numbers_by_id.get(str(contact_id))
+
+                if cached_number is not None:
+                    self._remove(cached_number)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._numbers_by_id.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _remove(self, number):
+        entry = self._entries.pop(number, None)
+
+        if entry is not None and entry[1] and entry[1].get('id') is not None:
+            self._numbers_by_id.pop(str(entry[1]['id']), None)
@@ -15,3 +15,12 @@ class Target:
         self.email = email
         self.countrycode = countrycode
         self.phonenumber = phonenumber
+
+    def _key(self):
+        return self.contact_id, self.email, self.countrycode, self.phonenumber
+
+    def __eq__(self, other):
+        return isinstance(other, Target) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
@@ -0,0 +1,259 @@
+import collections
+import concurrent.futures
+import threading
+import time
+
+from .client import IntellipushException
+from .messages import chunk_receivers
+from .utils import RateLimiter
+
+
+Lane = collections.namedtuple('Lane', ('name', 'priority', 'concurrency', 'rate_share'))
+
+DEFAULT_LANES = (
+    Lane(name='transactional', priority=0, concurrency=8, rate_share=None),
+    Lane(name='bulk', priority=1, concurrency=4, rate_share=None),
+)
+
+
+class UnknownLaneException(IntellipushException):
+    pass
+
+
+class _LaneState:
+    def __init__(self, lane, rate, wait_history):
+        self.lane = lane
+        self.queue = collections.deque()
+        self.active = 0
+        self.limiter = RateLimiter(rate * lane.rate_share) if rate and lane.rate_share else None
+        self.metrics = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'messages': 0,
+            'total_wait': 0.0,
+            'max_wait': 0.0,
+            'throttled_seconds': 0.0,
+        }
+        self.waits = collections.deque(maxlen=wait_history)
+
+
+class PriorityDispatcher:
+    def __init__(self, client, lanes=DEFAULT_LANES, max_workers=8, chunk_size=500, rate=None, wait_history=1000):
+        """
+        Dispatch sends through a shared pool of workers with separate priority lanes, so urgent traffic (two factor
+        codes, transactional messages) doesn't queue up behind large campaigns.
+
+        Whenever a worker is free it takes the next task from the lane with the highest priority (lowest `priority`
+        value) that has work waiting and is below its `concurrency`. `send_smses` splits campaigns into chunks of
+        `chunk_size` messages that are queued as separate tasks, so a campaign yields to urgent messages between
+        chunks. Keep the concurrency of the bulk lanes below `max_workers` to always have a worker ready for urgent
+        messages.
+
+        With a total `rate` (messages per second), each lane with a `rate_share` is limited to that share of it.
+
+        :param client: The `Intellipush` client to send through
+        :param lanes: iterable of `Lane` tuples - `(name, priority, concurrency, rate_share)`
+        :param max_workers: Number of worker threads shared by every lane
+        :param chunk_size: Maximum number of messages in each batch request from `send_smses`
+        :param rate: Total number of messages per second shared by the lanes with a `rate_share`
+        :param wait_history: Number of recent queue wait times kept for each lane for the percentiles in `metrics`
+        """
+        self.client = client
+        self.chunk_size = chunk_size
+        self._condition = threading.Condition()
+        self._lanes = {lane.name: _LaneState(lane, rate, wait_history) for lane in lanes}
+        self._by_priority = sorted(self._lanes.values(), key=lambda state: state.lane.priority)
+        self._closed = False
+        self._workers = [
+            threading.Thread(target=self._work, name='intellipush-dispatch-%d' % index, daemon=True)
+            for index in range(max_workers)
+        ]
+
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, lane, func, *args, messages=1, **kwargs):
+        """
+        Queue a call in a lane.
+
+        :param lane: Name of the lane
+        :param func: Callable to call from a worker
+        :param messages: Number of messages sent by the call (for rate limits and metrics)
+        :return: A `concurrent.futures.Future` for the value returned by `func`
+        """
+        if lane not in self._lanes:
+            raise UnknownLaneException('No lane named ' + str(lane))
+
+        future = concurrent.futures.Future()
+
+        with self._condition:
+            if self._closed:
+                raise IntellipushException('The dispatcher has been closed')
+
+            state = self._lanes[lane]
+            state.queue.append((future, func, args, kwargs, messages, time.monotonic()))
+            state.metrics['submitted'] += 1
+            self._condition.notify()
+
+        return future
+
+    def send_sms(self, sms, lane='transactional'):
+        """
+        :param sms: SMS object (`intellipush.messages.SMS`)
+        :param lane: Name of the lane
+        :return: A `Future` for the response from `Intellipush.send_sms`
+        """
+        return self.submit(lane, self.client.send_sms, sms, messages=max(1, len(sms.receivers)))
+
+    def two_factor_send(self, countrycode, phonenumber, message_before_code=None, message_after_code=None,
+                        lane='transactional'):
+        """
+        :param lane: Name of the lane
+        :return: A `Future` for the response from `Intellipush.two_factor_send`
+        """
+        return self.submit(
+            lane,
+            self.client.two_factor_send,
+            countrycode=countrycode,
+            phonenumber=phonenumber,
+            message_before_code=message_before_code,
+            message_after_code=message_after_code,
+        )
+
+    def send_smses(self, smses, lane='bulk', on_error=None):
+        """
+        Queue a list of messages as batches of at most `chunk_size` receivers. A message with more receivers than that
+        is split across batches.
+
+        A batch that fails doesn't stop the others: each of its receivers gets a None row, and the exception is given
+        to `on_error` once every batch has finished.
+
+        :param smses: iterable giving an `SMS` object for each iteration
+        :param lane: Name of the lane
+        :param on_error: Callable receiving the list of `SMS` objects and the exception for each batch that failed
+        :return: A `Future` for the response rows of every batch, in order"""
+        chunks = list(chunk_receivers(smses, self.chunk_size))
+        combined = concurrent.futures.Future()
+        futures = [self.submit(lane, self.client.send_smses, chunk, messages=size) for chunk, size in chunks]
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def done(_):
+            with lock:
+                remaining[0] -= 1
+
+                if remaining[0]:
+                    return
+
+            rows = []
+
+            for future, (chunk, size) in zip(futures, chunks):
+                if future.exception() is not None:
+                    rows.extend([None] * size)
+
+                    if on_error is not None:
+                        on_error(chunk, future.exception())
+
+                    continue
+
+                rows.extend(future.result() or [None] * size)
+
+            combined.set_result(rows)
+
+        if not futures:
+            combined.set_result([])
+
+        for future in futures:
+            future.add_done_callback(done)
+
+        return combined
+
+    def metrics(self):
+        """
+        :return: dict mapping each lane name to its metrics - the current queue `depth` and number of `active` calls,
+                 the number of calls `submitted`, `completed` and `failed`, the number of `messages` sent, the time
+                 spent waiting in the queue (`mean_wait`, `p95_wait` and `max_wait` in seconds) and the time spent
+                 waiting for the lane's rate limit (`throttled_seconds`)
+        """
+        with self._condition:
+            metrics = {}
+
+            for name, state in self._lanes.items():
+                waits = sorted(state.waits)
+                finished = state.metrics['completed'] + state.metrics['failed']
+                lane_metrics = dict(state.metrics)
+                lane_metrics.update({
+                    'depth': len(state.queue),
+                    'active': state.active,
+                    'mean_wait': state.metrics['total_wait'] / finished if finished else 0.0,
+                    'p95_wait': waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+                })
+                del lane_metrics['total_wait']
+                metrics[name] = lane_metrics
+
+            return metrics
+
+    def close(self, wait=True):
+        """
+        Stop accepting calls. The workers finish the calls that are already queued before they exit.
+
+        :param wait: Wait for the queued calls to finish
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _next(self):
+        for state in self._by_priority:
+            if state.queue and state.active < state.lane.concurrency:
+                return state
+
+        return None
+
+    def _work(self):
+        while True:
+            with self._condition:
+                state = self._next()
+
+                while state is None:
+                    if self._closed and not any(lane.queue for lane in self._lanes.values()):
+                        return
+
+                    self._condition.wait()
+                    state = self._next()
+
+                future, func, args, kwargs, messages, queued = state.queue.popleft()
+                state.active += 1
+
+            waited = time.monotonic() - queued
+            throttled = state.limiter.acquire(messages) if state.limiter else 0
+            failed = False
+
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func(*args, **kwargs))
+                except BaseException as e:
+                    failed = True
+                    future.set_exception(e)
+
+            with self._condition:
+                state.active -= 1
+                state.metrics['completed' if not failed else 'failed'] += 1
+                state.metrics['messages'] += messages
+                state.metrics['total_wait'] += waited
+                state.metrics['max_wait'] = max(state.metrics['max_wait'], waited)
+                state.metrics['throttled_seconds'] += throttled
+                state.waits.append(waited)
+                # A lane at its concurrency limit may have work waiting for this slot
+                self._condition.notify_all()
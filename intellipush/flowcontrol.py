@@ -0,0 +1,219 @@
+import concurrent.futures
+import threading
+import time
+
+from .client import ServerSideException
+from .transports import request_not_sent
+
+
+class AIMDController:
+    def __init__(self,
+                 chunk_size=100,
+                 concurrency=2,
+                 min_chunk_size=10,
+                 max_chunk_size=2000,
+                 min_concurrency=1,
+                 max_concurrency=16,
+                 latency_target=2.0,
+                 chunk_increase=50,
+                 concurrency_increase=1,
+                 decrease_factor=0.5,
+                 error_rate_threshold=0.5,
+                 congestion_codes=(),
+    ):
+        """
+        Additive increase / multiplicative decrease (AIMD) control of chunk size and concurrency for batch sending.
+
+        Every completed request is reported through `record`. A request that succeeds within `latency_target` seconds
+        increases the chunk size and the number of requests in flight additively. A request that fails with an HTTP
+        or connection error, is slower than the latency target, or has too many rows rejected (more than
+        `error_rate_threshold` of the rows, or any row with an error code in `congestion_codes`) decreases both
+        multiplicatively. Over time this converges on the largest load the service sustains.
+
+        :param chunk_size: Initial number of messages in each request
+        :param concurrency: Initial number of requests in flight
+        :param min_chunk_size: Smallest chunk size
+        :param max_chunk_size: Largest chunk size
+        :param min_concurrency: Smallest number of requests in flight
+        :param max_concurrency: Largest number of requests in flight
+        :param latency_target: Requests slower than this (in seconds) are treated as a sign of overload
+        :param chunk_increase: Number of messages to add to the chunk size after a successful request
+        :param concurrency_increase: Number of requests in flight to add after a successful request
+        :param decrease_factor: Multiplier applied to chunk size and concurrency on overload
+        :param error_rate_threshold: Share of rejected rows in a response that is treated as overload
+        :param congestion_codes: Row error codes that are always treated as overload
+        """
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.chunk_increase = chunk_increase
+        self.concurrency_increase = concurrency_increase
+        self.decrease_factor = decrease_factor
+        self.error_rate_threshold = error_rate_threshold
+        self.congestion_codes = set(congestion_codes)
+
+        self.requests = 0
+        self.failed_requests = 0
+        self.rows = 0
+        self.failed_rows = 0
+        self.increases = 0
+        self.decreases = 0
+        self.last_latency = None
+
+        self._lock = threading.Lock()
+
+    def record(self, latency, rows=None, error=None):
+        """
+        Report the outcome of a request and adjust chunk size and concurrency.
+
+        :param latency: Time the request took in seconds
+        :param rows: The list of rows returned from `createBatch` (None if the request failed)
+        :param error: The exception raised by the request, if any
+        :return: True if the controller backed off
+        """
+        rows = rows or []
+        failed = [row for row in rows if not row or not row.get('success')]
+        congested = error is not None or latency > self.latency_target
+
+        if rows and len(failed) / len(rows) > self.error_rate_threshold:
+            congested = True
+
+        if any(row and row.get('errorcode') in self.congestion_codes for row in failed):
+            congested = True
+
+        with self._lock:
+            self.requests += 1
+            self.failed_requests += 1 if error is not None else 0
+            self.rows += len(rows)
+            self.failed_rows += len(failed)
+            self.last_latency = latency
+
+            if congested:
+                self.decreases += 1
+                self.chunk_size = max(self.min_chunk_size, int(self.chunk_size * self.decrease_factor))
+                self.concurrency = max(self.min_concurrency, int(self.concurrency * self.decrease_factor))
+            else:
+                self.increases += 1
+                self.chunk_size = min(self.max_chunk_size, self.chunk_size + self.chunk_increase)
+                self.concurrency = min(self.max_concurrency, self.concurrency + self.concurrency_increase)
+
+        return congested
+
+    def state(self):
+        """
+        :return: dict describing the current state of the controller, for monitoring
+        """
+        with self._lock:
+            return {
+                'chunk_size': self.chunk_size,
+                'concurrency': self.concurrency,
+                'requests': self.requests,
+                'failed_requests': self.failed_requests,
+                'rows': self.rows,
+                'failed_rows': self.failed_rows,
+                'increases': self.increases,
+                'decreases': self.decreases,
+                'last_latency': self.last_latency,
+            }
+
+
+class AdaptiveBatchSender:
+    def __init__(self, client, controller=None, retries=3, retry_delay=0.5, statistics_sampler=None, max_unsent=None):
+        """
+        Send large lists of messages in chunks, with chunk size and concurrency tuned by an `AIMDController`.
+
+        Messages are converted the same way as in `Intellipush.send_smses`, but submitted in several `createBatch`
+        requests. Every HTTP or connection error makes the controller back off. A chunk that failed before its request
+        was sent (e.g. the connection was refused) is retried up to `retries` times, with an exponentially increasing
+        delay starting at `retry_delay` seconds. Any other failure gives up on the chunk right away, since the API may
+        already have accepted the messages and sending them again could deliver them twice.
+
+        If a `statistics.StatisticsSampler` and `max_unsent` are given, no new chunk is submitted while the
+        server-side queue has more than `max_unsent` unsent messages.
+
+        :param client: The `Intellipush` client to send through
+        :param controller: The `AIMDController` to use (a default controller is created if not given)
+        :param retries: Number of retries for each chunk
+        :param retry_delay: Seconds to wait before the first retry of a chunk
+        :param statistics_sampler: A running `StatisticsSampler` used for back-pressure
+        :param max_unsent: Maximum number of unsent messages on the server side before holding back
+        """
+        self.client = client
+        self.controller = controller or AIMDController()
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.statistics_sampler = statistics_sampler
+        self.max_unsent = max_unsent
+
+    def send_smses(self, smses, on_error=None):
+        """
+        Send a list of `SMS` objects.
+
+        A chunk that fails doesn't stop the rest of the messages - its rows are None, and the exception is given to
+        `on_error`.
+
+        :param smses: iterable giving an `SMS` object for each iteration
+        :param on_error: Callable receiving the offsets of the first and last receiver (exclusive) and the exception
+               for each chunk that failed
+        :return: A list with the response row for each message and receiver, in order. The rows for a chunk that
+                 failed are None.
+        """
+        batch = []
+
+        for sms in smses:
+            for receiver in sms.receivers:
+                batch.append(self.client._sms_as_post_object(sms=sms, receiver=receiver))
+
+        results = [None] * len(batch)
+        pending = {}
+        offset = 0
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.controller.max_concurrency) as executor:
+            while offset < len(batch) or pending:
+                while offset < len(batch) and len(pending) < self.controller.concurrency:
+                    if self.statistics_sampler is not None and self.max_unsent is not None:
+                        self.statistics_sampler.wait_for_capacity(self.max_unsent)
+
+                    chunk_size = self.controller.chunk_size
+                    future = executor.submit(self._send_chunk, batch, offset, offset + chunk_size, results)
+                    pending[future] = (offset, min(offset + chunk_size, len(batch)))
+                    offset += chunk_size
+
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                for future in done:
+                    start, end = pending.pop(future)
+
+                    try:
+                        future.result()
+                    except Exception as e:
+                        if on_error is not None:
+                            on_error(start, end, e)
+
+        return results
+
+    def _send_chunk(self, batch, start, end, results):
+        for attempt in range(self.retries + 1):
+            started = time.monotonic()
+
+            try:
+                rows = self.client._send_batch(batch[start:end])
+            except (ServerSideException, ) + self.client.transport.exceptions as e:
+                self.controller.record(time.monotonic() - started, error=e)
+
+                if attempt == self.retries or not request_not_sent(e):
+                    raise
+
+                time.sleep(self.retry_delay * 2 ** attempt)
+                continue
+
+            self.controller.record(time.monotonic() - started, rows=rows)
+
+            for index, row in enumerate((rows or [])[:end - start]):
+                results[start + index] = row
+
+            return
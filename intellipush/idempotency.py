@@ -0,0 +1,212 @@
+import abc
+import collections
+import json
+import sqlite3
+import threading
+import time
+
+
+class IdempotencyStore(abc.ABC):
+    """
+    Base class for the duplicate-send index used by `Intellipush` when `SMS` objects carry an `idempotency_key`.
+
+    A sender calls `begin` with the key before sending. The first caller within the window becomes the owner of the
+    key and must call `complete` with the result (or `abort` if sending failed). Any other caller - including
+    concurrent ones, which wait for the owner to finish - gets the stored result back instead.
+
+    A claim that's neither completed nor aborted within `lease` seconds (i.e. because the owner crashed) expires, and
+    the next caller becomes the owner.
+    """
+    def __init__(self, window=3600, wait_timeout=30, lease=120):
+        """
+        :param window: Number of seconds a result is remembered for a key
+        :param wait_timeout: Maximum number of seconds to wait for a concurrent sender with the same key to finish
+        :param lease: Number of seconds a claim is held for its owner before it expires - keep it above the time a
+               send can take
+        """
+        self.window = window
+        self.wait_timeout = wait_timeout
+        self.lease = lease
+
+    @abc.abstractmethod
+    def begin(self, key):
+        """
+        Claim `key` for sending, or retrieve the result of a previous send with the same key.
+
+        :param key: The idempotency key of the message
+        :return: A tuple of `(owner, result)` - `owner` is True if the caller should send the message
+        """
+        pass
+
+    @abc.abstractmethod
+    def complete(self, key, result):
+        """
+        Store the result for a claimed key.
+
+        :param key: The idempotency key of the message
+        :param result: The response from the API for the message
+        """
+        pass
+
+    @abc.abstractmethod
+    def abort(self, key):
+        """
+        Release a claimed key without storing a result, so that a later send can try again.
+
+        :param key: The idempotency key of the message
+        """
+        pass
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    def __init__(self, window=3600, max_entries=100000, wait_timeout=30, lease=120):
+        """
+        An in-process idempotency index, bounded both by time (`window`) and by size (`max_entries` - the oldest
+        entries are evicted first).
+
+        :param window: Number of seconds a result is remembered for a key
+        :param max_entries: Maximum number of keys to remember
+        :param wait_timeout: Maximum number of seconds to wait for a concurrent sender with the same key to finish
+        :param lease: Number of seconds a claim is held for its owner before it expires
+        """
+        super().__init__(window=window, wait_timeout=wait_timeout, lease=lease)
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._pending = {}
+        self._condition = threading.Condition()
+
+    def begin(self, key):
+        deadline = time.monotonic() + self.wait_timeout
+
+        with self._condition:
+            while True:
+                self._expire()
+
+                if key in self._entries:
+                    return False, self._entries[key][1]
+
+                claimed = self._pending.get(key)
+
+                if claimed is None or claimed < time.monotonic() - self.lease:
+                    self._pending[key] = time.monotonic()
+                    return True, None
+
+                remaining = deadline - time.monotonic()
+
+                if remaining <= 0:
+                    raise TimeoutError('Timed out waiting for concurrent send with idempotency key ' + str(key))
+
+                self._condition.wait(min(remaining, claimed + self.lease - time.monotonic()))
+
+    def complete(self, key, result):
+        with self._condition:
+            self._pending.pop(key, None)
+            self._entries[key] = (time.monotonic(), result)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+            self._condition.notify_all()
+
+    def abort(self, key):
+        with self._condition:
+            self._pending.pop(key, None)
+            self._condition.notify_all()
+
+    def __len__(self):
+        with self._condition:
+            self._expire()
+            return len(self._entries)
+
+    def _expire(self):
+        oldest_allowed = time.monotonic() - self.window
+
+        while self._entries:
+            key, (stored, _) = next(iter(self._entries.items()))
+
+            if stored >= oldest_allowed:
+                break
+
+            del self._entries[key]
+
+
+class SQLiteIdempotencyStore(IdempotencyStore):
+    def __init__(self, path, window=3600, wait_timeout=30, poll_interval=0.05, lease=120):
+        """
+        An idempotency index stored in SQLite, so that it can be shared between processes and survive restarts.
+        Results are stored as JSON.
+
+        :param path: Path to the SQLite file backing the index
+        :param window: Number of seconds a result is remembered for a key
+        :param wait_timeout: Maximum number of seconds to wait for a concurrent sender with the same key to finish
+        :param poll_interval: How often to check whether a concurrent sender in another process has finished
+        :param lease: Number of seconds a claim is held for its owner before it expires - a claim left behind by a
+               process that crashed while sending blocks the key for this long, not for the whole `window`
+        """
+        super().__init__(window=window, wait_timeout=wait_timeout, lease=lease)
+        self.path = path
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=wait_timeout)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS idempotency ('
+            'key TEXT PRIMARY KEY, '
+            'created REAL NOT NULL, '
+            'completed INTEGER NOT NULL, '
+            'result TEXT)'
+        )
+
+    def begin(self, key):
+        deadline = time.monotonic() + self.wait_timeout
+
+        while True:
+            with self._lock:
+                now = time.time()
+                self._db.execute('BEGIN IMMEDIATE')
+
+                try:
+                    # `created` is the time of the claim for pending keys and the time of the result for completed ones
+                    self._db.execute(
+                        'DELETE FROM idempotency WHERE created < (CASE completed WHEN 0 THEN ? ELSE ? END)',
+                        (now - self.lease, now - self.window),
+                    )
+                    row = self._db.execute(
+                        'SELECT completed, result FROM idempotency WHERE key = ?',
+                        (str(key), ),
+                    ).fetchone()
+
+                    if not row:
+                        self._db.execute(
+                            'INSERT INTO idempotency (key, created, completed) VALUES (?, ?, 0)',
+                            (str(key), now),
+                        )
+                finally:
+                    self._db.execute('COMMIT')
+
+            if not row:
+                return True, None
+
+            if row[0]:
+                return False, json.loads(row[1])
+
+            if time.monotonic() >= deadline:
+                raise TimeoutError('Timed out waiting for concurrent send with idempotency key ' + str(key))
+
+            time.sleep(self.poll_interval)
+
+    def complete(self, key, result):
+        with self._lock:
+            self._db.execute(
+                'UPDATE idempotency SET completed = 1, created = ?, result = ? WHERE key = ?',
+                (time.time(), json.dumps(result), str(key)),
+            )
+
+    def abort(self, key):
+        with self._lock:
+            self._db.execute('DELETE FROM idempotency WHERE key = ? AND completed = 0', (str(key), ))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
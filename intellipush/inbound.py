@@ -0,0 +1,233 @@
+import concurrent.futures
+import json
+import os
+import threading
+
+
+class ReceivedConsumer:
+    def __init__(self,
+                 client,
+                 state_path=None,
+                 keyword=None,
+                 second_keyword=None,
+                 items=50,
+                 max_pages=20,
+                 handlers=None,
+                 default_handler=None,
+                 max_workers=4,
+                 min_interval=1.0,
+                 max_interval=60.0,
+                 backoff=1.5,
+    ):
+        """
+        Consume messages received on your keywords incrementally through `Intellipush.received_smses`.
+
+        The consumer keeps a high-water mark (the largest message id seen) and only returns messages newer than it.
+        Pages are read from the first one (newest messages first) until a page reaches a message that has already
+        been seen, so an idle poll only transfers a single page. Once there's a high-water mark, every page back to it
+        is read, so no message is skipped however many arrived since the last poll. If `state_path` is given, the
+        high-water mark is persisted there after each batch has been handled, so a restarted consumer continues where
+        it stopped.
+
+        The polling interval adapts to traffic: it drops to `min_interval` when new messages arrive, and grows by
+        `backoff` for each empty poll up to `max_interval`.
+
+        :param client: The `Intellipush` client to poll through
+        :param state_path: File to persist the high-water mark in (JSON)
+        :param keyword: Only consume messages for this keyword
+        :param second_keyword: Only consume messages for this secondary keyword
+        :param items: Number of messages to request on each page
+        :param max_pages: Maximum number of pages to read in the first poll, when there's no high-water mark yet -
+               older messages are left out
+        :param handlers: dict mapping a keyword to a callable receiving each new message for that keyword
+        :param default_handler: Callable receiving messages that don't match any of the `handlers`
+        :param max_workers: Number of threads running handlers
+        :param min_interval: Shortest number of seconds between polls
+        :param max_interval: Longest number of seconds between polls
+        :param backoff: Multiplier for the interval after a poll without new messages
+        """
+        self.client = client
+        self.state_path = state_path
+        self.keyword = keyword
+        self.second_keyword = second_keyword
+        self.items = items
+        self.max_pages = max_pages
+        self.handlers = handlers or {}
+        self.default_handler = default_handler
+        self.max_workers = max_workers
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = min_interval
+        self.last_id = None
+        self.last_timestamp = None
+
+        self._load_state()
+
+    def poll(self):
+        """
+        Fetch the messages received since the last poll. The high-water mark is advanced in memory, but not persisted
+        - call `commit` when the messages have been processed.
+
+        :return: A list of new messages, oldest first
+        """
+        new_messages = {}
+        page = 1
+
+        # Without a high-water mark there's nothing to page back to - only the newest `max_pages` pages are read
+        while self.last_id is not None or page <= self.max_pages:
+            messages = self.client.received_smses(
+                items=self.items,
+                page=page,
+                keyword=self.keyword,
+                second_keyword=self.second_keyword,
+            ) or []
+
+            unseen = [message for message in messages if self._is_new(message)]
+
+            # Messages arriving while the pages are read push the older ones onto later pages, so a message can be
+            # seen twice
+            for message in unseen:
+                new_messages[self._message_id(message)] = message
+
+            if len(unseen) < len(messages) or len(messages) < self.items:
+                break
+
+            page += 1
+
+        new_messages = [new_messages[message_id] for message_id in sorted(new_messages)]
+
+        if new_messages:
+            newest = new_messages[-1]
+            self.last_id = self._message_id(newest)
+            self.last_timestamp = newest.get('created', self.last_timestamp)
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+
+        return new_messages
+
+    def commit(self):
+        """
+        Persist the current high-water mark to `state_path` (if given).
+        """
+        if not self.state_path:
+            return
+
+        temporary_path = self.state_path + '.tmp'
+
+        with open(temporary_path, 'w') as f:
+            json.dump({'last_id': self.last_id, 'last_timestamp': self.last_timestamp}, f)
+
+        os.replace(temporary_path, self.state_path)
+
+    def messages(self, stop_event=None):
+        """
+        Poll continuously, yielding each new message. The high-water mark is persisted when the caller asks for the
+        next message after the last one of a poll. A message counts as processed when the caller asks for the next
+        one - if the caller raises or stops early, the high-water mark is moved back to the last processed message,
+        so the rest are returned again.
+
+        :param stop_event: A `threading.Event` that stops the consumer when set
+        :return: generator of received messages
+        """
+        stop_event = stop_event or threading.Event()
+
+        while not stop_event.is_set():
+            previous = self.last_id, self.last_timestamp
+            batch = self.poll()
+            processed = 0
+
+            try:
+                for message in batch:
+                    yield message
+                    processed += 1
+            except BaseException:
+                self._rewind(batch, processed, previous)
+                raise
+
+            if batch:
+                self.commit()
+
+            stop_event.wait(self.interval)
+
+    def consume(self):
+        """
+        Poll once and dispatch the new messages to their handlers on the worker pool. The high-water mark is
+        persisted when every handler has finished. If a handler raises, the high-water mark is moved back to just
+        before the oldest message that failed, so it and any newer messages are dispatched again by the next call, and
+        the exception is raised.
+
+        :return: The number of messages handled
+        """
+        previous = self.last_id, self.last_timestamp
+        messages = self.poll()
+
+        if not messages:
+            return 0
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(handler, message): index for index, message, handler in self._route(messages)}
+            failed = None
+
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    if failed is None or futures[future] < failed[0]:
+                        failed = futures[future], e
+
+        if failed is not None:
+            self._rewind(messages, failed[0], previous)
+            self.commit()
+            raise failed[1]
+
+        self.commit()
+        return len(messages)
+
+    def run(self, stop_event=None):
+        """
+        Keep consuming messages until `stop_event` is set.
+
+        :param stop_event: A `threading.Event` that stops the consumer when set
+        """
+        stop_event = stop_event or threading.Event()
+
+        while not stop_event.is_set():
+            self.consume()
+            stop_event.wait(self.interval)
+
+    def _route(self, messages):
+        for index, message in enumerate(messages):
+            handler = self.handlers.get(message.get('keyword'), self.default_handler)
+
+            if handler:
+                yield index, message, handler
+
+    def _rewind(self, messages, processed, previous):
+        """
+        Move the high-water mark back to the last of the first `processed` messages from a poll, or to where it was
+        before the poll (`previous`) when none of them were processed.
+        """
+        if processed:
+            self.last_id = self._message_id(messages[processed - 1])
+            self.last_timestamp = messages[processed - 1].get('created', previous[1])
+        else:
+            self.last_id, self.last_timestamp = previous
+
+    def _is_new(self, message):
+        return self.last_id is None or self._message_id(message) > self.last_id
+
+    def _load_state(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+
+        with open(self.state_path) as f:
+            state = json.load(f)
+
+        self.last_id = state.get('last_id')
+        self.last_timestamp = state.get('last_timestamp')
+
+    @staticmethod
+    def _message_id(message):
+        return int(message['id'])
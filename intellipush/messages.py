@@ -1,8 +1,9 @@
+import copy
 import datetime
 
 
 class SMS:
-    def __init__(self, message, receivers=None, when=None, repeat=None, contact_id=None, contact_list_id=None, contact_list_filter=None):
+    def __init__(self, message, receivers=None, when=None, repeat=None, contact_id=None, contact_list_id=None, contact_list_filter=None, idempotency_key=None):
         self.method = 'sms'
         self.text_message = message
         self.receivers = receivers or []
@@ -15,4 +16,48 @@ class SMS:
         self.contact_id = contact_id
         self.contact_list_id = contact_list_id
         self.contact_list_filter = contact_list_filter
+        self.idempotency_key = idempotency_key
 
+
+
+def chunk_receivers(smses, chunk_size):
+    """
+    Group messages into chunks of at most `chunk_size` receivers, for sending as separate batch requests. A message
+    with more receivers than fit in the current chunk is split into copies that each carry a part of the receivers, so
+    the response rows of the chunks still follow the order of the messages and receivers given.
+
+    :param smses: iterable giving an `SMS` object for each iteration
+    :param chunk_size: Maximum number of receivers in each chunk
+    :return: generator giving a `(smses, receivers)` tuple - the list of `SMS` objects and the number of receivers -
+             for each chunk
+    """
+    chunk = []
+    size = 0
+
+    for sms in smses:
+        receivers = sms.receivers
+        start = 0
+
+        while len(receivers) - start > chunk_size - size:
+            part = copy.copy(sms)
+            part.receivers = receivers[start:start + chunk_size - size]
+            start += len(part.receivers)
+
+            yield chunk + [part], chunk_size
+            chunk = []
+            size = 0
+
+        if start:
+            sms = copy.copy(sms)
+            sms.receivers = receivers[start:]
+
+        chunk.append(sms)
+        size += len(sms.receivers)
+
+        if size >= chunk_size:
+            yield chunk, size
+            chunk = []
+            size = 0
+
+    if chunk:
+        yield chunk, size
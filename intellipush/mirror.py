@@ -0,0 +1,219 @@
+import json
+import sqlite3
+import threading
+
+from .client import IntellipushException
+
+
+INDEXED_FIELDS = ('countrycode', 'phonenumber', 'email', 'company', 'param1', 'param2', 'param3')
+
+
+class ContactMirror:
+    def __init__(self, path=':memory:'):
+        """
+        A local copy of the contacts in an Intellipush account, so lookups by id, phone number, email, company or
+        `param1` to `param3` don't need a request to the API.
+
+        The mirror is filled by `sync`, which pages through every contact, and kept current by the client when it's
+        given as `contact_mirror` to `Intellipush` - contacts created, updated or deleted through the client are
+        updated in the mirror, and `contact()` lookups are served from it. A lookup the mirror can't answer is sent to
+        the API and the contact found is added to the mirror. Other changes made elsewhere are picked up by the next
+        `sync`.
+
+        The contacts are kept in SQLite (in memory unless `path` is given), with an index on each of the lookup
+        fields.
+
+        :param path: Path to the SQLite file keeping the mirror
+        """
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS contacts ('
+            'id TEXT PRIMARY KEY, ' +
+            ''.join(field + ' TEXT, ' for field in INDEXED_FIELDS) +
+            'generation INTEGER NOT NULL DEFAULT 0, '
+            'data TEXT NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS contacts_phone ON contacts (phonenumber, countrycode)')
+
+        for field in INDEXED_FIELDS[2:]:
+            self._db.execute('CREATE INDEX IF NOT EXISTS contacts_{0} ON contacts ({0})'.format(field))
+
+        self._db.commit()
+
+    def sync(self, client, items=500, max_pages=None):
+        """
+        Replace the contents of the mirror with every contact in the account, fetched page by page through
+        `Intellipush.contacts`. Contacts that no longer exist are removed when the sync completes.
+
+        :param client: The `Intellipush` client to fetch the contacts through
+        :param items: Number of contacts to fetch in each request
+        :param max_pages: Stop after this many pages (contacts not seen are kept if the sync is stopped early)
+        :return: The number of contacts fetched
+        """
+        with self._lock:
+            self._generation = (self._db.execute('SELECT MAX(generation) FROM contacts').fetchone()[0] or 0) + 1
+            generation = self._generation
+
+        fetched = 0
+        page = 1
+
+        while max_pages is None or page <= max_pages:
+            contacts = client.contacts(items=items, page=page)
+
+            if contacts is None:
+                raise MirrorSyncException('Fetching page {0} of the contacts failed'.format(page))
+
+            with self._lock:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO contacts VALUES (?, {0}?, ?)'.format('?, ' * len(INDEXED_FIELDS)),
+                    [self._row(contact, generation) for contact in contacts],
+                )
+                self._db.commit()
+
+            fetched += len(contacts)
+
+            if len(contacts) < items:
+                with self._lock:
+                    self._db.execute('DELETE FROM contacts WHERE generation < ?', (generation, ))
+                    self._db.commit()
+
+                break
+
+            page += 1
+
+        return fetched
+
+    def upsert(self, contact):
+        """
+        Add a contact to the mirror, or replace it if a contact with the same `id` exists.
+
+        :param contact: dict with the contact's fields, including `id`
+        """
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO contacts VALUES (?, {0}?, ?)'.format('?, ' * len(INDEXED_FIELDS)),
+                self._row(contact, self._generation),
+            )
+            self._db.commit()
+
+    def update(self, contact_id, fields):
+        """
+        Update some of the fields of a mirrored contact. Nothing happens if the contact isn't in the mirror.
+
+        :param contact_id: ID of the contact
+        :param fields: dict with the new values
+        """
+        with self._lock:
+            existing = self._db.execute('SELECT data FROM contacts WHERE id = ?', (str(contact_id), )).fetchone()
+
+            if existing is None:
+                return
+
+            contact = json.loads(existing[0])
+            contact.update(fields)
+            self._db.execute(
+                'INSERT OR REPLACE INTO contacts VALUES (?, {0}?, ?)'.format('?, ' * len(INDEXED_FIELDS)),
+                self._row(contact, self._generation),
+            )
+            self._db.commit()
+
+    def delete(self, contact_id):
+        """
+        :param contact_id: ID of the contact to remove from the mirror
+        """
+        with self._lock:
+            self._db.execute('DELETE FROM contacts WHERE id = ?', (str(contact_id), ))
+            self._db.commit()
+
+    def get(self, contact_id):
+        """
+        :param contact_id: ID of the contact
+        :return: The contact, or None if it isn't in the mirror
+        """
+        found = self.query(id=contact_id, limit=1)
+        return found[0] if found else None
+
+    def by_phone(self, countrycode, phonenumber):
+        """
+        :param countrycode: Country code of the contact (i.e. `0047`)
+        :param phonenumber: Phone number of the contact
+        :return: The contact, or None if it isn't in the mirror
+        """
+        found = self.query(countrycode=countrycode, phonenumber=phonenumber, limit=1)
+        return found[0] if found else None
+
+    def by_email(self, email):
+        """
+        :param email: Email address
+        :return: list of the contacts with the email address
+        """
+        return self.query(email=email)
+
+    def query(self, limit=None, offset=0, **fields):
+        """
+        Find the contacts where every given field is equal to the given value, i.e.
+        `mirror.query(company='Example Inc.', param1='gold')`. Values are compared as strings.
+
+        :param limit: Maximum number of contacts to return
+        :param offset: Number of matching contacts to skip
+        :param fields: Values to match - `id` and the indexed fields (`countrycode`, `phonenumber`, `email`,
+               `company`, `param1`, `param2` and `param3`)
+        :return: list of the matching contacts, ordered by id
+        """
+        where, values = self._where(fields)
+        sql = 'SELECT data FROM contacts' + where + ' ORDER BY CAST(id AS INTEGER), id'
+
+        if limit is not None or offset:
+            sql += ' LIMIT ? OFFSET ?'
+            values += (-1 if limit is None else limit, offset)
+
+        with self._lock:
+            return [json.loads(row[0]) for row in self._db.execute(sql, values)]
+
+    def count(self, **fields):
+        """
+        :param fields: Values to match, as for `query`
+        :return: The number of matching contacts
+        """
+        where, values = self._where(fields)
+
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM contacts' + where, values).fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def _where(fields):
+        conditions = []
+        values = ()
+
+        for field, value in fields.items():
+            if field != 'id' and field not in INDEXED_FIELDS:
+                raise ValueError('Contacts can\'t be queried by ' + field)
+
+            if value is None:
+                conditions.append(field + ' IS NULL')
+            else:
+                conditions.append(field + ' = ?')
+                values += (str(value), )
+
+        return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), values
+
+    @staticmethod
+    def _row(contact, generation):
+        if contact.get('id') is None:
+            raise ValueError('A contact needs an `id` to be mirrored')
+
+        indexed = tuple(None if contact.get(field) is None else str(contact[field]) for field in INDEXED_FIELDS)
+        return (str(contact['id']), ) + indexed + (generation, json.dumps(contact))
+
+
+class MirrorSyncException(IntellipushException):
+    pass
@@ -0,0 +1,328 @@
+import json
+import sqlite3
+import threading
+import time
+
+from .client import Intellipush
+from .transports import request_not_sent
+from .utils import post_object_as_json
+
+
+PENDING = 'pending'
+INFLIGHT = 'inflight'
+SENT = 'sent'
+FAILED = 'failed'
+UNKNOWN = 'unknown'
+
+
+class Outbox:
+    def __init__(self, path, commit_every=500, commit_interval=0.05, resend_inflight=True):
+        """
+        A durable, disk-backed queue of messages waiting to be sent through Intellipush.
+
+        Messages are appended to a local write-ahead log (an SQLite database in WAL mode) and drained to the API in
+        batches by `drain` or `run`. Each message is marked with the notification id returned by the API once its
+        batch has been acknowledged, so a restarted process continues from the first message that wasn't confirmed.
+
+        `enqueue` only returns once the message has been committed to disk. Messages enqueued by several threads at
+        the same time are committed together: a thread waits (at most `commit_interval` seconds) for the other
+        enqueues in progress to join its commit, which is made as soon as no other enqueue is in progress or
+        `commit_every` messages are waiting. A single thread enqueueing alone commits right away - use
+        `enqueue_many` to group its messages into one commit.
+
+        A batch that fails after it may have reached the API (i.e. a read timeout) is queued again if
+        `resend_inflight` is True, or marked as `unknown` if it's False. A batch that failed before it was sent is
+        always queued again.
+
+        :param path: Path to the SQLite file backing the outbox
+        :param commit_every: Commit right away when this many enqueued messages are waiting
+        :param commit_interval: Maximum number of seconds an enqueue waits for other enqueues to join its commit
+        :param resend_inflight: Messages that were submitted to the API but not acknowledged (when the previous process
+               stopped, or when the request failed without a response) are queued again if True (at-least-once
+               delivery), or marked as `unknown` for manual reconciliation if False.
+        """
+        self.path = path
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.resend_inflight = resend_inflight
+        self._lock = threading.RLock()
+        self._committed = threading.Condition(self._lock)
+        self._entering_lock = threading.Lock()
+        self._entering = 0
+        self._uncommitted = 0
+        self._group = 0
+        self._group_started = None
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level='DEFERRED')
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS outbox ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'payload TEXT NOT NULL, '
+            'state TEXT NOT NULL, '
+            'notification_id TEXT, '
+            'error_code INTEGER, '
+            'error_message TEXT, '
+            'created REAL NOT NULL, '
+            'updated REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS outbox_state ON outbox (state, id)')
+        self._recover(resend_inflight)
+
+    def enqueue(self, sms):
+        """
+        Append an `SMS` object to the outbox - one entry is created for each receiver.
+
+        :param sms: SMS object (`intellipush.messages.SMS`)
+        :return: A list of the outbox ids created for the message
+        """
+        return self.enqueue_many((sms, ))
+
+    def enqueue_many(self, smses):
+        """
+        Append a list of `SMS` objects to the outbox, in a single commit.
+
+        :param smses: iterable giving an `SMS` object for each iteration
+        :return: A list of the outbox ids created, in the same order as the messages and their receivers - the
+                 messages are on disk when this returns
+        """
+        now = time.time()
+        rows = []
+
+        for sms in smses:
+            for receiver in sms.receivers:
+                post_object = Intellipush._sms_as_post_object(sms=sms, receiver=receiver)
+                rows.append((post_object_as_json(post_object), PENDING, now, now))
+
+        ids = []
+
+        with self._entering_lock:
+            self._entering += 1
+
+        with self._lock:
+            for row in rows:
+                ids.append(self._db.execute(
+                    'INSERT INTO outbox (payload, state, created, updated) VALUES (?, ?, ?, ?)',
+                    row,
+                ).lastrowid)
+
+            self._uncommitted += len(rows)
+            group = self._group
+
+            if self._group_started is None:
+                self._group_started = time.monotonic()
+
+            with self._entering_lock:
+                self._entering -= 1
+                others = self._entering
+
+            # Wait for the enqueues in progress to join this commit - whoever finds the group complete (or the wait
+            # over) commits it, and everybody in the group returns once it's on disk
+            while self._group == group:
+                remaining = self._group_started + self.commit_interval - time.monotonic()
+
+                if not others or remaining <= 0 or self._uncommitted >= self.commit_every:
+                    self._commit()
+                    break
+
+                self._committed.wait(remaining)
+
+                with self._entering_lock:
+                    others = self._entering
+
+        return ids
+
+    def flush(self):
+        """
+        Commit any enqueued messages that are still waiting for a group commit.
+        """
+        with self._lock:
+            self._commit()
+
+    def drain(self, client, batch_size=100, max_batches=None):
+        """
+        Send pending messages through `client` in batches until the outbox is empty.
+
+        Each batch is marked as in flight before it is submitted, and every message is marked as `sent` (together with
+        its notification id) or `failed` as soon as the API has responded. If the request fails, the exception is
+        raised after the batch has been queued again - or marked as `unknown` if it may have reached the API and
+        `resend_inflight` is False.
+
+        :param client: The `Intellipush` client to send the messages through
+        :param batch_size: Number of messages to submit in each request
+        :param max_batches: Stop after this many batches (None drains everything)
+        :return: The number of messages acknowledged by the API
+        """
+        acknowledged = 0
+        batches = 0
+
+        while max_batches is None or batches < max_batches:
+            claimed = self._claim(batch_size)
+
+            if not claimed:
+                break
+
+            ids = [row[0] for row in claimed]
+
+            try:
+                result = client._send_batch([json.loads(row[1]) for row in claimed])
+            except Exception as e:
+                if request_not_sent(e) or self.resend_inflight:
+                    self._release(ids)
+                else:
+                    self._mark_unknown(ids, 'Request failed after it was sent: ' + repr(e))
+
+                raise
+
+            if result is None:
+                # The batch was rejected as a whole, so none of its messages were sent
+                result = [{
+                    'success': False,
+                    'errorcode': client.last_error_code,
+                    'status_message': client.last_error_message,
+                }] * len(ids)
+
+            acknowledged += self._acknowledge(ids, result)
+            batches += 1
+
+        return acknowledged
+
+    def run(self, client, batch_size=100, idle_interval=1.0, stop_event=None):
+        """
+        Sender loop - keep draining the outbox until `stop_event` is set. Sleeps `idle_interval` seconds whenever the
+        outbox is empty.
+
+        :param client: The `Intellipush` client to send the messages through
+        :param batch_size: Number of messages to submit in each request
+        :param idle_interval: Seconds to wait before checking for new messages when the outbox is empty
+        :param stop_event: A `threading.Event` that stops the loop when set
+        """
+        stop_event = stop_event or threading.Event()
+
+        while not stop_event.is_set():
+            if not self.drain(client, batch_size=batch_size, max_batches=1):
+                stop_event.wait(idle_interval)
+
+    def entry(self, outbox_id):
+        """
+        Retrieve the current state of an outbox entry.
+
+        :param outbox_id: The id returned from `enqueue`
+        :return: dict with `id`, `state`, `notification_id`, `error_code` and `error_message`, or None if not found
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT id, state, notification_id, error_code, error_message FROM outbox WHERE id = ?',
+                (outbox_id, ),
+            ).fetchone()
+
+        if not row:
+            return None
+
+        return dict(zip(('id', 'state', 'notification_id', 'error_code', 'error_message'), row))
+
+    def stats(self):
+        """
+        Count the entries in the outbox by their state.
+
+        :return: dict with the number of entries for each state
+        """
+        with self._lock:
+            self._commit()
+            counts = dict(self._db.execute('SELECT state, COUNT(*) FROM outbox GROUP BY state').fetchall())
+
+        return {state: counts.get(state, 0) for state in (PENDING, INFLIGHT, SENT, FAILED, UNKNOWN)}
+
+    def close(self):
+        """
+        Commit any remaining messages and close the underlying database.
+        """
+        with self._lock:
+            self._commit()
+            self._db.close()
+
+    def _commit(self):
+        self._db.commit()
+        self._uncommitted = 0
+        self._group += 1
+        self._group_started = None
+        self._committed.notify_all()
+
+    def _recover(self, resend_inflight):
+        """
+        Handle entries left in flight by a previous process that stopped before the API response was recorded.
+        """
+        with self._lock:
+            self._db.execute(
+                'UPDATE outbox SET state = ?, updated = ? WHERE state = ?',
+                (PENDING if resend_inflight else UNKNOWN, time.time(), INFLIGHT),
+            )
+            self._commit()
+
+    def _claim(self, batch_size):
+        with self._lock:
+            self._commit()
+            claimed = self._db.execute(
+                'SELECT id, payload FROM outbox WHERE state = ? ORDER BY id LIMIT ?',
+                (PENDING, batch_size),
+            ).fetchall()
+
+            if claimed:
+                self._db.executemany(
+                    'UPDATE outbox SET state = ?, updated = ? WHERE id = ?',
+                    [(INFLIGHT, time.time(), row[0]) for row in claimed],
+                )
+                self._commit()
+
+        return claimed
+
+    def _release(self, ids):
+        """
+        Return claimed entries to the queue when the request failed.
+        """
+        with self._lock:
+            self._db.executemany(
+                'UPDATE outbox SET state = ?, updated = ? WHERE id = ?',
+                [(PENDING, time.time(), outbox_id) for outbox_id in ids],
+            )
+            self._commit()
+
+    def _mark_unknown(self, ids, message):
+        """
+        Mark claimed entries as `unknown` when the API may have received their batch without answering.
+        """
+        with self._lock:
+            self._db.executemany(
+                'UPDATE outbox SET state = ?, error_message = ?, updated = ? WHERE id = ?',
+                [(UNKNOWN, message, time.time(), outbox_id) for outbox_id in ids],
+            )
+            self._commit()
+
+    def _acknowledge(self, ids, result):
+        now = time.time()
+        updates = []
+        acknowledged = 0
+
+        for index, outbox_id in enumerate(ids):
+            status = result[index] if result and index < len(result) else None
+
+            if status and status.get('success'):
+                data = status.get('data') or {}
+                notification_id = data.get('id')
+                updates.append((SENT, None if notification_id is None else str(notification_id), None, None, now, outbox_id))
+                acknowledged += 1
+            elif status:
+                updates.append((FAILED, None, status.get('errorcode'), status.get('status_message'), now, outbox_id))
+            else:
+                updates.append((UNKNOWN, None, None, 'Missing response for message in batch', now, outbox_id))
+
+        with self._lock:
+            self._db.executemany(
+                'UPDATE outbox SET state = ?, notification_id = ?, error_code = ?, error_message = ?, updated = ? '
+                'WHERE id = ?',
+                updates,
+            )
+            self._commit()
+
+        return acknowledged
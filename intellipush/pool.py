@@ -0,0 +1,191 @@
+import collections
+import concurrent.futures
+import threading
+import time
+
+from .client import Intellipush, IntellipushException
+from .messages import chunk_receivers
+from .transports import RequestsTransport
+from .utils import RateLimiter
+
+
+class UnknownAccountException(IntellipushException):
+    pass
+
+
+class ClientPool:
+    def __init__(self,
+                 accounts,
+                 router=None,
+                 default_account=None,
+                 rate_limits=None,
+                 transport=None,
+                 max_workers=8,
+                 **client_options
+    ):
+        """
+        Manage clients for several Intellipush accounts (i.e. one for each business unit) that share a single
+        connection pool.
+
+        Messages are routed to an account by `router`, a callable receiving an `SMS` object and returning the name of
+        the account to send it through (`default_account` is used if no router is given or it returns None). Each
+        account can have its own budget in `rate_limits` (messages per second), and metrics are kept per account.
+
+        :param accounts: dict mapping an account name to a `(key, secret)` tuple
+        :param router: Callable returning the account name for an `SMS` object
+        :param default_account: The account to use for messages the router doesn't route
+        :param rate_limits: dict mapping an account name to its maximum number of messages per second
+        :param transport: The transport shared by every account (a `RequestsTransport` is created if not given)
+        :param max_workers: Maximum number of concurrent requests in `send_smses`
+        :param client_options: Additional keyword arguments given to each `Intellipush` client
+        """
+        self.router = router
+        self.default_account = default_account
+        self.max_workers = max_workers
+        self.transport = transport or RequestsTransport(pool_size=max_workers)
+        self.clients = {
+            name: Intellipush(key=key, secret=secret, transport=self.transport, **client_options)
+            for name, (key, secret) in accounts.items()
+        }
+        self.limiters = {name: RateLimiter(rate) for name, rate in (rate_limits or {}).items()}
+
+        self._lock = threading.Lock()
+        self._metrics = collections.defaultdict(lambda: {
+            'requests': 0,
+            'messages': 0,
+            'failed_requests': 0,
+            'failed_messages': 0,
+            'seconds': 0.0,
+            'throttled_seconds': 0.0,
+        })
+
+    def client(self, account):
+        """
+        :param account: Name of the account
+        :return: The `Intellipush` client for the account
+        """
+        if account not in self.clients:
+            raise UnknownAccountException('No account named ' + str(account))
+
+        return self.clients[account]
+
+    def route(self, sms):
+        """
+        :param sms: SMS object (`intellipush.messages.SMS`)
+        :return: The name of the account the message should be sent through
+        """
+        account = self.router(sms) if self.router else None
+
+        if account is None:
+            account = self.default_account
+
+        if account not in self.clients:
+            raise UnknownAccountException('No account for message - routed to ' + str(account))
+
+        return account
+
+    def send_sms(self, sms):
+        """
+        Send a single message through the account it's routed to.
+
+        :param sms: SMS object (`intellipush.messages.SMS`)
+        :return: Response from the API
+        """
+        account = self.route(sms)
+        return self._call(account, len(sms.receivers), lambda client: client.send_sms(sms))
+
+    def send_smses(self, smses, chunk_size=500, on_error=None):
+        """
+        Route a list of messages to their accounts and send them as batches of at most `chunk_size` receivers - the
+        batches for every account are sent in parallel, each within the budget of its account. An account waits for
+        its budget before its batch is handed to the shared workers, so a throttled account doesn't hold up workers
+        that other accounts could use.
+
+        A batch that fails doesn't stop the others: each of its receivers gets a None row, and the exception is
+        counted in the metrics of the account and given to `on_error`.
+
+        :param smses: iterable giving an `SMS` object for each iteration
+        :param chunk_size: Maximum number of receivers in each batch request
+        :param on_error: Callable receiving the account name, the list of `SMS` objects and the exception for each
+               batch that failed
+        :return: dict mapping each account name to the list of response rows for the messages sent through it
+        """
+        routed = collections.OrderedDict()
+
+        for sms in smses:
+            routed.setdefault(self.route(sms), []).append(sms)
+
+        def send(account, chunk, size, throttled):
+            return self._call(account, size, lambda client: client.send_smses(chunk), throttled=throttled)
+
+        def submit(account, executor):
+            jobs = []
+
+            for chunk, size in chunk_receivers(routed[account], chunk_size):
+                throttled = self.limiters[account].acquire(size) if account in self.limiters else 0
+                jobs.append((chunk, size, executor.submit(send, account, chunk, size, throttled)))
+
+            return jobs
+
+        # Each account is fed to the shared workers from a thread of its own, where it waits for its budget
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(routed))) as feeders:
+                submitted = [(account, feeders.submit(submit, account, executor)) for account in routed]
+                jobs = [(account, job) for account, future in submitted for job in future.result()]
+
+        results = {account: [] for account in routed}
+
+        for account, (chunk, size, future) in jobs:
+            try:
+                rows = future.result()
+            except Exception as e:
+                rows = None
+
+                if on_error is not None:
+                    on_error(account, chunk, e)
+
+            rows = list(rows or [])
+            results[account].extend(rows[:size] + [None] * (size - len(rows)))
+
+        return results
+
+    def metrics(self):
+        """
+        :return: dict mapping each account name to its metrics (requests, messages, failures, time spent sending and
+                 time spent waiting for its rate limit)
+        """
+        with self._lock:
+            return {name: dict(self._metrics[name]) for name in self.clients}
+
+    def _call(self, account, messages, func, throttled=None):
+        client = self.client(account)
+
+        if throttled is None:
+            throttled = self.limiters[account].acquire(messages) if account in self.limiters else 0
+
+        started = time.monotonic()
+        failed_messages = 0
+
+        try:
+            result = func(client)
+        except Exception:
+            self._record(account, messages, throttled, time.monotonic() - started, True, messages)
+            raise
+
+        if isinstance(result, list):
+            failed_messages = sum(1 for row in result if not row or not row.get('success'))
+        elif result is None:
+            failed_messages = messages
+
+        self._record(account, messages, throttled, time.monotonic() - started, False, failed_messages)
+        return result
+
+    def _record(self, account, messages, throttled, seconds, failed, failed_messages):
+        with self._lock:
+            metrics = self._metrics[account]
+            metrics['requests'] += 1
+            metrics['messages'] += messages
+            metrics['failed_requests'] += 1 if failed else 0
+            metrics['failed_messages'] += failed_messages
+            metrics['seconds'] += seconds
+            metrics['throttled_seconds'] += throttled
@@ -0,0 +1,133 @@
+import contextlib
+import threading
+import time
+
+
+# The stages of a request, in the order they happen
+STAGES = (
+    'build',
+    'encode',
+    'compress',
+    'connect',
+    'send',
+    'wait',
+    'request',
+    'download',
+    'decode',
+    'error_scan',
+)
+
+
+class StageProfiler:
+    def __init__(self):
+        """
+        Time each stage of the requests made by a client (given as `profiler` to `Intellipush`), adding up the time
+        spent in each stage for each endpoint:
+
+        - `build`: converting `SMS` objects to the data posted (`send_sms`, `send_smses`)
+        - `encode`: form encoding the request body (`php_encode`)
+        - `compress`: compressing the request body, if compression is enabled
+        - `connect`, `send`, `wait`: opening a connection (if a new one was needed), sending the request and waiting
+          for the first byte of the response. `HTTPClientTransport` times these separately, while
+          `RequestsTransport` reports them together as `request`.
+        - `download`: reading (and decompressing) the response body
+        - `decode`: decoding the JSON response
+        - `error_scan`: finding the first error in a batch response
+
+        The totals can be printed as a table with `format_table`, or written as collapsed stacks (the input format of
+        flamegraph tools such as `flamegraph.pl` and speedscope) with `write_collapsed`.
+        """
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def add(self, endpoint, stage, seconds):
+        """
+        :param endpoint: The API endpoint
+        :param stage: Name of the stage
+        :param seconds: Time spent in the stage
+        """
+        with self._lock:
+            total = self._totals.get((endpoint, stage))
+
+            if total is None:
+                self._totals[(endpoint, stage)] = [1, seconds, seconds]
+            else:
+                total[0] += 1
+                total[1] += seconds
+                total[2] = max(total[2], seconds)
+
+    @contextlib.contextmanager
+    def stage(self, endpoint, stage):
+        """
+        Time the code in a `with` block as a stage of requests to `endpoint`.
+        """
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.add(endpoint, stage, time.perf_counter() - started)
+
+    def report(self):
+        """
+        :return: dict mapping each endpoint to a dict mapping each stage to a dict with the number of `calls`, the
+                 `total` and `max` seconds spent in the stage
+        """
+        with self._lock:
+            totals = sorted(self._totals.items(), key=lambda item: (item[0][0], _stage_order(item[0][1])))
+
+        report = {}
+
+        for (endpoint, stage), (calls, total, longest) in totals:
+            report.setdefault(endpoint, {})[stage] = {'calls': calls, 'total': total, 'max': longest}
+
+        return report
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+    def format_table(self):
+        """
+        :return: The totals as a text table, with the share of each stage of the time spent on its endpoint
+        """
+        lines = ['{0:<36} {1:<11} {2:>8} {3:>11} {4:>9} {5:>9} {6:>6}'.format(
+            'endpoint', 'stage', 'calls', 'total ms', 'mean ms', 'max ms', '%',
+        )]
+
+        for endpoint, stages in self.report().items():
+            endpoint_total = sum(stage['total'] for stage in stages.values()) or 1
+
+            for name, stage in stages.items():
+                lines.append('{0:<36} {1:<11} {2:>8} {3:11.2f} {4:9.3f} {5:9.3f} {6:6.1f}'.format(
+                    endpoint,
+                    name,
+                    stage['calls'],
+                    stage['total'] * 1000,
+                    stage['total'] / stage['calls'] * 1000,
+                    stage['max'] * 1000,
+                    stage['total'] / endpoint_total * 100,
+                ))
+
+        return '\n'.join(lines)
+
+    def collapsed(self):
+        """
+        :return: The totals as collapsed stacks - one `intellipush;<endpoint>;<stage> <microseconds>` line per stage
+        """
+        return ''.join(
+            'intellipush;{0};{1} {2}\n'.format(endpoint, name, int(round(stage['total'] * 1000000)))
+            for endpoint, stages in self.report().items()
+            for name, stage in stages.items()
+        )
+
+    def write_collapsed(self, path):
+        """
+        :param path: File to write the collapsed stacks to (see `collapsed`)
+        """
+        with open(path, 'w') as f:
+            f.write(self.collapsed())
+
+
+def _stage_order(stage):
+    return STAGES.index(stage) if stage in STAGES else len(STAGES)
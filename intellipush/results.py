@@ -0,0 +1,191 @@
+import array
+import collections
+import json
+import threading
+
+from .messages import chunk_receivers
+
+
+class BatchResultStore:
+    def __init__(self, path):
+        """
+        Keep the response rows of large batch sends on disk instead of in memory. Give the store as `result_store` to
+        `Intellipush.send_smses` (or use `send_smses` on the store to send a campaign in chunks), and the rows are
+        written to `path` as JSON Lines while they're received.
+
+        Only the counts and the positions of the failed rows are kept in memory. The rows can be read back lazily with
+        `rows`, and the failed rows are read directly from their positions in the file with `failed_rows`.
+
+        Any existing file at `path` is replaced.
+
+        :param path: Path of the JSON Lines file to write the rows to
+        """
+        self.path = path
+        self.total = 0
+        self.succeeded = 0
+        self.error_codes = collections.Counter()
+
+        self._lock = threading.Lock()
+        self._file = open(path, 'wb')
+        self._failed_indexes = array.array('q')
+        self._failed_offsets = array.array('q')
+
+    @property
+    def failed(self):
+        """
+        :return: The number of failed rows
+        """
+        return len(self._failed_indexes)
+
+    def add(self, rows, expected=None):
+        """
+        Write response rows to the store.
+
+        If `expected` is given, exactly that many rows are written, so the positions of the rows still match the
+        receivers sent when the API rejected the whole batch - a single failed row is repeated for every receiver, and
+        any other missing rows are written as None.
+
+        :param rows: iterable of response rows (dicts as returned from `createBatch`)
+        :param expected: The number of receivers in the batch the rows are for
+        :return: The number of rows written
+        """
+        if expected is not None:
+            rows = _expected_rows(rows, expected)
+
+        added = 0
+
+        # The rows may be streamed from a response, so the lock is only held while each row is written
+        for row in rows:
+            line = json.dumps(row, separators=(',', ':')).encode('utf-8') + b'\n'
+
+            with self._lock:
+                if not row or not row.get('success'):
+                    self._failed_indexes.append(self.total)
+                    self._failed_offsets.append(self._file.tell())
+                    self.error_codes[row.get('errorcode') if row else None] += 1
+                else:
+                    self.succeeded += 1
+
+                self._file.write(line)
+                self.total += 1
+
+            added += 1
+
+        return added
+
+    def send_smses(self, client, smses, chunk_size=1000):
+        """
+        Send a campaign as batches of at most `chunk_size` receivers, streaming the response rows of each batch to the
+        store. Messages are taken from `smses` as they're needed, so it can be a generator, and a message with more
+        receivers than fit in a batch is split across batches. Each batch writes one row for each of its receivers
+        (see `add`).
+
+        :param client: The `Intellipush` client to send through
+        :param smses: iterable giving an `SMS` object for each iteration
+        :param chunk_size: Maximum number of receivers in each batch request
+        :return: The store
+        """
+        for chunk, size in chunk_receivers(smses, chunk_size):
+            client.send_smses(chunk, result_store=_ChunkResults(self, size))
+
+        return self
+
+    def summary(self):
+        """
+        :return: dict with the number of rows in `total`, `succeeded` and `failed`, and the number of failed rows for
+                 each error code in `error_codes`
+        """
+        with self._lock:
+            return {
+                'total': self.total,
+                'succeeded': self.succeeded,
+                'failed': len(self._failed_indexes),
+                'error_codes': dict(self.error_codes),
+            }
+
+    def failed_indexes(self):
+        """
+        :return: list of the positions of the failed rows (0-based, in the order the rows were received)
+        """
+        with self._lock:
+            return self._failed_indexes.tolist()
+
+    def rows(self):
+        """
+        :return: generator giving every row in the store, in order, read lazily from the file
+        """
+        self._flush()
+        yield from iter_results(self.path)
+
+    def failed_rows(self):
+        """
+        :return: generator giving `(index, row)` tuples for the failed rows, read from their positions in the file
+        """
+        self._flush()
+
+        with self._lock:
+            positions = list(zip(self._failed_indexes, self._failed_offsets))
+
+        with open(self.path, 'rb') as f:
+            for index, offset in positions:
+                f.seek(offset)
+                yield index, json.loads(f.readline())
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def _flush(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def iter_results(path):
+    """
+    Read the rows of a file written by `BatchResultStore` lazily, i.e. after the process that sent the batch has
+    exited.
+
+    :param path: Path of the JSON Lines file
+    :return: generator giving each row
+    """
+    with open(path, 'rb') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+class _ChunkResults:
+    """
+    The `result_store` given to `Intellipush.send_smses` for a batch of `size` receivers in
+    `BatchResultStore.send_smses`.
+    """
+    def __init__(self, store, size):
+        self.store = store
+        self.size = size
+
+    def add(self, rows):
+        return self.store.add(rows, expected=self.size)
+
+
+def _expected_rows(rows, expected):
+    count = 0
+    last = None
+
+    for row in rows:
+        if count < expected:
+            yield row
+
+        count += 1
+        last = row
+
+    # A batch rejected as a whole gives a single failed row
+    filler = last if count == 1 and not (last and last.get('success')) else None
+
+    for _ in range(count, expected):
+        yield filler
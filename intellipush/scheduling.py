@@ -0,0 +1,248 @@
+import datetime
+import itertools
+import json
+import sqlite3
+import threading
+
+from .client import Intellipush, IntellipushException, ServerSideException
+from .transports import request_not_sent
+from .utils import concurrent_map, post_object_as_json
+
+
+class SchedulePlanner:
+    def __init__(self, client, index_path=':memory:', chunk_size=500, max_workers=4, retries=2):
+        """
+        Plan and submit large numbers of scheduled messages.
+
+        Messages are added with a key of your own choice (i.e. the id of the reminder in your system), grouped by
+        their send time and submitted in chunks through `createBatch` - several chunks in parallel. The notification
+        ids returned by Intellipush are stored in a local index (SQLite - in memory unless `index_path` is given), so
+        that whole groups of messages can be rescheduled or cancelled by key or by send time, with the API calls
+        running in parallel.
+
+        :param client: The `Intellipush` client to send through
+        :param index_path: Path to the SQLite file keeping the key -> notification id index
+        :param chunk_size: Maximum number of messages in each `createBatch` request
+        :param max_workers: Maximum number of concurrent requests
+        :param retries: Number of retries for each failed request. Batches are only sent again if they failed before
+               the request was sent, so a batch that may have reached the API doesn't create the messages twice.
+        """
+        self.client = client
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.retries = retries
+        self._planned = []
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(index_path, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS scheduled ('
+            'key TEXT NOT NULL, '
+            'notification_id TEXT NOT NULL, '
+            'send_at TEXT, '
+            'payload TEXT NOT NULL, '
+            'PRIMARY KEY (key, notification_id))'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS scheduled_send_at ON scheduled (send_at)')
+
+    def add(self, key, sms):
+        """
+        Add a scheduled message to the plan. Nothing is sent until `submit` is called.
+
+        :param key: Your key for the message - used to reschedule or cancel it later
+        :param sms: SMS object (`intellipush.messages.SMS`) with `when` set
+        """
+        if not sms.when:
+            raise IntellipushException('Only scheduled messages (with `when` set) can be planned')
+
+        for receiver in sms.receivers:
+            self._planned.append((str(key), sms.when, Intellipush._sms_as_post_object(sms=sms, receiver=receiver)))
+
+    def submit(self):
+        """
+        Submit every planned message, grouped by send time and split into chunks of `chunk_size`. Each chunk is added
+        to the index as soon as it has been accepted, regardless of how the other chunks fare.
+
+        :return: A list of `(key, row)` tuples for the messages that the API rejected - `row` is the exception raised
+                 for the messages of a chunk whose request failed (use `intellipush.transports.request_not_sent` to
+                 tell whether they may have been created anyway)
+        """
+        planned = sorted(self._planned, key=lambda entry: entry[1])
+        self._planned = []
+        chunks = []
+
+        for _, group in itertools.groupby(planned, key=lambda entry: entry[1]):
+            group = list(group)
+
+            for offset in range(0, len(group), self.chunk_size):
+                chunks.append(group[offset:offset + self.chunk_size])
+
+        def send(chunk):
+            response = self.client._send_batch([entry[2] for entry in chunk])
+            indexed = []
+            failed = []
+
+            for index, (key, when, post_object) in enumerate(chunk):
+                row = response[index] if response and index < len(response) else None
+
+                if not row or not row.get('success'):
+                    failed.append((key, row))
+                    continue
+
+                indexed.append((key, str(row['data']['id']), when.isoformat(), post_object_as_json(post_object)))
+
+            with self._lock:
+                self._db.executemany('INSERT OR REPLACE INTO scheduled VALUES (?, ?, ?, ?)', indexed)
+                self._db.commit()
+
+            return failed
+
+        results = concurrent_map(
+            send,
+            chunks,
+            max_workers=self.max_workers,
+            retries=self.retries,
+            retry_on=request_not_sent,
+            return_exceptions=True,
+        )
+        failed = []
+
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                failed.extend((key, result) for key, _, _ in chunk)
+            else:
+                failed.extend(result)
+
+        return failed
+
+    def notification_ids(self, key):
+        """
+        :param key: Your key for the message
+        :return: A list of the notification ids created for the key
+        """
+        with self._lock:
+            return [row[0] for row in self._db.execute(
+                'SELECT notification_id FROM scheduled WHERE key = ?', (str(key), )
+            )]
+
+    def keys_at(self, when):
+        """
+        :param when: A `datetime.datetime`
+        :return: A list of the keys scheduled to be sent at `when`
+        """
+        with self._lock:
+            return [row[0] for row in self._db.execute(
+                'SELECT DISTINCT key FROM scheduled WHERE send_at = ?', (when.isoformat(), )
+            )]
+
+    def reschedule(self, keys, when):
+        """
+        Move the messages for the given keys to a new send time. The updates run in parallel, and only the messages
+        that the API updated are moved in the index. If any request failed, the exception is raised once the index has
+        been updated.
+
+        :param keys: iterable of your keys
+        :param when: The new send time (`datetime.datetime`)
+        :return: The number of messages updated
+        """
+        if not isinstance(when, datetime.datetime):
+            raise TypeError('`when` parameter must be a datetime.datetime object.')
+
+        entries = self._entries(keys)
+
+        def update(entry):
+            key, notification_id, payload = entry
+            data = json.loads(payload)
+            data['notification_id'] = notification_id
+            data['date'] = when.strftime('%Y-%m-%d')
+            data['time'] = when.strftime('%H:%M:%S')
+            return self.client._post('notification/updateNotification', data=data)
+
+        results = self._call_all(update, entries)
+        updated = [entry[1] for entry, result in zip(entries, results) if self._succeeded(result)]
+
+        with self._lock:
+            self._db.executemany(
+                'UPDATE scheduled SET send_at = ? WHERE notification_id = ?',
+                [(when.isoformat(), notification_id) for notification_id in updated],
+            )
+            self._db.commit()
+
+        self._raise_first(results)
+        return len(updated)
+
+    def reschedule_group(self, when, new_when):
+        """
+        Move every message scheduled at `when` to `new_when`.
+
+        :return: The number of messages updated
+        """
+        return self.reschedule(self.keys_at(when), new_when)
+
+    def cancel(self, keys):
+        """
+        Delete the scheduled messages for the given keys. The deletes run in parallel, and only the messages that the
+        API deleted are removed from the index. If any request failed, the exception is raised once the index has been
+        updated.
+
+        :param keys: iterable of your keys
+        :return: The number of messages deleted
+        """
+        entries = self._entries(keys)
+        notification_ids = [entry[1] for entry in entries]
+        results = self._call_all(self.client.delete_sms, notification_ids)
+        deleted = [
+            notification_id
+            for notification_id, result in zip(notification_ids, results)
+            if self._succeeded(result)
+        ]
+
+        with self._lock:
+            self._db.executemany(
+                'DELETE FROM scheduled WHERE notification_id = ?',
+                [(notification_id, ) for notification_id in deleted],
+            )
+            self._db.commit()
+
+        self._raise_first(results)
+        return len(deleted)
+
+    def cancel_group(self, when):
+        """
+        Delete every message scheduled at `when`.
+
+        :return: The number of messages deleted
+        """
+        return self.cancel(self.keys_at(when))
+
+    def _call_all(self, func, items):
+        # Updates and deletes can safely be sent again
+        return concurrent_map(
+            func,
+            items,
+            max_workers=self.max_workers,
+            retries=self.retries,
+            retry_on=(ServerSideException, ) + tuple(self.client.transport.exceptions),
+            return_exceptions=True,
+        )
+
+    @staticmethod
+    def _succeeded(result):
+        # `_post` gives None when the API rejected the request
+        return result is not None and not isinstance(result, Exception)
+
+    @staticmethod
+    def _raise_first(results):
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+    def _entries(self, keys):
+        entries = []
+
+        with self._lock:
+            for key in keys:
+                entries.extend(self._db.execute(
+                    'SELECT key, notification_id, payload FROM scheduled WHERE key = ?', (str(key), )
+                ))
+
+        return entries
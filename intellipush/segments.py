@@ -0,0 +1,145 @@
+from .contacts import ContactFilter
+
+
+FILTER_FIELDS = ('sex', 'age', 'country', 'company', 'param1', 'param2', 'param3')
+
+
+class SegmentEvaluator:
+    def __init__(self, contacts, fields=FILTER_FIELDS):
+        """
+        Apply `ContactFilter`s to a set of contacts locally - i.e. contacts exported from a contact list or kept in a
+        cache - to size and preview segments without asking the API.
+
+        The contacts are stored by column, and for each field a bitmap (an integer with one bit per contact) of the
+        contacts with each value is built the first time the field is filtered on. Evaluating a filter is then a
+        bitwise AND of one bitmap for each field in the filter, regardless of the number of contacts. Values shared by
+        few contacts (i.e. a field that is unique for each contact) keep the positions of their contacts instead, and
+        their bitmap is built when a filter asks for them, so the memory used stays linear in the number of contacts.
+
+        A contact matches a filter when every field set in the filter is equal to the contact's value (compared as
+        strings).
+
+        :param contacts: iterable of contacts (dicts, as returned from the API)
+        :param fields: The contact fields that can be filtered on
+        """
+        self.contacts = list(contacts)
+        self.fields = tuple(fields)
+        self.columns = {field: [_normalize(contact.get(field)) for contact in self.contacts] for field in self.fields}
+        self._all = (1 << len(self.contacts)) - 1
+        self._bitmaps = {}
+
+    def __len__(self):
+        return len(self.contacts)
+
+    def mask(self, contact_filter):
+        """
+        :param contact_filter: `intellipush.contacts.ContactFilter`
+        :return: A bitmap with the bits of the matching contacts set (bit `n` is the `n`th contact)
+        """
+        if not isinstance(contact_filter, ContactFilter):
+            raise TypeError('A `contacts.ContactFilter` object is required')
+
+        mask = self._all
+
+        for field, value in vars(contact_filter).items():
+            if value is None:
+                continue
+
+            if field not in self.columns:
+                raise ValueError('Contacts can\'t be filtered on ' + field)
+
+            bits = self._bitmap(field).get(_normalize(value), 0)
+
+            if isinstance(bits, tuple):
+                bits = _from_indexes(bits, len(self.contacts))
+
+            mask &= bits
+
+            if not mask:
+                break
+
+        return mask
+
+    def count(self, contact_filter):
+        """
+        :param contact_filter: `intellipush.contacts.ContactFilter`
+        :return: The number of contacts matching the filter
+        """
+        return _bit_count(self.mask(contact_filter))
+
+    def counts(self, contact_filters):
+        """
+        :param contact_filters: dict mapping a name to a `ContactFilter`
+        :return: dict mapping each name to the number of contacts matching its filter
+        """
+        return {name: self.count(contact_filter) for name, contact_filter in contact_filters.items()}
+
+    def select(self, contact_filter, limit=None):
+        """
+        :param contact_filter: `intellipush.contacts.ContactFilter`
+        :param limit: Maximum number of contacts to return (i.e. for a preview)
+        :return: list of the matching contacts, in the order they were given
+        """
+        return [self.contacts[index] for index in _bit_indexes(self.mask(contact_filter), limit)]
+
+    def _bitmap(self, field):
+        bitmap = self._bitmaps.get(field)
+
+        if bitmap is None:
+            positions = {}
+
+            for index, value in enumerate(self.columns[field]):
+                if value is not None:
+                    positions.setdefault(value, []).append(index)
+
+            # A bitmap takes a bit for every contact whatever the number of contacts with the value, so it's only
+            # built up front for values where it's smaller than the list of positions (8 bytes or more per position).
+            # At most 64 values can be this common, which keeps the total size linear in the number of contacts.
+            bitmap = {}
+
+            for value, indexes in positions.items():
+                if len(indexes) * 64 >= len(self.contacts):
+                    bitmap[value] = _from_indexes(indexes, len(self.contacts))
+                else:
+                    bitmap[value] = tuple(indexes)
+
+            self._bitmaps[field] = bitmap
+
+        return bitmap
+
+
+def _normalize(value):
+    return None if value is None else str(value)
+
+
+def _from_indexes(indexes, size):
+    # Set the bits in a byte array and convert it once - or'ing the bits into an integer one by one is quadratic in
+    # the number of contacts
+    bits = bytearray((size + 7) // 8)
+
+    for index in indexes:
+        bits[index >> 3] |= 1 << (index & 7)
+
+    return int.from_bytes(bits, 'little')
+
+
+def _bit_count(mask):
+    if hasattr(mask, 'bit_count'):
+        return mask.bit_count()
+
+    return bin(mask).count('1')
+
+
+def _bit_indexes(mask, limit=None):
+    indexes = []
+
+    for position, byte in enumerate(mask.to_bytes((mask.bit_length() + 7) // 8, 'little')):
+        while byte:
+            low = byte & -byte
+            indexes.append(position * 8 + low.bit_length() - 1)
+            byte ^= low
+
+            if limit is not None and len(indexes) >= limit:
+                return indexes
+
+    return indexes
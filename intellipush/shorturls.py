@@ -1,3 +1,189 @@
+import gzip
+import json
+import threading
+
+from .contacts import Target
+
+
 class ShorturlTarget:
     def __init__(self, contact_id=None, email=None, number=None):
         pass
+
+
+class ShorturlIndex:
+    def __init__(self):
+        """
+        A local index of shorturls and their children, for resolving shorturls without calling the API.
+
+        Fill the index with `sync` (a paginated read of all shorturls, including children) or `load` (a file written
+        by `save`), and give it to the client as `Intellipush(..., shorturl_index=index)` to keep it updated with the
+        shorturls created through `create_shorturl` and to serve `shorturl()` lookups from it.
+
+        Lookups by id, short URL and target are dictionary lookups.
+        """
+        self._lock = threading.Lock()
+        self._by_id = {}
+        self._by_short_url = {}
+        self._by_target = {}
+        self._target_of = {}
+
+    def sync(self, client, items=500):
+        """
+        Fill the index with every shorturl (including children) available on the account.
+
+        :param client: The `Intellipush` client to read the shorturls through
+        :param items: Number of shorturls to request on each page
+        :return: The number of shorturls read
+        """
+        page = 1
+        count = 0
+
+        while True:
+            shorturls = client.shorturls(items=items, page=page, include_children=True) or []
+
+            for shorturl in shorturls:
+                self.add(shorturl)
+
+            count += len(shorturls)
+
+            if len(shorturls) < items:
+                return count
+
+            page += 1
+
+    def add(self, shorturl, target=None):
+        """
+        Add or update a shorturl in the index.
+
+        :param shorturl: A shorturl as returned by the API
+        :param target: The `contacts.Target` the shorturl was created for, if not included in `shorturl`
+        """
+        if not shorturl or 'id' not in shorturl:
+            return
+
+        if target is not None and 'target' not in shorturl:
+            # Keep the target with the shorturl so it survives `save` and `load`
+            shorturl = dict(shorturl)
+            shorturl['target'] = {k: v for k, v in vars(target).items() if v is not None}
+
+        target_key = self._target_key(shorturl.get('target') or shorturl)
+
+        with self._lock:
+            self._remove(str(shorturl['id']))
+            self._by_id[str(shorturl['id'])] = shorturl
+
+            if shorturl.get('short_url'):
+                self._by_short_url[self._normalize(shorturl['short_url'])] = shorturl
+
+            if target_key:
+                self._by_target.setdefault(target_key, {})[str(shorturl['id'])] = shorturl
+                self._target_of[str(shorturl['id'])] = target_key
+
+    def remove(self, shorturl_id):
+        """
+        Remove a shorturl from the index.
+
+        :param shorturl_id: The id of the shorturl
+        """
+        with self._lock:
+            self._remove(str(shorturl_id))
+
+    def get(self, shorturl_id=None, shorturl=None):
+        """
+        Look up a shorturl by its id or by its short URL (with or without `http://host/`).
+
+        :return: The shorturl, or None if it isn't in the index
+        """
+        with self._lock:
+            if shorturl_id is not None:
+                return self._by_id.get(str(shorturl_id))
+
+            if shorturl:
+                return self._by_short_url.get(self._normalize(shorturl))
+
+        return None
+
+    def for_target(self, target):
+        """
+        Look up the shorturls created for a target.
+
+        :param target: A `contacts.Target` object
+        :return: A list of shorturls
+        """
+        with self._lock:
+            return list(self._by_target.get(self._target_key(target), {}).values())
+
+    def save(self, path):
+        """
+        Write the index to a gzipped JSON Lines file, so that other workers can `load` it.
+
+        :param path: Path to the file
+        """
+        with self._lock:
+            shorturls = list(self._by_id.values())
+
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            for shorturl in shorturls:
+                f.write(json.dumps(shorturl, separators=(',', ':')))
+                f.write('\n')
+
+    def load(self, path):
+        """
+        Add the shorturls from a file written by `save` to the index.
+
+        :param path: Path to the file
+        :return: The number of shorturls loaded
+        """
+        count = 0
+
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    self.add(json.loads(line))
+                    count += 1
+
+        return count
+
+    def __len__(self):
+        with self._lock:
+            return len(self._by_id)
+
+    def _remove(self, shorturl_id):
+        existing = self._by_id.pop(shorturl_id, None)
+
+        if not existing:
+            return
+
+        if existing.get('short_url'):
+            self._by_short_url.pop(self._normalize(existing['short_url']), None)
+
+        target_key = self._target_of.pop(shorturl_id, None)
+
+        if target_key:
+            shorturls = self._by_target[target_key]
+            del shorturls[shorturl_id]
+
+            if not shorturls:
+                del self._by_target[target_key]
+
+    @staticmethod
+    def _normalize(short_url):
+        return str(short_url).rstrip('/').rsplit('/', 1)[-1]
+
+    @staticmethod
+    def _target_key(target):
+        if isinstance(target, Target):
+            target = vars(target)
+
+        if not isinstance(target, dict):
+            return None
+
+        key = tuple(
+            None if target.get(field) is None else str(target.get(field))
+            for field in ('contact_id', 'email', 'countrycode', 'phonenumber')
+        )
+
+        if not any(key):
+            return None
+
+        return key
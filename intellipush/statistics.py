@@ -0,0 +1,191 @@
+import collections
+import threading
+import time
+
+
+Sample = collections.namedtuple('Sample', ('timestamp', 'unsent', 'contacts', 'contactlists'))
+
+
+class StatisticsSampler:
+    def __init__(self, client, min_interval=1.0, max_interval=30.0, backoff=1.5, history=300, on_sample=None):
+        """
+        Sample `Intellipush.statistics` in a background thread and keep the latest samples in memory.
+
+        The samples are kept in a ring buffer of `history` entries, and rates (queue drain per second and contact
+        growth per second) are computed from them. Reading the latest sample or the rates doesn't cause any API calls.
+
+        The polling interval adapts to activity: it's reset to `min_interval` while the number of unsent messages is
+        changing, and grows by `backoff` up to `max_interval` while nothing happens.
+
+        Batch senders can use `wait_for_capacity` to hold back while the server-side queue is too long.
+
+        :param client: The `Intellipush` client to sample statistics through
+        :param min_interval: Shortest number of seconds between samples
+        :param max_interval: Longest number of seconds between samples
+        :param backoff: Multiplier for the interval when nothing has changed
+        :param history: Number of samples to keep
+        :param on_sample: Callable receiving each new `Sample`
+        """
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.on_sample = on_sample
+        self.interval = min_interval
+
+        self._samples = collections.deque(maxlen=history)
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start sampling in a background (daemon) thread.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='intellipush-statistics', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the background thread.
+        """
+        self._stop_event.set()
+
+        if self._thread:
+            self._thread.join(timeout)
+
+    def sample(self):
+        """
+        Retrieve the statistics once and add them to the buffer.
+
+        :return: The new `Sample`, or None if the statistics couldn't be retrieved
+        """
+        stats = self.client.statistics()
+
+        if not stats or 'numberOf' not in stats:
+            return None
+
+        number_of = stats['numberOf']
+        sample = Sample(
+            timestamp=time.monotonic(),
+            unsent=self._int(number_of.get('unsentNotifications')),
+            contacts=self._int(number_of.get('contacts')),
+            contactlists=self._int(number_of.get('contactlists')),
+        )
+
+        with self._condition:
+            previous = self._samples[-1] if self._samples else None
+            self._samples.append(sample)
+
+            if previous and previous.unsent == sample.unsent:
+                self.interval = min(self.interval * self.backoff, self.max_interval)
+            else:
+                self.interval = self.min_interval
+
+            self._condition.notify_all()
+
+        if self.on_sample:
+            self.on_sample(sample)
+
+        return sample
+
+    def latest(self):
+        """
+        :return: The latest `Sample`, or None if nothing has been sampled yet
+        """
+        with self._condition:
+            return self._samples[-1] if self._samples else None
+
+    def samples(self):
+        """
+        :return: A list of the samples in the buffer, oldest first
+        """
+        with self._condition:
+            return list(self._samples)
+
+    def rates(self, window=None):
+        """
+        Compute rates from the samples in the buffer.
+
+        `drain_rate` is the number of queued messages leaving the server-side queue each second (negative while the
+        queue grows), and `contact_growth` is the number of contacts added each second.
+
+        :param window: Only use samples from the last `window` seconds (all samples if None)
+        :return: dict with `drain_rate` and `contact_growth`, or None if fewer than two samples are available
+        """
+        with self._condition:
+            samples = list(self._samples)
+
+        if window is not None and samples:
+            samples = [sample for sample in samples if sample.timestamp >= samples[-1].timestamp - window]
+
+        if len(samples) < 2:
+            return None
+
+        first, last = samples[0], samples[-1]
+        elapsed = last.timestamp - first.timestamp
+
+        if elapsed <= 0:
+            return None
+
+        return {
+            'drain_rate': self._delta(first.unsent, last.unsent, -1) / elapsed,
+            'contact_growth': self._delta(first.contacts, last.contacts, 1) / elapsed,
+        }
+
+    def should_throttle(self, max_unsent):
+        """
+        :param max_unsent: The maximum number of unsent messages acceptable on the server side
+        :return: True if the latest sample has more unsent messages than `max_unsent`
+        """
+        latest = self.latest()
+        return bool(latest and latest.unsent is not None and latest.unsent > max_unsent)
+
+    def wait_for_capacity(self, max_unsent, timeout=None):
+        """
+        Block until the latest sample shows no more than `max_unsent` unsent messages. Meant to be called by a batch
+        sender between chunks. The sampler has to be running (`start`) for new samples to arrive.
+
+        :param max_unsent: The maximum number of unsent messages acceptable on the server side
+        :param timeout: Maximum number of seconds to wait
+        :return: True if there is capacity, False if the timeout expired
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._condition:
+            while self.should_throttle(max_unsent):
+                remaining = None if deadline is None else deadline - time.monotonic()
+
+                if remaining is not None and remaining <= 0:
+                    return False
+
+                self._condition.wait(remaining)
+
+        return True
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.sample()
+            except Exception:
+                self.interval = min(self.interval * self.backoff, self.max_interval)
+
+            self._stop_event.wait(self.interval)
+
+    @staticmethod
+    def _delta(first, last, sign):
+        if first is None or last is None:
+            return 0
+
+        return sign * (last - first)
+
+    @staticmethod
+    def _int(value):
+        if value is None:
+            return None
+
+        return int(value)
@@ -0,0 +1,282 @@
+import asyncio
+import collections
+import heapq
+import threading
+import time
+
+from .client import ServerSideException
+from .utils import concurrent_map
+
+
+StatusChange = collections.namedtuple('StatusChange', ('notification_id', 'previous', 'current', 'final'))
+
+FINAL_STATES = ('sent', 'delivered', 'failed', 'error', 'undelivered', 'expired', 'deleted')
+
+
+def default_status(notification):
+    """
+    Extract the status from a notification returned by `Intellipush.fetch_sms`.
+
+    :param notification: The notification as returned by `fetch_sms` (never None - a notification that couldn't be
+           fetched is handled by `StatusTracker`)
+    :return: The status of the notification
+    """
+    return notification.get('status')
+
+
+def default_is_final(status):
+    """
+    Decide whether a status is final - a notification in a final state is no longer polled.
+
+    :param status: A status as returned by `default_status`
+    :return: True if the notification won't change any more
+    """
+    return str(status).lower() in FINAL_STATES
+
+
+class StatusTracker:
+    def __init__(self,
+                 client,
+                 notification_ids=(),
+                 on_change=None,
+                 max_workers=8,
+                 initial_interval=5.0,
+                 max_interval=300.0,
+                 backoff=2.0,
+                 status=default_status,
+                 is_final=default_is_final,
+                 missing_limit=None,
+                 on_error=None,
+    ):
+        """
+        Keep track of the delivery status of sent notifications by polling `fetch_sms` for each of them.
+
+        Notifications are polled concurrently. A notification whose status hasn't changed since the last poll is
+        polled less often (the interval is multiplied by `backoff`, up to `max_interval`), and a notification that has
+        reached a final state isn't polled again. The latest status of every notification is available from `status`
+        and `statuses` without any API calls.
+
+        Changes are reported through the `on_change` callback, by iterating over `changes()` or by iterating
+        asynchronously (`async for change in tracker`) - each change is a `StatusChange` tuple.
+
+        A notification that can't be fetched - the API returned an error, which may be temporary, or the request
+        failed after one retry - keeps its status and is polled again later. Failed requests are reported to
+        `on_error`. With `missing_limit`, a notification that the API returns an error for that many polls in a row is
+        reported as `deleted`.
+
+        :param client: The `Intellipush` client used for polling
+        :param notification_ids: The ids of the notifications to track
+        :param on_change: Callable receiving a `StatusChange` each time the status of a notification changes
+        :param max_workers: Maximum number of concurrent requests
+        :param initial_interval: Seconds between the first polls of a notification
+        :param max_interval: Maximum number of seconds between polls of a notification
+        :param backoff: Multiplier for the interval when a notification's status hasn't changed
+        :param status: Callable extracting the status from a notification returned by `fetch_sms`
+        :param is_final: Callable returning True if a status is final
+        :param missing_limit: Number of polls in a row returning an error before a notification is reported as
+               `deleted` (None keeps polling)
+        :param on_error: Callable receiving the notification id and the exception when polling a notification fails
+        """
+        self.client = client
+        self.on_change = on_change
+        self.max_workers = max_workers
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.status_of = status
+        self.is_final = is_final
+        self.missing_limit = missing_limit
+        self.on_error = on_error
+
+        self._lock = threading.Lock()
+        self._statuses = {}
+        self._intervals = {}
+        self._missing = {}
+        self._schedule = []
+
+        self.track(notification_ids)
+
+    def track(self, notification_ids):
+        """
+        Start tracking additional notifications. They're polled on the next call to `poll`.
+
+        :param notification_ids: iterable of notification ids
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            for notification_id in notification_ids:
+                if notification_id is None or notification_id in self._intervals:
+                    continue
+
+                self._statuses.setdefault(notification_id, None)
+                self._intervals[notification_id] = self.initial_interval
+                heapq.heappush(self._schedule, (now, notification_id))
+
+    def track_response(self, response):
+        """
+        Start tracking the notifications created by `send_sms` or `send_smses`.
+
+        :param response: The value returned from `send_sms` (a dict) or `send_smses` (a list of results)
+        """
+        if isinstance(response, dict):
+            response = [{'success': True, 'data': response}]
+
+        self.track(
+            row['data'].get('id')
+            for row in response or []
+            if row and row.get('success') and row.get('data')
+        )
+
+    def status(self, notification_id):
+        """
+        Get the latest known status of a notification.
+
+        :param notification_id: Id of the notification
+        :return: The latest status, or None if the notification hasn't been polled yet
+        """
+        with self._lock:
+            return self._statuses.get(notification_id)
+
+    def statuses(self):
+        """
+        :return: A dict with the latest known status for every tracked notification
+        """
+        with self._lock:
+            return dict(self._statuses)
+
+    @property
+    def pending(self):
+        """
+        :return: Number of notifications that haven't reached a final state yet
+        """
+        with self._lock:
+            return len(self._intervals)
+
+    def next_poll_in(self):
+        """
+        :return: Seconds until the next notification is due to be polled, or None if nothing is left to poll
+        """
+        with self._lock:
+            if not self._schedule:
+                return None
+
+            return max(0.0, self._schedule[0][0] - time.monotonic())
+
+    def poll(self):
+        """
+        Poll all notifications that are due and record their status.
+
+        :return: A list of `StatusChange` tuples for the notifications that changed status
+        """
+        now = time.monotonic()
+        due = []
+
+        with self._lock:
+            while self._schedule and self._schedule[0][0] <= now:
+                due.append(heapq.heappop(self._schedule)[1])
+
+        if not due:
+            return []
+
+        notifications = concurrent_map(
+            self.client.fetch_sms,
+            due,
+            max_workers=self.max_workers,
+            retries=1,
+            retry_on=(ServerSideException, ) + tuple(self.client.transport.exceptions),
+            return_exceptions=True,
+        )
+        changes = []
+        errors = []
+        now = time.monotonic()
+
+        with self._lock:
+            for notification_id, notification in zip(due, notifications):
+                previous = self._statuses.get(notification_id)
+
+                if isinstance(notification, Exception):
+                    errors.append((notification_id, notification))
+                    heapq.heappush(self._schedule, (now + self._intervals[notification_id], notification_id))
+                    continue
+
+                if notification is None:
+                    self._missing[notification_id] = self._missing.get(notification_id, 0) + 1
+
+                    if self.missing_limit is None or self._missing[notification_id] < self.missing_limit:
+                        heapq.heappush(self._schedule, (now + self._intervals[notification_id], notification_id))
+                        continue
+
+                    current = 'deleted'
+                    final = True
+                else:
+                    current = self.status_of(notification)
+                    final = self.is_final(current)
+
+                self._missing.pop(notification_id, None)
+                self._statuses[notification_id] = current
+
+                if current != previous:
+                    changes.append(StatusChange(notification_id, previous, current, final))
+                    interval = self.initial_interval
+                else:
+                    interval = min(self._intervals[notification_id] * self.backoff, self.max_interval)
+
+                if final:
+                    del self._intervals[notification_id]
+                    continue
+
+                self._intervals[notification_id] = interval
+                heapq.heappush(self._schedule, (now + interval, notification_id))
+
+        if self.on_error:
+            for notification_id, error in errors:
+                self.on_error(notification_id, error)
+
+        if self.on_change:
+            for change in changes:
+                self.on_change(change)
+
+        return changes
+
+    def changes(self, stop_event=None):
+        """
+        Poll until every notification has reached a final state (or `stop_event` is set), yielding each change.
+
+        :param stop_event: A `threading.Event` that stops polling when set
+        :return: generator of `StatusChange` tuples
+        """
+        stop_event = stop_event or threading.Event()
+
+        while not stop_event.is_set():
+            yield from self.poll()
+            wait = self.next_poll_in()
+
+            if wait is None:
+                return
+
+            stop_event.wait(wait)
+
+    def run(self, stop_event=None):
+        """
+        Poll until every notification has reached a final state (or `stop_event` is set). Changes are only reported
+        through `on_change`.
+
+        :param stop_event: A `threading.Event` that stops polling when set
+        """
+        for _ in self.changes(stop_event=stop_event):
+            pass
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            for change in await loop.run_in_executor(None, self.poll):
+                yield change
+
+            wait = self.next_poll_in()
+
+            if wait is None:
+                return
+
+            await asyncio.sleep(wait)
@@ -0,0 +1,597 @@
+import json as jsonlib
+import sys
+import threading
+import time
+import urllib.parse
+import weakref
+
+from .utils import decompressor
+
+
+DEFAULT_HEADERS = {
+    'Content-Type': 'application/x-www-form-urlencoded',
+}
+
+
+class ConnectError(OSError):
+    """
+    Raised by `HTTPClientTransport` when a connection to the API couldn't be opened - nothing was sent.
+    """
+    pass
+
+
+def request_not_sent(exception):
+    """
+    Tell whether a transport failed before any of the request was sent, i.e. while connecting. A request that failed
+    later (i.e. a read timeout) may have been received and acted on by the API, so sending it again can send messages
+    twice.
+
+    :param exception: An exception raised by a transport
+    :return: True if the request certainly didn't reach the API
+    """
+    if isinstance(exception, (ConnectError, ConnectionRefusedError)):
+        return True
+
+    # The libraries are only checked if they've been imported - if they haven't, they didn't raise the exception
+    requests = sys.modules.get('requests')
+
+    if requests is not None and isinstance(exception, requests.exceptions.ConnectionError):
+        if isinstance(exception, requests.exceptions.ConnectTimeout):
+            return True
+
+        urllib3 = sys.modules.get('urllib3')
+        reason = exception.args[0] if exception.args else None
+        reason = getattr(reason, 'reason', reason)
+        return urllib3 is not None and isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+    httpx = sys.modules.get('httpx')
+
+    if httpx is not None:
+        return isinstance(exception, (httpx.ConnectError, httpx.ConnectTimeout))
+
+    return False
+
+
+class Response:
+    def __init__(self, status_code, reason, content, headers=None):
+        """
+        A minimal response object with the parts of `requests.Response` that the client uses.
+
+        :param status_code: HTTP status code
+        :param reason: HTTP reason phrase
+        :param content: The response body as bytes
+        :param headers: dict of response headers (lowercase names)
+        """
+        self.status_code = status_code
+        self.reason = reason
+        self.content = content
+        self.headers = headers or {}
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return jsonlib.loads(self.content)
+
+
+class RequestsTransport:
+    def __init__(self, session=None, pool_size=10):
+        """
+        Send requests through `requests`. This is the default transport.
+
+        `requests` is imported the first time a request is made, so importing the client stays cheap for code that
+        never talks to the API.
+
+        :param session: A `requests.Session` to use. A session with a connection pool of `pool_size` connections is
+               created on first use if not given.
+        :param pool_size: Number of connections to keep open to the API
+        """
+        self.pool_size = pool_size
+        self._session = session
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+
+        return self._session
+
+    @property
+    def exceptions(self):
+        """
+        :return: Tuple of exception classes raised by the transport for connection level errors
+        """
+        import requests
+        return (requests.RequestException, )
+
+    def post(self, url, data, headers=None, timings=None):
+        """
+        :param timings: dict that the seconds spent waiting for the response headers (`request`, including connecting
+               and sending) and reading the body (`download`) are added to, if given
+        """
+        if timings is None:
+            return self.session.post(url=url, data=data, headers=headers)
+
+        started = time.perf_counter()
+        response = self.session.post(url=url, data=data, headers=headers, stream=True)
+        received = time.perf_counter()
+        response.content
+        _add_timing(timings, 'request', received - started)
+        _add_timing(timings, 'download', time.perf_counter() - received)
+        return response
+
+    def post_stream(self, url, data, headers=None, chunk_size=65536, timings=None):
+        """
+        Send a request and return the response body as an iterator of chunks as they arrive.
+
+        :param timings: dict that the seconds spent waiting for the response headers (`request`) and reading the body
+               (`download`, added as the chunks are read) are added to, if given
+        :return: A tuple of `(status_code, reason, chunks)`
+        """
+        if timings is None:
+            response = self.session.post(url=url, data=data, headers=headers, stream=True)
+            return response.status_code, response.reason, response.iter_content(chunk_size)
+
+        started = time.perf_counter()
+        response = self.session.post(url=url, data=data, headers=headers, stream=True)
+        _add_timing(timings, 'request', time.perf_counter() - started)
+        return response.status_code, response.reason, _timed_chunks(response.iter_content(chunk_size), timings)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+
+class HTTPClientTransport:
+    def __init__(self, pool_size=10, timeout=60):
+        """
+        A transport built only on the standard library (`http.client`) for workers where startup time matters more
+        than features - i.e. short-lived CLI tools and serverless functions. Connections are kept alive and reused,
+        with up to `pool_size` idle connections kept for each host. `http.client` is imported on first use.
+
+        Responses compressed with `gzip` or `deflate` are decompressed.
+
+        :param pool_size: Maximum number of idle connections kept for each host
+        :param timeout: Socket timeout in seconds
+        """
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._idle = {}
+
+    @property
+    def exceptions(self):
+        """
+        :return: Tuple of exception classes raised by the transport for connection level errors
+        """
+        import http.client
+        return (OSError, http.client.HTTPException)
+
+    def post(self, url, data, headers=None, timings=None):
+        """
+        :param timings: dict that the seconds spent connecting (`connect`), sending the request (`send`), waiting for
+               the response headers (`wait`) and reading the body (`download`) are added to, if given
+        """
+        key, connection, response = self._send(url, data, headers, timings)
+        started = time.perf_counter()
+        content = response.read()
+        self._finish(key, connection, response)
+        decoder = decompressor(response.getheader('Content-Encoding'))
+
+        if decoder:
+            content = decoder.decompress(content) + decoder.flush()
+
+        if timings is not None:
+            _add_timing(timings, 'download', time.perf_counter() - started)
+
+        return Response(
+            status_code=response.status,
+            reason=response.reason,
+            content=content,
+            headers={name.lower(): value for name, value in response.getheaders()},
+        )
+
+    def post_stream(self, url, data, headers=None, chunk_size=65536, timings=None):
+        """
+        Send a request and return the response body as an iterator of chunks as they arrive. The connection is
+        returned to the pool when the body has been read completely.
+
+        :param timings: dict that the seconds spent connecting (`connect`), sending the request (`send`), waiting for
+               the response headers (`wait`) and reading the body (`download`, added as the chunks are read) are added
+               to, if given
+        :return: A tuple of `(status_code, reason, chunks)`
+        """
+        key, connection, response = self._send(url, data, headers, timings)
+        decoder = decompressor(response.getheader('Content-Encoding'))
+
+        def chunks():
+            try:
+                while True:
+                    chunk = response.read1(chunk_size)
+
+                    if not chunk:
+                        break
+
+                    yield decoder.decompress(chunk) if decoder else chunk
+
+                if decoder:
+                    yield decoder.flush()
+            except BaseException:
+                connection.close()
+                raise
+
+            self._finish(key, connection, response)
+
+        if timings is None:
+            return response.status, response.reason, chunks()
+
+        return response.status, response.reason, _timed_chunks(chunks(), timings)
+
+    def _send(self, url, data, headers, timings=None):
+        import http.client
+
+        parsed = urllib.parse.urlsplit(url)
+        key = (parsed.scheme, parsed.netloc)
+        path = parsed.path or '/'
+
+        if parsed.query:
+            path += '?' + parsed.query
+
+        request_headers = dict(DEFAULT_HEADERS)
+        request_headers.update(headers or {})
+
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        connection, reused = self._acquire(key)
+
+        try:
+            response = self._request(connection, path, data, request_headers, timings)
+        except (OSError, http.client.HTTPException) as e:
+            connection.close()
+
+            # A kept-alive connection might have been closed by the server while idle - retry once on a new one. Only
+            # errors that mean the connection was already gone are retried: after a timeout (or any other error) the
+            # server may have received the request, and sending it again could deliver the messages twice.
+            stale = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+            if not reused or not isinstance(e, stale):
+                raise
+
+            connection, _ = self._acquire(key, fresh=True)
+
+            try:
+                response = self._request(connection, path, data, request_headers, timings)
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                raise
+
+        return key, connection, response
+
+    def _finish(self, key, connection, response):
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(key, connection)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    @staticmethod
+    def _request(connection, path, data, headers, timings=None):
+        if connection.sock is None:
+            started = time.perf_counter()
+
+            try:
+                connection.connect()
+            except OSError as e:
+                raise ConnectError(*e.args) from e
+
+            if timings is not None:
+                _add_timing(timings, 'connect', time.perf_counter() - started)
+
+        if timings is None:
+            connection.request('POST', path, body=data, headers=headers)
+            return connection.getresponse()
+
+        connected = time.perf_counter()
+        connection.request('POST', path, body=data, headers=headers)
+        sent = time.perf_counter()
+        response = connection.getresponse()
+
+        _add_timing(timings, 'send', sent - connected)
+        _add_timing(timings, 'wait', time.perf_counter() - sent)
+        return response
+
+    def _acquire(self, key, fresh=False):
+        import http.client
+
+        if not fresh:
+            with self._lock:
+                connections = self._idle.get(key)
+
+                if connections:
+                    return connections.pop(), True
+
+        scheme, netloc = key
+
+        if scheme == 'https':
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout), False
+
+        return http.client.HTTPConnection(netloc, timeout=self.timeout), False
+
+    def _release(self, key, connection):
+        with self._lock:
+            connections = self._idle.setdefault(key, [])
+
+            if len(connections) < self.pool_size:
+                connections.append(connection)
+                return
+
+        connection.close()
+
+
+
+class HTTP2Transport:
+    def __init__(self, pool_size=2, timeout=60, prior_knowledge=False):
+        """
+        Send requests over HTTP/2 with `httpx`, multiplexing concurrent requests as streams over a few connections
+        instead of opening a connection for each request in flight. Requires `pip install httpx[http2]` - it's
+        imported on first use.
+
+        The client can be shared by any number of threads. Their requests are sent from an event loop in a background
+        thread: the synchronous `httpx` client can open streams out of order when several threads share a connection,
+        which the server rejects as a protocol error. `post_async` sends requests from asyncio code over a separate
+        connection pool for each event loop (see `Intellipush.send_sms_async`).
+
+        :param pool_size: Maximum number of connections to each host
+        :param timeout: Timeout in seconds
+        :param prior_knowledge: Use HTTP/2 without negotiating it first - needed for `http://` URLs, as HTTP/2 is
+               only negotiated over TLS
+        """
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.prior_knowledge = prior_knowledge
+        self._lock = threading.Lock()
+        self._loop = None
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    @property
+    def async_client(self):
+        """
+        The `httpx.AsyncClient` for the running event loop. Its connections belong to the loop, so each loop (i.e.
+        each `asyncio.run`) gets a client of its own.
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            client = self._async_clients.get(loop)
+
+            if client is None:
+                client = self._async_clients[loop] = self._httpx().AsyncClient(**self._options())
+
+        return client
+
+    @property
+    def exceptions(self):
+        """
+        :return: Tuple of exception classes raised by the transport for connection level errors
+        """
+        return (self._httpx().TransportError, )
+
+    def post(self, url, data, headers=None, timings=None):
+        """
+        :param timings: dict that the seconds spent waiting for the response headers (`request`) and reading the body
+               (`download`) are added to, if given
+        """
+        self._httpx()
+
+        async def send():
+            client = self.async_client
+            request = client.build_request('POST', url, content=self._body(data), headers=self._headers(headers))
+            started = time.perf_counter()
+            response = await client.send(request, stream=True)
+            received = time.perf_counter()
+
+            try:
+                content = await response.aread()
+            finally:
+                await response.aclose()
+
+            if timings is not None:
+                _add_timing(timings, 'request', received - started)
+                _add_timing(timings, 'download', time.perf_counter() - received)
+
+            return self._response(response, content)
+
+        return self._run(send())
+
+    def post_stream(self, url, data, headers=None, chunk_size=65536, timings=None):
+        """
+        Send a request and return the response body as an iterator of chunks as they arrive.
+
+        :param timings: dict that the seconds spent waiting for the response headers (`request`) and reading the body
+               (`download`, added as the chunks are read) are added to, if given
+        :return: A tuple of `(status_code, reason, chunks)`
+        """
+        self._httpx()
+
+        async def send():
+            client = self.async_client
+            request = client.build_request('POST', url, content=self._body(data), headers=self._headers(headers))
+            return await client.send(request, stream=True)
+
+        started = time.perf_counter()
+        response = self._run(send())
+
+        if timings is not None:
+            _add_timing(timings, 'request', time.perf_counter() - started)
+        received = response.aiter_bytes(chunk_size)
+
+        async def next_chunk():
+            try:
+                return await received.__anext__()
+            except StopAsyncIteration:
+                return None
+
+        def chunks():
+            try:
+                while True:
+                    chunk = self._run(next_chunk())
+
+                    if chunk is None:
+                        break
+
+                    yield chunk
+            finally:
+                self._run(response.aclose())
+
+        if timings is None:
+            return response.status_code, response.reason_phrase, chunks()
+
+        return response.status_code, response.reason_phrase, _timed_chunks(chunks(), timings)
+
+    async def post_async(self, url, data, headers=None):
+        """
+        Send a request from asyncio code.
+
+        :return: A `Response`
+        """
+        response = await self.async_client.post(url, content=self._body(data), headers=self._headers(headers))
+        return self._response(response, response.content)
+
+    def close(self):
+        """
+        Close the connections used from threads and stop their event loop.
+        """
+        import asyncio
+
+        with self._lock:
+            loop, self._loop = self._loop, None
+
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+
+    async def aclose(self):
+        """
+        Close the connections used by `post_async` from the running event loop.
+        """
+        import asyncio
+
+        with self._lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+
+        if client is not None:
+            await client.aclose()
+
+    def _run(self, coroutine):
+        """
+        Run a coroutine on the event loop thread that sends the requests made from threads, and wait for its result.
+        """
+        import asyncio
+
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._serve, args=(self._loop, ), name='intellipush-http2', daemon=True).start()
+
+            loop = self._loop
+
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    @staticmethod
+    def _serve(loop):
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    def _options(self):
+        httpx = self._httpx()
+
+        return {
+            'http1': not self.prior_knowledge,
+            'http2': True,
+            'timeout': self.timeout,
+            'limits': httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+        }
+
+    @staticmethod
+    def _httpx():
+        try:
+            import httpx
+            import h2  # noqa: F401 - httpx needs `h2` for HTTP/2
+        except ImportError:
+            raise ImportError('HTTP2Transport requires httpx with HTTP/2 support: pip install httpx[http2]')
+
+        return httpx
+
+    @staticmethod
+    def _body(data):
+        # httpx takes any other iterable than bytes as a stream of chunks
+        if isinstance(data, bytearray):
+            return bytes(data)
+
+        return data.encode('utf-8') if isinstance(data, str) else data
+
+    @staticmethod
+    def _headers(headers):
+        request_headers = dict(DEFAULT_HEADERS)
+        request_headers.update(headers or {})
+        return request_headers
+
+    @staticmethod
+    def _response(response, content):
+        return Response(
+            status_code=response.status_code,
+            reason=response.reason_phrase,
+            content=content,
+            headers={name.lower(): value for name, value in response.headers.items()},
+        )
+
+
+def _add_timing(timings, stage, seconds):
+    timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def _timed_chunks(chunks, timings):
+    """
+    Add the time spent waiting for each chunk of a streamed response to `timings` as `download`.
+    """
+    chunks = iter(chunks)
+
+    try:
+        while True:
+            started = time.perf_counter()
+
+            try:
+                chunk = next(chunks)
+            finally:
+                _add_timing(timings, 'download', time.perf_counter() - started)
+
+            yield chunk
+    except StopIteration:
+        return
+    finally:
+        close = getattr(chunks, 'close', None)
+
+        if close is not None:
+            close()
@@ -0,0 +1,185 @@
+import asyncio
+import collections
+import concurrent.futures
+import threading
+import time
+
+from .client import Intellipush, IntellipushException, TwoFactorAuthenticationIsAlreadyActive
+
+
+class TwoFactorRateLimitExceeded(IntellipushException):
+    pass
+
+
+class TwoFactorService:
+    def __init__(self, client, code_ttl=300, max_sends=3, rate_window=600, validation_transport=None, max_workers=20):
+        """
+        A service layer around `two_factor_send` and `two_factor_validate` for high-volume login flows.
+
+        The service remembers which phone numbers have an active code (for `code_ttl` seconds, or until the code has
+        been validated), so a repeated send for the same number is answered locally instead of ending up as a
+        `TwoFactorAuthenticationIsAlreadyActive` round-trip. Concurrent sends to the same number wait for the one in
+        flight instead of reaching the API as well. Sends are rate-limited to `max_sends` for each phone number within
+        `rate_window` seconds.
+
+        With a `validation_transport`, validation is performed through a separate client using that transport, so
+        validation requests don't queue behind other traffic sharing the connections of `client`. `send_async` and
+        `validate_async` run the calls on a dedicated thread pool for use from asyncio code.
+
+        :param client: The `Intellipush` client to send codes through. Its credentials are used for validation.
+        :param code_ttl: Number of seconds a sent code is considered active
+        :param max_sends: Maximum number of codes sent to a phone number within `rate_window`
+        :param rate_window: Number of seconds in the rate limit window
+        :param validation_transport: A transport (see `intellipush.transports`) with its own connections for
+               validation requests - `client` is used for validation if not given
+        :param max_workers: Number of threads used by the async methods
+        """
+        self.client = client
+        self.code_ttl = code_ttl
+        self.max_sends = max_sends
+        self.rate_window = rate_window
+        self.max_workers = max_workers
+
+        self.validation_client = client
+
+        if validation_transport is not None:
+            self.validation_client = Intellipush(
+                key=client.key,
+                secret=client.secret,
+                base_url=client.base_url,
+                version=client.version,
+                transport=validation_transport,
+                json_loads=client.json_loads,
+            )
+
+        self._lock = threading.Lock()
+        self._active = {}
+        self._in_flight = {}
+        self._sends = collections.defaultdict(collections.deque)
+        self._executor = None
+
+    def send(self, countrycode, phonenumber, message_before_code=None, message_after_code=None):
+        """
+        Send a two factor code unless the phone number already has an active code.
+
+        :param countrycode: Country code of the recipient's phone number
+        :param phonenumber: Phone number to send 2FA code to
+        :param message_before_code: String to prefix the 2FA code with
+        :param message_after_code: Message to append after the 2FA code
+        :return: Response from Intellipush, the response from the previous send if a code is already active, or
+                 `{'hasCode': True}` if Intellipush reported an active code that wasn't sent through this service
+        :raises: TwoFactorRateLimitExceeded
+        """
+        number = (countrycode, phonenumber)
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                active = self._active.get(number)
+
+                if active and active[0] > now:
+                    return active[1]
+
+                in_flight = self._in_flight.get(number)
+
+                if in_flight is None:
+                    sends = self._sends[number]
+
+                    while sends and sends[0] <= now - self.rate_window:
+                        sends.popleft()
+
+                    if len(sends) >= self.max_sends:
+                        raise TwoFactorRateLimitExceeded('Too many two factor codes sent to the phone number.')
+
+                    sends.append(now)
+                    in_flight = self._in_flight[number] = threading.Event()
+                    break
+
+            # Another thread is sending to the number - use its result, or try again if it failed
+            in_flight.wait()
+
+        result = None
+
+        try:
+            result = self.client.two_factor_send(
+                countrycode=countrycode,
+                phonenumber=phonenumber,
+                message_before_code=message_before_code,
+                message_after_code=message_after_code,
+            )
+        except TwoFactorAuthenticationIsAlreadyActive:
+            result = {'hasCode': True}
+        finally:
+            with self._lock:
+                if result is not None:
+                    self._active[number] = (time.monotonic() + self.code_ttl, result)
+
+                del self._in_flight[number]
+                in_flight.set()
+
+        return result
+
+    def validate(self, countrycode, phonenumber, code):
+        """
+        Validate a code sent by `send`. Once a code has been validated, the phone number no longer has an active code.
+        After a wrong code or a failed request the code is still considered active, so the user can try again.
+
+        :param countrycode: Country code of the phone number of the user
+        :param phonenumber: Phone number of the user
+        :param code: The 2FA code the user has entered
+        :return: True or False depending on the validity of the code
+        """
+        valid = self.validation_client.two_factor_validate(
+            countrycode=countrycode,
+            phonenumber=phonenumber,
+            code=code,
+        )
+
+        if valid:
+            with self._lock:
+                self._active.pop((countrycode, phonenumber), None)
+
+        return valid
+
+    def has_active_code(self, countrycode, phonenumber):
+        """
+        :return: True if a code sent through this service is still active for the phone number
+        """
+        with self._lock:
+            active = self._active.get((countrycode, phonenumber))
+            return bool(active and active[0] > time.monotonic())
+
+    async def send_async(self, countrycode, phonenumber, message_before_code=None, message_after_code=None):
+        """
+        Async version of `send`.
+        """
+        return await self._run_async(self.send, countrycode, phonenumber, message_before_code, message_after_code)
+
+    async def validate_async(self, countrycode, phonenumber, code):
+        """
+        Async version of `validate`.
+        """
+        return await self._run_async(self.validate, countrycode, phonenumber, code)
+
+    def prune(self):
+        """
+        Remove expired codes and rate limit entries - call this periodically in long-running processes to keep the
+        memory usage bounded.
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            for number in [number for number, active in self._active.items() if active[0] <= now]:
+                del self._active[number]
+
+            expired = now - self.rate_window
+
+            for number in [number for number, sends in self._sends.items() if not sends or sends[-1] <= expired]:
+                del self._sends[number]
+
+    def _run_async(self, func, *args):
+        with self._lock:
+            if not self._executor:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+
+        return asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
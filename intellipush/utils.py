@@ -1,3 +1,8 @@
+import codecs
+import datetime
+import json
+import threading
+import time
 import urllib.parse
 
 
@@ -10,6 +15,10 @@ def php_encode(data):
 
         if isinstance(value, str):
             params[key] = value
+        elif isinstance(value, bool):
+            params[key] = int(value)
+        elif isinstance(value, (int, float)):
+            params[key] = value
         elif isinstance(value, list):
             for index, v in enumerate(value):
                 if isinstance(v, dict):
@@ -28,3 +37,249 @@ def php_encode(data):
                 params['{0}[{1}]'.format(key, dk)] = dv
 
     return urllib.parse.urlencode(params)
+
+
+def concurrent_map(func, items, max_workers=8, retries=0, retry_delay=0.5, retry_on=(Exception, ),
+                   return_exceptions=False):
+    """
+    Call `func` for each element in `items` with at most `max_workers` calls running in parallel.
+
+    Failed calls are retried up to `retries` times (with an exponentially increasing delay starting at `retry_delay`
+    seconds) if they raise one of the exceptions in `retry_on` (or an exception that `retry_on` returns True for, if
+    it's a callable). The last exception is raised if every attempt fails, unless `return_exceptions` is True.
+
+    :param func: Callable taking a single item
+    :param items: iterable of items to process
+    :param max_workers: Maximum number of concurrent calls
+    :param retries: Number of additional attempts for each item
+    :param retry_delay: Seconds to wait before the first retry
+    :param retry_on: Tuple of exception classes that should cause a retry, or a callable receiving the exception and
+           returning True if the call should be retried
+    :param return_exceptions: Give the exception raised by the last attempt as the result of a failed call instead of
+           raising it, so the results of the other calls aren't lost
+    :return: A list of results in the same order as `items`
+    """
+    import concurrent.futures
+
+    items = list(items)
+
+    def call_with_retries(item):
+        delay = retry_delay
+
+        for attempt in range(retries + 1):
+            try:
+                return func(item)
+            except Exception as e:
+                retry = isinstance(e, retry_on) if isinstance(retry_on, tuple) else retry_on(e)
+
+                if not retry or attempt == retries:
+                    raise
+
+                time.sleep(delay)
+                delay *= 2
+
+    def call(item):
+        if not return_exceptions:
+            return call_with_retries(item)
+
+        try:
+            return call_with_retries(item)
+        except Exception as e:
+            return e
+
+    if max_workers <= 1 or len(items) <= 1:
+        return [call(item) for item in items]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(call, items))
+
+
+def post_object_as_json(post_object):
+    """
+    Serialize a message converted by `Intellipush._sms_as_post_object` to JSON, so it can be stored and posted later.
+    The `when` value has already been split into `date` and `time`, and nested objects (such as a `ContactFilter`)
+    are stored by their attributes.
+
+    :param post_object: dict as returned from `_sms_as_post_object`
+    :return: A JSON string
+    """
+    payload = {}
+
+    for key, value in post_object.items():
+        if value is None or key == 'when':
+            continue
+
+        if isinstance(value, (datetime.date, datetime.time)):
+            value = value.isoformat()
+        elif hasattr(value, '__dict__'):
+            value = {k: v for k, v in vars(value).items() if v is not None}
+
+        payload[key] = value
+
+    return json.dumps(payload, separators=(',', ':'))
+
+
+def fast_json_loads():
+    """
+    Find the fastest JSON decoder available - `orjson` if it's installed, otherwise the standard library.
+
+    :return: A callable decoding JSON from bytes or str
+    """
+    try:
+        import orjson
+    except ImportError:
+        return json.loads
+
+    return orjson.loads
+
+
+def iter_json_array(chunks):
+    """
+    Decode a JSON array incrementally from an iterable of byte chunks, yielding each element as soon as it has been
+    received - the first rows of a large response can be processed while the rest is still being transferred.
+
+    If the document isn't an array, the complete value is yielded as a single element.
+
+    :param chunks: iterable of bytes (i.e. a streamed response body)
+    :return: generator of decoded elements
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    position = 0
+    started = False
+    chunks = iter(chunks)
+
+    while True:
+        chunk = next(chunks, None)
+
+        if chunk is None:
+            buffer += utf8.decode(b'', final=True)
+        else:
+            buffer += utf8.decode(chunk)
+
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+
+            if position >= len(buffer):
+                break
+
+            if not started:
+                if buffer[position] != '[':
+                    if chunk is not None:
+                        break
+
+                    yield decoder.decode(buffer[position:])
+                    return
+
+                started = True
+                position += 1
+                continue
+
+            if buffer[position] == ']':
+                return
+
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if chunk is None:
+                    raise
+
+                break
+
+            # A number or literal isn't complete until it's followed by a delimiter - `[1` might continue as `[123`
+            delimited = end < len(buffer) and buffer[end] in ' \t\r\n,]'
+
+            if chunk is not None and buffer[end - 1] not in '"]}' and not delimited:
+                break
+
+            position = end
+            yield element
+
+        if chunk is None:
+            if started:
+                raise ValueError('Unterminated JSON array')
+
+            return
+
+        buffer = buffer[position:]
+        position = 0
+
+
+def compress(body, encoding):
+    """
+    Compress a request body for sending with a `Content-Encoding` header.
+
+    :param body: The body as bytes
+    :param encoding: `gzip` or `deflate`
+    :return: The compressed body
+    """
+    import zlib
+
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    elif encoding == 'deflate':
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 15)
+    else:
+        raise ValueError('Unsupported compression: ' + str(encoding))
+
+    return compressor.compress(body) + compressor.flush()
+
+
+def decompressor(encoding):
+    """
+    Create an incremental decompressor for a response `Content-Encoding`.
+
+    :param encoding: The value of the `Content-Encoding` header (None or `identity` for uncompressed responses)
+    :return: A `zlib` decompression object, or None if the response isn't compressed
+    """
+    import zlib
+
+    encoding = (encoding or 'identity').strip().lower()
+
+    if encoding == 'identity':
+        return None
+
+    if encoding == 'gzip':
+        return zlib.decompressobj(31)
+
+    if encoding == 'deflate':
+        return zlib.decompressobj(15)
+
+    raise ValueError('Unsupported response encoding: ' + encoding)
+
+
+class RateLimiter:
+    def __init__(self, rate, burst=None):
+        """
+        A thread safe token bucket. Tokens are added at `rate` per second, up to `burst` tokens.
+
+        :param rate: Number of tokens added each second
+        :param burst: Maximum number of tokens available at once (defaults to `rate`)
+        """
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """
+        Take `tokens` from the bucket, sleeping until they're available. Requests larger than the bucket are allowed,
+        but the following requests wait until the bucket has been refilled.
+
+        :param tokens: Number of tokens to take
+        :return: Number of seconds spent waiting
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+
+        if wait:
+            time.sleep(wait)
+
+        return wait
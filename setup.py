@@ -29,6 +29,9 @@ setup(
             'sphinx',
             'sphinx-rtd-theme',
             'twine',
-        ]
+        ],
+        'http2': [
+            'httpx[http2]',
+        ],
     }
 )
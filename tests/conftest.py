@@ -1,3 +1,7 @@
+import http.server
+import json
+import threading
+
 import pytest
 
 
@@ -17,4 +21,43 @@ def api_details(request):
     if not api_id or not api_secret:
         pytest.skip('--api-id and --api-secret must both be provided')
 
-    return api_id, api_secret
\ No newline at end of file
+    return api_id, api_secret
+
+class EchoHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.received.append((self.path, dict(self.headers), body))
+        payload = json.dumps({
+            'success': True,
+            'data': {'path': self.path, 'body': body.decode('latin-1')},
+        }).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    """
+    A local HTTP server answering every POST with a successful response that echoes the path and body. The requests
+    received are available as `server.received`.
+    """
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), EchoHandler)
+    server.received = []
+    server.base_url = 'http://%s:%d/api' % server.server_address[:2]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,92 @@
+import urllib.parse
+
+from intellipush.campaign import ProcessCampaignSender
+from intellipush.client import Intellipush
+from intellipush.messages import SMS
+
+
+def greet(sms, receiver):
+    return sms.text_message + ' ' + receiver[1]
+
+
+def decode_batch(body):
+    fields = urllib.parse.parse_qs(body.decode('utf-8'))
+    rows = len({key.split(']')[0] for key in fields if key.startswith('batch[')})
+    return [fields['batch[%d][text_message]' % index][0] for index in range(rows)]
+
+
+def test_encoded_chunks_are_split_and_personalized():
+    client = Intellipush(key='key', secret='secret')
+    smses = [SMS(message='Hi', receivers=[('0047', str(90000000 + i)) for i in range(5)]) for _ in range(2)]
+    sender = ProcessCampaignSender(client, processes=2, chunk_size=4, personalize=greet)
+
+    chunks = list(sender.encoded_chunks(smses))
+
+    assert [len(decode_batch(chunk)) for chunk in chunks] == [4, 4, 2]
+    assert decode_batch(chunks[0])[0] == 'Hi 90000000'
+    assert all(b'api_secret' not in chunk for chunk in chunks)
+
+
+def test_send_smses_keeps_order_and_fills_failed_batches(mocker):
+    client = Intellipush(key='key', secret='secret')
+
+    def post_encoded(endpoint, body, expect_list_return=False):
+        texts = decode_batch(body)
+        return None if texts[0] == 'Hi 3' else [{'success': True, 'data': {'text_message': text}} for text in texts]
+
+    mocker.patch.object(client, '_post_encoded', side_effect=post_encoded)
+    smses = [SMS(message='Hi', receivers=[('0047', str(i))]) for i in range(7)]
+    sender = ProcessCampaignSender(client, processes=0, chunk_size=3, personalize=greet)
+
+    rows = sender.send_smses(smses)
+
+    assert [row and row['data']['text_message'] for row in rows] == ['Hi 0', 'Hi 1', 'Hi 2', None, None, None, 'Hi 6']
+
+
+def test_send_smses_keeps_going_after_a_failed_batch_and_limits_batches_in_flight(mocker):
+    import threading
+    import time
+
+    client = Intellipush(key='key', secret='secret')
+    lock = threading.Lock()
+    in_flight = {'now': 0, 'max': 0}
+    errors = []
+
+    def post_encoded(endpoint, body, expect_list_return=False):
+        texts = decode_batch(body)
+
+        with lock:
+            in_flight['now'] += 1
+            in_flight['max'] = max(in_flight['max'], in_flight['now'])
+
+        time.sleep(0.01)
+
+        with lock:
+            in_flight['now'] -= 1
+
+        if texts[0] == 'Hi 2':
+            raise ConnectionResetError('connection reset')
+
+        return [{'success': True, 'data': {'text_message': text}} for text in texts]
+
+    mocker.patch.object(client, '_post_encoded', side_effect=post_encoded)
+    smses = [SMS(message='Hi', receivers=[('0047', str(i))]) for i in range(12)]
+    sender = ProcessCampaignSender(client, processes=0, chunk_size=2, max_workers=4, max_pending=2, personalize=greet)
+
+    rows = sender.send_smses(smses, on_error=lambda start, end, error: errors.append((start, end, type(error))))
+
+    assert [row and row['data']['text_message'] for row in rows] == [
+        'Hi 0', 'Hi 1', None, None, 'Hi 4', 'Hi 5', 'Hi 6', 'Hi 7', 'Hi 8', 'Hi 9', 'Hi 10', 'Hi 11',
+    ]
+    assert errors == [(2, 4, ConnectionResetError)]
+    assert in_flight['max'] == 2
+
+
+def test_encoded_bodies_get_the_defaults_appended_in_place():
+    client = Intellipush(key='key', secret='secret')
+    sender = ProcessCampaignSender(client, processes=0, chunk_size=10)
+    body = next(sender.encoded_chunks([SMS(message='Hi', receivers=[('0047', '1234')])]))
+
+    assert isinstance(body, bytearray)
+    assert client._with_defaults('notification/createBatch', body) is body
+    assert b'appID=key' in body and body.startswith(b'batch%5B0%5D')
@@ -0,0 +1,52 @@
+import json
+
+from intellipush.capture import REDACTED, TrafficRecorder, read_capture, redact, replay
+from intellipush.client import Intellipush
+from intellipush.messages import SMS
+from intellipush.transports import HTTPClientTransport
+
+
+def test_redact_replaces_only_the_secret():
+    assert redact('api_secret=abc&appID=key') == 'api_secret=' + REDACTED + '&appID=key'
+    assert redact('text=api_secret%3Dx&api_secret=abc') == 'text=api_secret%3Dx&api_secret=' + REDACTED
+
+
+def test_recorded_traffic_can_be_replayed(local_server, tmpdir):
+    path = str(tmpdir.join('capture.jsonl.gz'))
+
+    with TrafficRecorder(path) as recorder:
+        intellipush = Intellipush(key='key', secret='s3cret', base_url=local_server.base_url, recorder=recorder)
+        intellipush.fetch_sms(sms_id='1')
+        intellipush.fetch_sms(sms_id='2')
+
+    entries = list(read_capture(path))
+
+    assert [entry['endpoint'] for entry in entries] == ['notification/getNotification'] * 2
+    assert all(entry['status'] == 200 and 's3cret' not in entry['request'] for entry in entries)
+    assert 'notification_id=1' in entries[0]['request']
+
+    report = replay(path, local_server.base_url, speed=None, secret='s3cret')
+
+    assert report['requests'] == 2
+    assert report['errors'] == 0
+    assert report['latency']['notification/getNotification']['count'] == 2
+    assert b'api_secret=s3cret' in local_server.received[-1][2]
+
+
+def test_streamed_batch_is_recorded_when_read(tmpdir, mocker):
+    path = str(tmpdir.join('capture.jsonl'))
+    transport = HTTPClientTransport()
+    body = json.dumps([{'success': True, 'data': {'id': 1}}, {'success': True, 'data': {'id': 2}}]).encode('utf-8')
+    mocker.patch.object(transport, 'post_stream', return_value=(200, 'OK', iter([body[:10], body[10:]])))
+
+    with TrafficRecorder(path) as recorder:
+        intellipush = Intellipush(key='key', secret='s3cret', transport=transport, recorder=recorder)
+        rows = intellipush.send_smses_iter([SMS(message='foo', receivers=[('0047', '1'), ('0047', '2')])])
+        assert [row['data']['id'] for row in rows] == [1, 2]
+
+    entry, = read_capture(path)
+
+    assert entry['endpoint'] == 'notification/createBatch'
+    assert entry['status'] == 200
+    assert json.loads(entry['response']) == json.loads(body)
+    assert 'single_target%5D=2' in entry['request'] and 's3cret' not in entry['request']
@@ -1,6 +1,9 @@
 import datetime
+import json
 import random
 import string
+import urllib.parse
+
 import pytest
 
 from intellipush import (
@@ -14,6 +17,7 @@ from intellipush.contacts import (
 from intellipush.messages import (
     SMS,
 )
+from intellipush.transports import HTTPClientTransport, Response
 
 test_contact = {
     'name': 'Test Testerson',
@@ -490,3 +494,64 @@ def test_get_shorturl_from_shorturl(intellipush, created_shorturl):
     assert shorturl['long_url'] == test_shorturl['url']
     assert shorturl['id'] == created_shorturl['id']
     assert shorturl['short_url'] == created_shorturl['short_url']
+
+
+def test_create_child_shorturls_maps_targets_to_short_urls(mocker):
+    intellipush = client.Intellipush(key='key', secret='secret')
+    mocked_post = mocker.patch.object(intellipush, '_post', side_effect=lambda endpoint, data, **kwargs: {
+        'short_url': 'https://ipush.me/' + data['target']['email'],
+    })
+
+    targets = [Target(email='a@example.com'), Target(email='b@example.com'), Target(email='a@example.com')]
+    result = intellipush.create_child_shorturls(url='https://example.com', parent_url_id=1, targets=targets, max_workers=2)
+
+    assert result == {
+        Target(email='a@example.com'): 'https://ipush.me/a@example.com',
+        Target(email='b@example.com'): 'https://ipush.me/b@example.com',
+    }
+    assert mocked_post.call_count == 2
+    assert mocked_post.call_args[0][0] == 'url/generateChildUrl'
+
+
+def test_create_child_shorturls_retries_rejections_and_keeps_other_targets(mocker):
+    transport = HTTPClientTransport()
+    intellipush = client.Intellipush(key='key', secret='secret', transport=transport)
+    rejections = {'a@example.com': 1, 'b@example.com': 10, 'd@example.com': 10}
+
+    def post(url, data, headers=None, timings=None):
+        email = urllib.parse.parse_qs(data.decode('utf-8'))['target[email]'][0]
+
+        if rejections.get(email):
+            rejections[email] -= 1
+            return Response(200, 'OK', json.dumps({
+                'success': False,
+                'errorcode': 20,
+                'status_message': 'Rejected ' + email,
+            }).encode('utf-8'))
+
+        return Response(200, 'OK', json.dumps({
+            'success': True,
+            'data': {'short_url': 'https://ipush.me/' + email},
+        }).encode('utf-8'))
+
+    mocked_post = mocker.patch.object(transport, 'post', side_effect=post)
+
+    emails = ['a@example.com', 'b@example.com', 'c@example.com', 'd@example.com']
+    targets = [Target(email=email) for email in emails]
+    result = intellipush.create_child_shorturls(
+        url='https://example.com',
+        parent_url_id=1,
+        targets=targets,
+        max_workers=4,
+        retries=2,
+    )
+
+    assert result[Target(email='a@example.com')] == 'https://ipush.me/a@example.com'
+    assert result[Target(email='c@example.com')] == 'https://ipush.me/c@example.com'
+
+    # Each rejection is described by its own response, not by whichever request failed last
+    for email in ('b@example.com', 'd@example.com'):
+        assert isinstance(result[Target(email=email)], client.RejectedRequestException)
+        assert str(result[Target(email=email)]) == 'Rejected ' + email
+
+    assert mocked_post.call_count == 2 + 3 + 1 + 3
@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+from intellipush.client import Intellipush, IntellipushException
+from intellipush.coalescing import CoalescingSender
+from intellipush.messages import SMS
+
+
+@pytest.fixture
+def client(mocker):
+    client = Intellipush(key='key', secret='secret')
+    mocker.patch.object(client, 'send_smses', side_effect=lambda smses: [{'success': True} for _ in smses])
+    return client
+
+
+def sent_texts(client):
+    return [(sms.receivers[0][1], sms.text_message) for call in client.send_smses.call_args_list for sms in call[0][0]]
+
+
+def test_duplicates_are_dropped_within_window(client):
+    sender = CoalescingSender(client, window=60)
+
+    for _ in range(3):
+        sender.send_sms(SMS(message='Disk full', receivers=[('0047', '1'), ('0047', '2')]))
+
+    sender.send_sms(SMS(message='Disk OK', receivers=[('0047', '1')]))
+
+    assert sender.pending() == 3
+    assert sender.flush_due() == 0
+    assert sender.flush() == 3
+    assert client.send_smses.call_count == 1
+    assert sent_texts(client) == [('1', 'Disk full'), ('2', 'Disk full'), ('1', 'Disk OK')]
+    assert sender.stats() == {'received': 7, 'coalesced': 4, 'sent': 3, 'batches': 1, 'failed_batches': 0}
+
+
+@pytest.mark.parametrize('policy, expected', [
+    ('first', 'CPU 91%'),
+    ('latest', 'CPU 97%'),
+    ('merge', 'CPU 91%\nCPU 97%'),
+])
+def test_group_key_coalesces_by_policy(client, policy, expected):
+    sender = CoalescingSender(client, window=60, policy=policy)
+
+    for text in ('CPU 91%', 'CPU 97%', 'CPU 97%'):
+        sender.send_sms(SMS(message=text, receivers=[('0047', '1')]), group_key='cpu')
+
+    sender.flush()
+
+    assert sent_texts(client) == [('1', expected)]
+
+
+def test_background_thread_flushes_expired_windows(client):
+    flushed = []
+
+    with CoalescingSender(client, window=0.05, on_flush=lambda smses, rows, error: flushed.append(rows)) as sender:
+        sender.send_sms(SMS(message='Alert', receivers=[('0047', '1')]))
+        sender.send_sms(SMS(message='Alert', receivers=[('0047', '1')]))
+
+        deadline = time.monotonic() + 2
+
+        while not flushed and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    assert flushed == [[{'success': True}]]
+
+
+def test_every_chunk_is_sent_when_one_fails(client):
+    def send_smses(smses):
+        if smses[0].text_message == 'Alert 0':
+            raise ConnectionResetError('connection reset')
+
+        return [{'success': True} for _ in smses]
+
+    client.send_smses.side_effect = send_smses
+    sender = CoalescingSender(client, window=60, chunk_size=2)
+
+    for index in range(5):
+        sender.send_sms(SMS(message='Alert %d' % index, receivers=[('0047', '1')]))
+
+    with pytest.raises(ConnectionResetError):
+        sender.flush()
+
+    assert client.send_smses.call_count == 3
+    assert sender.stats()['sent'] == 3
+    assert sender.stats()['failed_batches'] == 1
+
+
+def test_background_failures_are_kept_for_errors(client):
+    client.send_smses.side_effect = ConnectionResetError('connection reset')
+
+    with CoalescingSender(client, window=0.01) as sender:
+        sender.send_sms(SMS(message='Alert', receivers=[('0047', '1')]))
+        deadline = time.monotonic() + 2
+        errors = []
+
+        while not errors and time.monotonic() < deadline:
+            time.sleep(0.01)
+            errors = sender.errors()
+
+    assert [type(error) for error in errors] == [ConnectionResetError]
+    assert sender.errors() == []
+
+
+def test_unknown_policy_is_rejected(client):
+    with pytest.raises(IntellipushException):
+        CoalescingSender(client, policy='sometimes')
@@ -0,0 +1,111 @@
+import json
+import urllib.parse
+
+from intellipush.client import Intellipush, RejectedRequestException
+from intellipush.contactcache import ContactCache
+from intellipush.transports import HTTPClientTransport, Response
+
+
+def lookup(endpoint, data=None, expect_list_return=False, raise_on_error=False):
+    if endpoint != 'contact/getContactByPhoneNumber':
+        return {}
+
+    if data['phonenumber'] == 'error':
+        if raise_on_error:
+            raise RejectedRequestException('The contact lookup was rejected')
+
+        return None
+
+    if data['phonenumber'].startswith('9'):
+        return [{'id': int(data['phonenumber']), 'phonenumber': data['phonenumber']}]
+
+    return []
+
+
+def test_contacts_by_phone_deduplicates_and_caches(mocker):
+    intellipush = Intellipush(key='key', secret='secret', contact_cache=ContactCache())
+    mocked_post = mocker.patch.object(intellipush, '_post', side_effect=lookup)
+
+    numbers = [('0047', '90000001'), ('0047', 40000000), ('0047', '90000001'), ('0047', 'error')]
+    contacts = intellipush.contacts_by_phone(numbers, retries=1)
+
+    assert list(contacts) == [('0047', '90000001'), ('0047', '40000000'), ('0047', 'error')]
+    assert contacts[('0047', '90000001')]['id'] == 90000001
+    assert contacts[('0047', '40000000')] is None
+    # The rejected lookup is retried, and is reported as the exception without discarding the other contacts
+    assert isinstance(contacts[('0047', 'error')], RejectedRequestException)
+    assert mocked_post.call_count == 4
+
+    intellipush.contacts_by_phone(numbers, retries=1)
+
+    # Only the failed lookup is repeated - the missing contact is cached as well
+    assert mocked_post.call_count == 6
+    assert intellipush.contact(countrycode='0047', phonenumber='90000001')['id'] == 90000001
+    assert mocked_post.call_count == 6
+
+
+def test_contacts_by_phone_reports_the_error_of_each_lookup(mocker):
+    transport = HTTPClientTransport()
+    intellipush = Intellipush(key='key', secret='secret', transport=transport)
+
+    def post(url, data, headers=None, timings=None):
+        phonenumber = urllib.parse.parse_qs(data.decode('utf-8'))['phonenumber'][0]
+
+        return Response(200, 'OK', json.dumps({
+            'success': False,
+            'errorcode': 30,
+            'status_message': 'Rejected ' + phonenumber,
+        }).encode('utf-8'))
+
+    mocker.patch.object(transport, 'post', side_effect=post)
+
+    numbers = [('0047', str(90000000 + index)) for index in range(8)]
+    contacts = intellipush.contacts_by_phone(numbers, max_workers=4, retries=0)
+
+    assert [str(contacts[number]) for number in numbers] == ['Rejected ' + number[1] for number in numbers]
+
+
+def test_contact_cache_is_invalidated_by_changes(mocker):
+    cache = ContactCache()
+    intellipush = Intellipush(key='key', secret='secret', contact_cache=cache)
+    mocker.patch.object(intellipush, '_post', side_effect=lookup)
+
+    intellipush.contacts_by_phone([('0047', '90000001'), ('0047', '40000000')])
+    intellipush.delete_contact(contact_id=90000001)
+    intellipush.create_contact(name='New', countrycode='0047', phonenumber='40000000')
+
+    assert len(cache) == 0
+
+
+def test_contact_cache_is_invalidated_after_the_update_is_made(mocker):
+    cache = ContactCache()
+    intellipush = Intellipush(key='key', secret='secret', contact_cache=cache)
+
+    def post(endpoint, data=None, expect_list_return=False, raise_on_error=False):
+        if endpoint == 'contact/updateContact':
+            # A lookup made while the update is in flight still sees the old contact
+            intellipush.contacts_by_phone([('0047', '90000001')])
+            assert len(cache) == 1
+            return {'id': 90000001}
+
+        return lookup(endpoint, data, raise_on_error=raise_on_error)
+
+    mocker.patch.object(intellipush, '_post', side_effect=post)
+    intellipush.update_contact(contact_id=90000001, name='Changed')
+
+    assert len(cache) == 0
+
+
+def test_contact_cache_expires_and_evicts(mocker):
+    monotonic = mocker.patch('intellipush.contactcache.time.monotonic', return_value=0)
+    cache = ContactCache(ttl=10, max_entries=2)
+
+    cache.put(('0047', '1'), {'id': 1})
+    cache.put(('0047', '2'), None)
+    assert cache.get(('0047', '1')) == (True, {'id': 1})
+
+    cache.put(('0047', '3'), {'id': 3})
+    assert cache.get(('0047', '2')) == (False, None)
+
+    monotonic.return_value = 11
+    assert cache.get(('0047', '1')) == (False, None)
@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from intellipush.client import Intellipush
+from intellipush.dispatch import Lane, PriorityDispatcher, UnknownLaneException
+from intellipush.messages import SMS
+
+
+@pytest.fixture
+def client(mocker):
+    client = Intellipush(key='key', secret='secret')
+    client.order = []
+    client.started = threading.Event()
+    client.release = threading.Event()
+
+    def send_smses(smses):
+        client.started.set()
+        client.release.wait(5)
+        client.order.append('bulk')
+        return [{'success': True, 'data': {'text_message': sms.text_message}} for sms in smses]
+
+    def send_sms(sms):
+        client.order.append('transactional')
+        return {'id': 1}
+
+    mocker.patch.object(client, 'send_smses', side_effect=send_smses)
+    mocker.patch.object(client, 'send_sms', side_effect=send_sms)
+    return client
+
+
+def test_urgent_messages_preempt_campaign_between_chunks(client):
+    lanes = (Lane('transactional', 0, 2, None), Lane('bulk', 1, 1, None))
+
+    with PriorityDispatcher(client, lanes=lanes, max_workers=1, chunk_size=2) as dispatcher:
+        smses = [SMS(message=str(index), receivers=[('0047', str(index))]) for index in range(6)]
+        campaign = dispatcher.send_smses(smses)
+        client.started.wait(5)
+        urgent = dispatcher.send_sms(SMS(message='Your code is 1234', receivers=[('0047', '1')]))
+        client.release.set()
+
+        rows = campaign.result(5)
+
+        assert urgent.result(5) == {'id': 1}
+        assert [row['data']['text_message'] for row in rows] == ['0', '1', '2', '3', '4', '5']
+        assert client.order == ['bulk', 'transactional', 'bulk', 'bulk']
+
+    metrics = dispatcher.metrics()
+    assert metrics['bulk']['completed'] == 3
+    assert metrics['bulk']['messages'] == 6
+    assert metrics['transactional']['depth'] == 0
+    assert metrics['transactional']['max_wait'] > 0
+
+
+def test_failed_chunks_give_empty_rows(client):
+    client.release.set()
+    client.send_smses.side_effect = lambda smses: None
+
+    with PriorityDispatcher(client, chunk_size=2) as dispatcher:
+        rows = dispatcher.send_smses([SMS(message='x', receivers=[('0047', '1'), ('0047', '2'), ('0047', '3')])])
+
+        assert rows.result(5) == [None, None, None]
+
+    assert dispatcher.metrics()['bulk']['failed'] == 0
+
+
+def test_large_messages_are_split_across_chunks(client):
+    client.send_smses.side_effect = lambda smses: [{'success': True} for sms in smses for _ in sms.receivers]
+
+    with PriorityDispatcher(client, chunk_size=2) as dispatcher:
+        receivers = [('0047', str(index)) for index in range(5)]
+        rows = dispatcher.send_smses([SMS(message='x', receivers=receivers)]).result(5)
+
+    assert len(rows) == 5
+    assert [call[0][0][0].receivers for call in client.send_smses.call_args_list] == [
+        receivers[0:2], receivers[2:4], receivers[4:5],
+    ]
+
+
+def test_failed_chunk_gives_none_rows_and_is_reported(client):
+    client.release.set()
+
+    def send_smses(smses):
+        if smses[0].text_message == '1':
+            raise ConnectionResetError('connection reset')
+
+        return [{'success': True} for _ in smses]
+
+    client.send_smses.side_effect = send_smses
+
+    errors = []
+
+    with PriorityDispatcher(client, max_workers=1, chunk_size=1) as dispatcher:
+        campaign = dispatcher.send_smses(
+            [SMS(message=str(index), receivers=[('0047', '1')]) for index in range(3)],
+            on_error=lambda chunk, e: errors.append((chunk[0].text_message, type(e))),
+        )
+
+        assert campaign.result(5) == [{'success': True}, None, {'success': True}]
+
+    assert errors == [('1', ConnectionResetError)]
+    assert client.send_smses.call_count == 3
+    assert dispatcher.metrics()['bulk']['failed'] == 1
+
+
+def test_unknown_lane_is_rejected(client):
+    with PriorityDispatcher(client, max_workers=1) as dispatcher:
+        with pytest.raises(UnknownLaneException):
+            dispatcher.send_sms(SMS(message='x', receivers=[('0047', '1')]), lane='express')
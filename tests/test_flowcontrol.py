@@ -0,0 +1,105 @@
+import pytest
+import requests
+
+from intellipush.client import Intellipush, ServerSideException
+from intellipush.flowcontrol import AdaptiveBatchSender, AIMDController
+from intellipush.messages import SMS
+
+
+def test_controller_increases_additively_and_decreases_multiplicatively():
+    controller = AIMDController(chunk_size=100, concurrency=4, chunk_increase=50, latency_target=1)
+
+    assert not controller.record(0.1, rows=[{'success': True}])
+    assert (controller.chunk_size, controller.concurrency) == (150, 5)
+
+    assert controller.record(2.0, rows=[{'success': True}])
+    assert (controller.chunk_size, controller.concurrency) == (75, 2)
+
+    assert controller.record(0.1, error=ServerSideException())
+    assert controller.record(0.1, rows=[{'success': False, 'errorcode': 1}, {'success': True}, {'success': False}])
+    assert controller.state()['failed_requests'] == 1
+    assert controller.state()['failed_rows'] == 2
+
+
+def test_controller_treats_congestion_codes_as_overload():
+    controller = AIMDController(congestion_codes=(429, ))
+
+    assert controller.record(0.1, rows=[{'success': False, 'errorcode': 429}] + [{'success': True}] * 9)
+
+
+def test_adaptive_sender_keeps_order_and_retries(mocker):
+    client = Intellipush(key='key', secret='secret')
+    calls = []
+
+    def send_batch(batch):
+        calls.append(len(batch))
+
+        if len(calls) == 2:
+            raise requests.exceptions.ConnectTimeout('connect timed out')
+
+        return [{'success': True, 'data': {'text_message': row['text_message']}} for row in batch]
+
+    mocker.patch.object(client, '_send_batch', side_effect=send_batch)
+    controller = AIMDController(chunk_size=10, concurrency=1, min_chunk_size=5, chunk_increase=10, max_concurrency=1)
+    sender = AdaptiveBatchSender(client, controller=controller, retry_delay=0)
+
+    result = sender.send_smses([SMS(message=str(i), receivers=[('0047', '1234')]) for i in range(60)])
+
+    assert [row['data']['text_message'] for row in result] == [str(i) for i in range(60)]
+    assert calls[:3] == [10, 20, 20]
+    assert controller.state()['decreases'] == 1
+
+
+def test_adaptive_sender_gives_up_after_retries(mocker):
+    client = Intellipush(key='key', secret='secret')
+    mocked_send_batch = mocker.patch.object(client, '_send_batch', side_effect=requests.exceptions.ConnectTimeout())
+    sleep = mocker.patch('intellipush.flowcontrol.time.sleep')
+    sender = AdaptiveBatchSender(client, retries=2, retry_delay=0.5)
+    errors = []
+
+    result = sender.send_smses([SMS(message='foo', receivers=[('0047', '1234')])], on_error=lambda *e: errors.append(e))
+
+    assert result == [None]
+    assert [(start, end, type(e)) for start, end, e in errors] == [(0, 1, requests.exceptions.ConnectTimeout)]
+    assert mocked_send_batch.call_count == 3
+    assert [call[0][0] for call in sleep.call_args_list] == [0.5, 1.0]
+
+
+@pytest.mark.parametrize('error', [ServerSideException('down'), requests.exceptions.ReadTimeout('read timed out')])
+def test_adaptive_sender_does_not_resend_after_ambiguous_failures(mocker, error):
+    client = Intellipush(key='key', secret='secret')
+    mocked_send_batch = mocker.patch.object(client, '_send_batch', side_effect=error)
+    sender = AdaptiveBatchSender(client, retries=3, retry_delay=0)
+    errors = []
+
+    result = sender.send_smses([SMS(message='foo', receivers=[('0047', '1234')])], on_error=lambda *e: errors.append(e))
+
+    assert result == [None]
+    assert [e for _, _, e in errors] == [error]
+    assert mocked_send_batch.call_count == 1
+    assert sender.controller.state()['failed_requests'] == 1
+
+
+def test_adaptive_sender_keeps_rows_received_before_a_chunk_failed(mocker):
+    client = Intellipush(key='key', secret='secret')
+
+    def send_batch(batch):
+        if batch[0]['text_message'] == '10':
+            raise ServerSideException('down')
+
+        return [{'success': True, 'data': {'text_message': row['text_message']}} for row in batch]
+
+    mocker.patch.object(client, '_send_batch', side_effect=send_batch)
+    controller = AIMDController(chunk_size=10, concurrency=2, chunk_increase=0, max_concurrency=2)
+    sender = AdaptiveBatchSender(client, controller=controller, retry_delay=0)
+    errors = []
+
+    result = sender.send_smses(
+        [SMS(message=str(i), receivers=[('0047', '1234')]) for i in range(30)],
+        on_error=lambda start, end, e: errors.append((start, end)),
+    )
+
+    assert [row and row['data']['text_message'] for row in result] == (
+        [str(i) for i in range(10)] + [None] * 10 + [str(i) for i in range(20, 30)]
+    )
+    assert errors == [(10, 20)]
@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+
+from intellipush.client import Intellipush
+from intellipush.idempotency import IdempotencyStore, MemoryIdempotencyStore, SQLiteIdempotencyStore
+from intellipush.messages import SMS
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryIdempotencyStore(window=60)
+
+    return SQLiteIdempotencyStore(str(tmp_path / 'idempotency.db'), window=60)
+
+
+def test_send_sms_with_same_key_only_posts_once(store, mocker):
+    client = Intellipush(key='key', secret='secret', idempotency_store=store)
+    mocked_post = mocker.patch.object(client, '_post', return_value={'id': 123})
+
+    first = client.send_sms(SMS(message='foo', receivers=[('0047', '1234')], idempotency_key='order-1'))
+    second = client.send_sms(SMS(message='foo', receivers=[('0047', '1234')], idempotency_key='order-1'))
+
+    assert first == second == {'id': 123}
+    assert mocked_post.call_count == 1
+    assert 'idempotency_key' not in mocked_post.call_args[1]['data']
+
+
+def test_batch_rejected_as_a_whole_can_be_retried(store, mocker):
+    client = Intellipush(key='key', secret='secret', idempotency_store=store)
+    mocked_send = mocker.patch.object(client, '_send_batch', side_effect=[None, [{'success': True}, {'success': True}]])
+    smses = [
+        SMS(message='foo', receivers=[('0047', '1234')], idempotency_key='order-1'),
+        SMS(message='bar', receivers=[('0047', '5678')], idempotency_key='order-2'),
+    ]
+
+    assert client.send_smses(smses) == [None, None]
+    assert client.send_smses(smses) == [{'success': True}, {'success': True}]
+    assert mocked_send.call_count == 2
+
+
+def test_rejected_send_can_be_retried(store, mocker):
+    client = Intellipush(key='key', secret='secret', idempotency_store=store)
+    mocked_post = mocker.patch.object(client, '_post', side_effect=[None, {'id': 123}])
+    sms = SMS(message='foo', receivers=[('0047', '1234')], idempotency_key='order-1')
+
+    assert client.send_sms(sms) is None
+    assert client.send_sms(sms) == {'id': 123}
+    assert mocked_post.call_count == 2
+
+
+def test_send_smses_leaves_out_duplicates(store, mocker):
+    client = Intellipush(key='key', secret='secret', idempotency_store=store)
+    mocked_batch = mocker.patch.object(client, '_send_batch', side_effect=lambda batch: [
+        {'success': True, 'data': {'id': row['text_message']}} for row in batch
+    ])
+
+    client.send_smses([SMS(message='a', receivers=[('0047', '1234')], idempotency_key='a')])
+    result = client.send_smses([
+        SMS(message='a', receivers=[('0047', '1234')], idempotency_key='a'),
+        SMS(message='b', receivers=[('0047', '1234')], idempotency_key='b'),
+        SMS(message='c', receivers=[('0047', '1234')]),
+    ])
+
+    assert [row['data']['id'] for row in result] == ['a', 'b', 'c']
+    assert len(mocked_batch.call_args[0][0]) == 2
+
+
+def test_memory_store_waits_for_concurrent_sender():
+    store = MemoryIdempotencyStore(window=60)
+    owner, _ = store.begin('key')
+    results = []
+
+    thread = threading.Thread(target=lambda: results.append(store.begin('key')))
+    thread.start()
+    time.sleep(0.05)
+    store.complete('key', {'id': 1})
+    thread.join()
+
+    assert owner
+    assert results == [(False, {'id': 1})]
+
+
+def test_memory_store_is_bounded():
+    store = MemoryIdempotencyStore(window=60, max_entries=2)
+
+    for key in ('a', 'b', 'c'):
+        store.begin(key)
+        store.complete(key, key)
+
+    assert len(store) == 2
+    assert store.begin('a') == (True, None)
+
+
+def test_abandoned_claim_expires_after_lease(tmp_path):
+    stores = [
+        MemoryIdempotencyStore(window=60, wait_timeout=5, lease=0.1),
+        SQLiteIdempotencyStore(str(tmp_path / 'idempotency.db'), window=60, wait_timeout=5, lease=0.1),
+    ]
+
+    for store in stores:
+        # The owner never completes or aborts, i.e. the process crashed while sending
+        assert store.begin('key') == (True, None)
+
+        started = time.monotonic()
+        assert store.begin('key') == (True, None)
+        assert time.monotonic() - started < 1
+
+
+def test_idempotency_store_is_abstract():
+    with pytest.raises(TypeError):
+        IdempotencyStore()
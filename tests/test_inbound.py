@@ -0,0 +1,129 @@
+import threading
+
+import pytest
+
+from intellipush.client import Intellipush
+from intellipush.inbound import ReceivedConsumer
+
+
+def received(*ids):
+    return [{'id': str(message_id), 'keyword': 'STOP' if message_id % 2 else 'INFO'} for message_id in ids]
+
+
+def test_consumer_only_returns_new_messages(tmp_path, mocker):
+    client = Intellipush(key='key', secret='secret')
+    pages = {
+        1: received(3, 2),
+        2: received(1),
+    }
+    mocked_received = mocker.patch.object(client, 'received_smses', side_effect=lambda **kw: pages.get(kw['page'], []))
+    state_path = str(tmp_path / 'received.json')
+
+    consumer = ReceivedConsumer(client, state_path=state_path, items=2)
+    assert [m['id'] for m in consumer.poll()] == ['1', '2', '3']
+    consumer.commit()
+
+    pages[1] = received(5, 4)
+    pages[2] = received(3, 2)
+    mocked_received.reset_mock()
+
+    restarted = ReceivedConsumer(client, state_path=state_path, items=2)
+    assert [m['id'] for m in restarted.poll()] == ['4', '5']
+    assert mocked_received.call_count == 2
+
+
+def test_consumer_adapts_interval(mocker):
+    client = Intellipush(key='key', secret='secret')
+    mocker.patch.object(client, 'received_smses', side_effect=[received(1), [], []])
+    consumer = ReceivedConsumer(client, min_interval=1, max_interval=3, backoff=2)
+
+    consumer.poll()
+    assert consumer.interval == 1
+    consumer.poll()
+    assert consumer.interval == 2
+    consumer.poll()
+    assert consumer.interval == 3
+
+
+def test_consumer_dispatches_to_keyword_handlers(mocker):
+    client = Intellipush(key='key', secret='secret')
+    mocker.patch.object(client, 'received_smses', return_value=received(1, 2, 3))
+    handled = {'STOP': [], 'INFO': []}
+    lock = threading.Lock()
+
+    def handler(keyword):
+        def handle(message):
+            with lock:
+                handled[keyword].append(message['id'])
+
+        return handle
+
+    consumer = ReceivedConsumer(client, handlers={'STOP': handler('STOP'), 'INFO': handler('INFO')})
+
+    assert consumer.consume() == 3
+    assert sorted(handled['STOP']) == ['1', '3']
+    assert handled['INFO'] == ['2']
+
+
+def test_consumer_reads_every_page_back_to_high_water_mark(mocker):
+    client = Intellipush(key='key', secret='secret')
+    pages = {1: received(2), 2: received(1)}
+    mocker.patch.object(client, 'received_smses', side_effect=lambda **kw: pages.get(kw['page'], []))
+    consumer = ReceivedConsumer(client, items=1, max_pages=1)
+
+    assert [m['id'] for m in consumer.poll()] == ['2']
+
+    # More pages of new messages than `max_pages`, and 7 arrives after page 1 is read - pushing 6 onto page 2
+    pages = {1: received(6), 2: received(5), 3: received(4), 4: received(3), 5: received(2)}
+
+    def shifting(**kw):
+        if kw['page'] == 2 and pages[1] == received(6):
+            pages.update({index + 1: received(7 - index) for index in range(6)})
+
+        return pages.get(kw['page'], [])
+
+    client.received_smses.side_effect = shifting
+
+    assert [m['id'] for m in consumer.poll()] == ['3', '4', '5', '6']
+    assert consumer.last_id == 6
+
+
+def test_consumer_dispatches_failed_messages_again(tmp_path, mocker):
+    client = Intellipush(key='key', secret='secret')
+    pages = {1: received(4, 3, 2, 1)}
+    mocker.patch.object(client, 'received_smses', side_effect=lambda **kw: pages.get(kw['page'], []))
+    state_path = str(tmp_path / 'received.json')
+    handled = []
+
+    def handle(message):
+        if message['id'] == '3' and '3' not in handled:
+            handled.append('3')
+            raise ValueError('not now')
+
+        handled.append(message['id'])
+
+    consumer = ReceivedConsumer(client, state_path=state_path, default_handler=handle, max_workers=1)
+
+    with pytest.raises(ValueError):
+        consumer.consume()
+
+    assert consumer.last_id == 2
+    assert ReceivedConsumer(client, state_path=state_path).last_id == 2
+
+    assert consumer.consume() == 2
+    assert consumer.last_id == 4
+    assert handled == ['1', '2', '3', '4', '3', '4']
+
+
+def test_consumer_messages_returns_unprocessed_messages_again(mocker):
+    client = Intellipush(key='key', secret='secret')
+    mocker.patch.object(client, 'received_smses', side_effect=lambda **kw: received(3, 2, 1) if kw['page'] == 1 else [])
+    consumer = ReceivedConsumer(client)
+
+    with pytest.raises(ValueError):
+        for message in consumer.messages():
+            if message['id'] == '2':
+                raise ValueError('failed to process')
+
+    assert consumer.last_id == 1
+    assert [m['id'] for m in consumer.poll()] == ['2', '3']
@@ -0,0 +1,97 @@
+import pytest
+
+from intellipush.client import Intellipush
+from intellipush.mirror import ContactMirror, MirrorSyncException
+
+
+def account(count):
+    contacts = [
+        {
+            'id': index,
+            'countrycode': '0047',
+            'phonenumber': str(90000000 + index),
+            'param1': 'gold' if index % 2 else 'silver',
+        }
+        for index in range(1, count + 1)
+    ]
+
+    def post(endpoint, data=None, expect_list_return=False):
+        if endpoint == 'contact/getContacts':
+            offset = (data['page'] - 1) * data['items']
+            return contacts[offset:offset + data['items']]
+
+        if endpoint == 'contact/createContact':
+            return {'id': 1000}
+
+        return {}
+
+    return post
+
+
+@pytest.fixture
+def mirrored(mocker, tmpdir):
+    mirror = ContactMirror(str(tmpdir.join('contacts.sqlite')))
+    intellipush = Intellipush(key='key', secret='secret', contact_mirror=mirror)
+    mocked_post = mocker.patch.object(intellipush, '_post', side_effect=account(25))
+    mirror.sync(intellipush, items=10)
+
+    return intellipush, mirror, mocked_post
+
+
+def test_sync_pages_through_contacts(mirrored):
+    intellipush, mirror, mocked_post = mirrored
+
+    assert len(mirror) == 25
+    assert mocked_post.call_count == 3
+    assert mirror.count(param1='gold') == 13
+    assert [contact['id'] for contact in mirror.query(param1='silver', limit=2, offset=1)] == [4, 6]
+
+
+def test_sync_removes_contacts_that_are_gone(mirrored, mocker):
+    intellipush, mirror, mocked_post = mirrored
+    mocked_post.side_effect = account(12)
+
+    assert mirror.sync(intellipush, items=10) == 12
+    assert len(mirror) == 12
+    assert mirror.get(13) is None
+
+
+def test_failed_sync_keeps_mirror(mirrored):
+    intellipush, mirror, mocked_post = mirrored
+    mocked_post.side_effect = lambda endpoint, data=None, **kwargs: None
+
+    with pytest.raises(MirrorSyncException):
+        mirror.sync(intellipush)
+
+    assert len(mirror) == 25
+
+
+def test_lookups_and_mutations_use_mirror(mirrored):
+    intellipush, mirror, mocked_post = mirrored
+    calls = mocked_post.call_count
+
+    assert intellipush.contact(countrycode='0047', phonenumber='90000003')['id'] == 3
+    assert intellipush.contact(contact_id=4)['phonenumber'] == '90000004'
+    assert mocked_post.call_count == calls
+
+    intellipush.create_contact(name='New', countrycode='0047', phonenumber='40000000', email='new@example.com')
+    intellipush.update_contact(contact_id=3, email='three@example.com')
+    intellipush.delete_contact(contact_id=4)
+
+    assert mirror.by_email('new@example.com')[0]['id'] == 1000
+    assert mirror.get(3)['email'] == 'three@example.com'
+    assert 'contact_id' not in mirror.get(3)
+    assert mirror.get(4) is None
+
+
+def test_contacts_fetched_from_the_api_are_added_to_the_mirror(mirrored):
+    intellipush, mirror, mocked_post = mirrored
+    elsewhere = {'id': 2000, 'countrycode': '0046', 'phonenumber': '70000000'}
+    mocked_post.side_effect = lambda endpoint, data=None, **kwargs: [elsewhere]
+    calls = mocked_post.call_count
+
+    assert intellipush.contact(countrycode='0046', phonenumber='70000000')['id'] == 2000
+    assert intellipush.contact(contact_id=2000)['phonenumber'] == '70000000'
+    assert intellipush.contact(countrycode='0046', phonenumber='70000000')['id'] == 2000
+    assert mocked_post.call_count == calls + 1
+    assert mirror.get(2000)['countrycode'] == '0046'
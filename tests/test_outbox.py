@@ -0,0 +1,148 @@
+import concurrent.futures
+import contextlib
+import socket
+import sqlite3
+import time
+
+import pytest
+
+from intellipush.client import Intellipush, ServerSideException
+from intellipush.messages import SMS
+from intellipush.outbox import Outbox
+from intellipush.transports import ConnectError
+
+
+def batch_response(batch):
+    return [{'success': True, 'data': {'id': 1000 + index}} for index, _ in enumerate(batch)]
+
+
+@pytest.fixture
+def client():
+    return Intellipush(key='key', secret='secret')
+
+
+def test_outbox_drains_in_batches_and_records_notification_ids(tmp_path, client, mocker):
+    mocked_send = mocker.patch.object(client, '_send_batch', side_effect=batch_response)
+    outbox = Outbox(str(tmp_path / 'outbox.db'))
+
+    ids = outbox.enqueue_many([
+        SMS(message='foo', receivers=[('0047', '1234'), ('0047', '5678')]),
+        SMS(message='bar', receivers=[('0047', '9012')]),
+    ])
+
+    assert outbox.drain(client, batch_size=2) == 3
+    assert mocked_send.call_count == 2
+    assert mocked_send.call_args_list[0][0][0][1]['single_target'] == '5678'
+    assert outbox.entry(ids[0])['notification_id'] == '1000'
+    assert outbox.stats()['sent'] == 3
+
+
+def test_outbox_marks_failed_rows(tmp_path, client, mocker):
+    mocker.patch.object(client, '_send_batch', return_value=[
+        {'success': False, 'errorcode': 12, 'status_message': 'Invalid number'},
+    ])
+    outbox = Outbox(str(tmp_path / 'outbox.db'))
+    outbox_id, = outbox.enqueue(SMS(message='foo', receivers=[('0047', '1234')]))
+
+    assert outbox.drain(client) == 0
+    assert outbox.entry(outbox_id)['state'] == 'failed'
+    assert outbox.entry(outbox_id)['error_code'] == 12
+
+
+def test_outbox_marks_batch_rejected_as_a_whole_as_failed(tmp_path, client, mocker):
+    def rejected(batch):
+        client.last_error_code = 5
+        client.last_error_message = 'Invalid credentials'
+
+    mocked_send = mocker.patch.object(client, '_send_batch', side_effect=rejected)
+    outbox = Outbox(str(tmp_path / 'outbox.db'))
+    ids = outbox.enqueue_many([SMS(message=str(i), receivers=[('0047', '1234')]) for i in range(3)])
+
+    assert outbox.drain(client) == 0
+    assert mocked_send.call_count == 1
+    assert outbox.stats()['failed'] == 3
+    assert outbox.entry(ids[0])['error_code'] == 5
+    assert outbox.entry(ids[0])['error_message'] == 'Invalid credentials'
+
+
+def test_outbox_resumes_after_restart(tmp_path, client, mocker):
+    path = str(tmp_path / 'outbox.db')
+    mocker.patch.object(client, '_send_batch', side_effect=batch_response)
+
+    outbox = Outbox(path)
+    outbox.enqueue_many([SMS(message=str(i), receivers=[('0047', '1234')]) for i in range(5)])
+    outbox.drain(client, batch_size=2, max_batches=1)
+
+    # simulate a crash while the next batch was in flight
+    outbox._claim(2)
+    outbox.close()
+
+    restarted = Outbox(path)
+    assert restarted.stats()['pending'] == 3
+    assert restarted.drain(client) == 3
+    assert restarted.stats()['sent'] == 5
+
+
+def test_outbox_releases_batch_when_request_fails(tmp_path, client, mocker):
+    mocker.patch.object(client, '_send_batch', side_effect=ServerSideException('down'))
+    outbox = Outbox(str(tmp_path / 'outbox.db'))
+    outbox.enqueue(SMS(message='foo', receivers=[('0047', '1234')]))
+
+    with pytest.raises(ServerSideException):
+        outbox.drain(client)
+
+    assert outbox.stats()['pending'] == 1
+
+
+def test_outbox_enqueue_returns_after_commit(tmp_path):
+    path = str(tmp_path / 'outbox.db')
+    outbox = Outbox(path, commit_interval=10)
+
+    outbox_id, = outbox.enqueue(SMS(message='foo', receivers=[('0047', '1234')]))
+
+    # Visible to another connection, i.e. committed, without a flush
+    assert sqlite3.connect(path).execute('SELECT id FROM outbox').fetchall() == [(outbox_id, )]
+
+
+def test_outbox_groups_concurrent_enqueues_into_commits(tmp_path, mocker):
+    path = str(tmp_path / 'outbox.db')
+    outbox = Outbox(path, commit_interval=5)
+    commit = mocker.spy(outbox, '_commit')
+
+    def enqueue(index):
+        outbox_id, = outbox.enqueue(SMS(message=str(index), receivers=[('0047', '1234')]))
+
+        # A connection of its own for each check - statements from several threads on a shared connection can keep
+        # an older read snapshot open
+        with contextlib.closing(sqlite3.connect(path)) as reader:
+            return reader.execute('SELECT COUNT(*) FROM outbox WHERE id = ?', (outbox_id, )).fetchone()[0]
+
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        # Hold the outbox until every enqueue is waiting for it, so they're all in progress at the same time
+        with outbox._lock:
+            results = executor.map(enqueue, range(8))
+            deadline = time.monotonic() + 5
+
+            while outbox._entering < 8 and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        assert list(results) == [1] * 8
+
+    assert commit.call_count == 1
+
+
+@pytest.mark.parametrize('resend_inflight, error, state', [
+    (False, socket.timeout('timed out'), 'unknown'),
+    (True, socket.timeout('timed out'), 'pending'),
+    (False, ConnectError('Connection refused'), 'pending'),
+])
+def test_outbox_failed_batches_are_requeued_unless_they_may_have_been_sent(
+        tmp_path, client, mocker, resend_inflight, error, state):
+    mocker.patch.object(client, '_send_batch', side_effect=error)
+    outbox = Outbox(str(tmp_path / 'outbox.db'), resend_inflight=resend_inflight)
+    outbox_id, = outbox.enqueue(SMS(message='foo', receivers=[('0047', '1234')]))
+
+    with pytest.raises(type(error)):
+        outbox.drain(client)
+
+    assert outbox.entry(outbox_id)['state'] == state
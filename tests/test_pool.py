@@ -0,0 +1,98 @@
+import pytest
+
+from intellipush.messages import SMS
+from intellipush.pool import ClientPool, UnknownAccountException
+from intellipush.utils import RateLimiter
+
+
+def by_country(sms):
+    return 'se' if sms.receivers[0][0] == '0046' else None
+
+
+@pytest.fixture
+def pool(mocker):
+    pool = ClientPool(
+        accounts={'no': ('key-no', 'secret-no'), 'se': ('key-se', 'secret-se')},
+        router=by_country,
+        default_account='no',
+    )
+
+    for client in pool.clients.values():
+        mocker.patch.object(client, '_send_batch', side_effect=lambda batch, key=client.key: [
+            {'success': True, 'data': {'key': key, 'text_message': row['text_message']}} for row in batch
+        ])
+
+    return pool
+
+
+def test_pool_shares_transport_between_accounts(pool):
+    assert pool.client('no').transport is pool.client('se').transport
+    assert pool.client('no').key == 'key-no'
+
+
+def test_pool_routes_and_fans_out_batches(pool):
+    smses = [SMS(message=str(i), receivers=[('0046' if i % 3 == 0 else '0047', '1234')]) for i in range(10)]
+    result = pool.send_smses(smses, chunk_size=3)
+
+    assert [row['data']['text_message'] for row in result['se']] == ['0', '3', '6', '9']
+    assert all(row['data']['key'] == 'key-se' for row in result['se'])
+    assert len(result['no']) == 6
+
+    metrics = pool.metrics()
+    assert metrics['no']['requests'] == 2
+    assert metrics['se']['messages'] == 4
+
+
+def test_pool_splits_large_messages_across_batches(pool):
+    receivers = [('0047', str(90000000 + index)) for index in range(7)]
+    result = pool.send_smses([SMS(message='big', receivers=receivers)], chunk_size=3)
+
+    assert len(result['no']) == 7
+    assert [len(call[0][0]) for call in pool.client('no')._send_batch.call_args_list] == [3, 3, 1]
+    assert [row['single_target'] for call in pool.client('no')._send_batch.call_args_list for row in call[0][0]] == [
+        number for _, number in receivers
+    ]
+
+
+def test_pool_keeps_results_of_other_batches_when_one_fails(pool, mocker):
+    pool.client('se')._send_batch.side_effect = RuntimeError('down')
+    errors = []
+
+    smses = [SMS(message=str(i), receivers=[('0046' if i < 2 else '0047', '1234')]) for i in range(5)]
+    result = pool.send_smses(smses, chunk_size=2, on_error=lambda *error: errors.append(error))
+
+    assert result['se'] == [None, None]
+    assert [row['data']['text_message'] for row in result['no']] == ['2', '3', '4']
+    assert [(account, [sms.text_message for sms in chunk]) for account, chunk, _ in errors] == [('se', ['0', '1'])]
+    assert pool.metrics()['se']['failed_requests'] == 1
+
+
+def test_pool_throttles_accounts_outside_the_shared_workers(pool):
+    pool.max_workers = 1
+    pool.limiters['se'] = RateLimiter(rate=10, burst=1)
+    sent = []
+
+    for name, client in pool.clients.items():
+        client._send_batch.side_effect = lambda batch, name=name: sent.append(name) or [{'success': True}] * len(batch)
+
+    smses = [SMS(message=str(i), receivers=[('0046' if i < 2 else '0047', '1234')]) for i in range(4)]
+    pool.send_smses(smses, chunk_size=1)
+
+    # The second batch for `se` waits for its budget without taking the only worker from `no`
+    assert sent == ['se', 'no', 'no', 'se']
+
+
+def test_pool_rejects_unknown_accounts(pool):
+    pool.default_account = None
+
+    with pytest.raises(UnknownAccountException):
+        pool.send_sms(SMS(message='foo', receivers=[('0047', '1234')]))
+
+
+def test_rate_limiter_waits_when_bucket_is_empty(mocker):
+    mocked_sleep = mocker.patch('intellipush.utils.time.sleep')
+    limiter = RateLimiter(rate=10, burst=10)
+
+    assert limiter.acquire(10) == 0
+    assert limiter.acquire(5) == pytest.approx(0.5, abs=0.01)
+    assert mocked_sleep.called
@@ -0,0 +1,67 @@
+import pytest
+
+from intellipush.client import Intellipush
+from intellipush.messages import SMS
+from intellipush.profiling import StageProfiler
+from intellipush.transports import HTTPClientTransport, RequestsTransport
+
+
+@pytest.mark.parametrize('transport_class, network_stages', [
+    (RequestsTransport, {'request', 'download'}),
+    (HTTPClientTransport, {'connect', 'send', 'wait', 'download'}),
+])
+def test_profiler_times_each_stage(local_server, transport_class, network_stages):
+    profiler = StageProfiler()
+    intellipush = Intellipush(
+        key='key',
+        secret='secret',
+        base_url=local_server.base_url,
+        transport=transport_class(),
+        profiler=profiler,
+    )
+
+    intellipush.send_sms(SMS(message='foo', receivers=[('0047', '12345678')]))
+    intellipush.send_sms(SMS(message='bar', receivers=[('0047', '12345678')]))
+    stages = profiler.report()['notification/createNotification']
+
+    assert set(stages) == {'build', 'encode', 'decode'} | network_stages
+    assert stages['build']['calls'] == 2
+    assert stages['decode']['total'] >= stages['decode']['max'] > 0
+
+
+@pytest.mark.parametrize('transport_class, network_stages', [
+    (RequestsTransport, {'request', 'download'}),
+    (HTTPClientTransport, {'connect', 'send', 'wait', 'download'}),
+])
+def test_profiler_times_streamed_batches(local_server, transport_class, network_stages):
+    profiler = StageProfiler()
+    intellipush = Intellipush(
+        key='key',
+        secret='secret',
+        base_url=local_server.base_url,
+        transport=transport_class(),
+        profiler=profiler,
+    )
+
+    rows = intellipush.send_smses_iter([SMS(message='foo', receivers=[('0047', '12345678')])])
+
+    assert profiler.report()['notification/createBatch'].keys() <= {'build', 'encode'} | network_stages
+    assert [row['success'] for row in rows] == [True]
+
+    stages = profiler.report()['notification/createBatch']
+
+    assert set(stages) == {'build', 'encode', 'decode', 'error_scan'} | network_stages
+    assert stages['download']['calls'] == 1
+
+
+def test_profiler_formats_table_and_collapsed_stacks():
+    profiler = StageProfiler()
+    profiler.add('notification/createBatch', 'decode', 0.002)
+    profiler.add('notification/createBatch', 'build', 0.001)
+    profiler.add('notification/createBatch', 'build', 0.003)
+
+    assert profiler.collapsed() == (
+        'intellipush;notification/createBatch;build 4000\n'
+        'intellipush;notification/createBatch;decode 2000\n'
+    )
+    assert '66.7' in profiler.format_table().splitlines()[1]
@@ -0,0 +1,64 @@
+from intellipush.client import Intellipush
+from intellipush.messages import SMS
+from intellipush.results import BatchResultStore, iter_results
+
+
+def row(index):
+    if index % 4 == 3:
+        return {'success': False, 'errorcode': 5, 'status_message': 'Invalid phone number'}
+
+    return {'success': True, 'data': {'id': index}}
+
+
+def test_store_keeps_counts_and_failed_positions(tmpdir):
+    path = str(tmpdir.join('results.jsonl'))
+
+    with BatchResultStore(path) as store:
+        store.add(row(index) for index in range(6))
+        store.add([row(index) for index in range(6, 10)] + [None])
+
+        assert store.summary() == {'total': 11, 'succeeded': 8, 'failed': 3, 'error_codes': {5: 2, None: 1}}
+        assert store.failed_indexes() == [3, 7, 10]
+        assert [index for index, _ in store.failed_rows()] == [3, 7, 10]
+        assert list(store.failed_rows())[0][1]['errorcode'] == 5
+
+    assert [r['data']['id'] for r in iter_results(path) if r and r['success']] == [0, 1, 2, 4, 5, 6, 8, 9]
+
+
+def test_send_smses_streams_rows_to_store(tmpdir, mocker):
+    intellipush = Intellipush(key='key', secret='secret')
+    mocked_iter = mocker.patch.object(intellipush, 'send_smses_iter', side_effect=lambda smses: (
+        row(int(receiver[1])) for sms in smses for receiver in sms.receivers
+    ))
+    smses = (SMS(message='Hi', receivers=[('0047', str(index))]) for index in range(10))
+
+    store = BatchResultStore(str(tmpdir.join('results.jsonl'))).send_smses(intellipush, smses, chunk_size=4)
+
+    assert mocked_iter.call_count == 3
+    assert store.total == 10
+    assert store.failed_indexes() == [3, 7]
+    assert len(list(store.rows())) == 10
+
+
+def test_send_smses_splits_receivers_and_fills_rejected_batches(tmpdir, mocker):
+    intellipush = Intellipush(key='key', secret='secret')
+    rejection = {'success': False, 'errorcode': 12, 'status_message': 'Insufficient credits'}
+
+    def send_smses_iter(smses):
+        receivers = [receiver for sms in smses for receiver in sms.receivers]
+
+        if receivers[0][1] == '4':
+            return iter([rejection])
+
+        return ({'success': True, 'data': {'receiver': receiver[1]}} for receiver in receivers)
+
+    mocked_iter = mocker.patch.object(intellipush, 'send_smses_iter', side_effect=send_smses_iter)
+    smses = [SMS(message='Hi', receivers=[('0047', str(index)) for index in range(10)])]
+
+    store = BatchResultStore(str(tmpdir.join('results.jsonl'))).send_smses(intellipush, smses, chunk_size=4)
+
+    assert [len(call[0][0][0].receivers) for call in mocked_iter.call_args_list] == [4, 4, 2]
+    assert store.total == 10
+    assert store.failed_indexes() == [4, 5, 6, 7]
+    assert store.summary()['error_codes'] == {12: 4}
+    assert [r['data']['receiver'] for r in store.rows() if r['success']] == ['0', '1', '2', '3', '8', '9']
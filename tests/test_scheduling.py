@@ -0,0 +1,103 @@
+import datetime
+import socket
+
+import pytest
+
+from intellipush.client import Intellipush, IntellipushException
+from intellipush.messages import SMS
+from intellipush.scheduling import SchedulePlanner
+
+
+@pytest.fixture
+def client(mocker):
+    client = Intellipush(key='key', secret='secret')
+    # The chunks are sent concurrently - the ids are derived from the messages so they don't depend on the order
+    mocker.patch.object(client, '_send_batch', side_effect=lambda batch: [
+        {'success': True, 'data': {'id': 'id-' + row['text_message']}} for row in batch
+    ])
+    mocker.patch.object(client, '_post')
+    mocker.patch.object(client, 'delete_sms')
+    return client
+
+
+def test_planner_groups_and_chunks_by_send_time(client):
+    first = datetime.datetime(2030, 1, 1, 10, 0)
+    second = datetime.datetime(2030, 1, 1, 11, 0)
+    planner = SchedulePlanner(client, chunk_size=2)
+
+    for index in range(3):
+        planner.add('a%d' % index, SMS(message='foo%d' % index, receivers=[('0047', '1234')], when=first))
+
+    planner.add('b', SMS(message='bar', receivers=[('0047', '1234')], when=second))
+
+    assert planner.submit() == []
+    assert sorted(len(call[0][0]) for call in client._send_batch.call_args_list) == [1, 1, 2]
+    assert sorted(planner.keys_at(first)) == ['a0', 'a1', 'a2']
+    assert planner.notification_ids('b') == ['id-bar']
+
+
+def test_planner_reschedules_and_cancels_groups(client):
+    first = datetime.datetime(2030, 1, 1, 10, 0)
+    moved = datetime.datetime(2030, 1, 2, 8, 30)
+    planner = SchedulePlanner(client)
+
+    for index in range(3):
+        planner.add(index, SMS(message=str(index), receivers=[('0047', '1234')], when=first))
+
+    planner.submit()
+
+    assert planner.reschedule_group(first, moved) == 3
+    data = client._post.call_args[1]['data']
+    assert data['date'] == '2030-01-02'
+    assert data['time'] == '08:30:00'
+    assert data['notification_id'] in ('id-0', 'id-1', 'id-2')
+    assert planner.keys_at(first) == []
+
+    assert planner.cancel_group(moved) == 3
+    assert client.delete_sms.call_count == 3
+    assert planner.notification_ids(0) == []
+
+
+def test_planner_requires_scheduled_messages(client):
+    with pytest.raises(IntellipushException):
+        SchedulePlanner(client).add('a', SMS(message='foo', receivers=[('0047', '1234')]))
+
+
+def test_planner_indexes_chunks_sent_before_another_chunk_fails(client, mocker):
+    when = datetime.datetime(2030, 1, 1, 10, 0)
+    error = socket.timeout('timed out')
+
+    def send_batch(batch):
+        if batch[0]['text_message'] == 'late':
+            raise error
+
+        return [{'success': True, 'data': {'id': 'id-' + row['text_message']}} for row in batch]
+
+    client._send_batch.side_effect = send_batch
+    planner = SchedulePlanner(client, chunk_size=1, retries=2)
+    planner.add('a', SMS(message='early', receivers=[('0047', '1234')], when=when))
+    planner.add('b', SMS(message='late', receivers=[('0047', '1234')], when=when))
+
+    assert planner.submit() == [('b', error)]
+    assert planner.notification_ids('a') == ['id-early']
+    # The timed out batch may have reached the API - it isn't sent again
+    assert client._send_batch.call_count == 2
+
+
+def test_planner_keeps_index_entries_the_api_rejected(client):
+    when = datetime.datetime(2030, 1, 1, 10, 0)
+    moved = datetime.datetime(2030, 1, 2, 8, 30)
+    planner = SchedulePlanner(client)
+
+    for key in ('a', 'b'):
+        planner.add(key, SMS(message=key, receivers=[('0047', '1234')], when=when))
+
+    planner.submit()
+    client._post.side_effect = lambda endpoint, data: None if data['notification_id'] == 'id-a' else {'id': 1}
+    client.delete_sms.side_effect = lambda notification_id: None if notification_id == 'id-b' else {'id': 1}
+
+    assert planner.reschedule(['a', 'b'], moved) == 1
+    assert planner.keys_at(when) == ['a']
+    assert planner.cancel(['a', 'b']) == 1
+    assert planner.notification_ids('a') == []
+    assert planner.notification_ids('b') == ['id-b']
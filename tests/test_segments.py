@@ -0,0 +1,78 @@
+import urllib.parse
+
+import pytest
+
+from intellipush.client import Intellipush
+from intellipush.contacts import ContactFilter
+from intellipush.messages import SMS
+from intellipush.segments import SegmentEvaluator
+
+
+contacts = [
+    {'id': 1, 'sex': 'male', 'country': 'Norway', 'age': 30},
+    {'id': 2, 'sex': 'female', 'country': 'Norway', 'age': 41},
+    {'id': 3, 'sex': 'female', 'country': 'Sweden', 'age': '30'},
+    {'id': 4, 'sex': 'female', 'country': 'Norway', 'age': 30},
+    {'id': 5, 'sex': None, 'country': 'Norway'},
+]
+
+
+def test_segment_evaluator_counts_and_selects():
+    segments = SegmentEvaluator(contacts)
+
+    assert segments.count(ContactFilter()) == 5
+    assert segments.count(ContactFilter(country='Norway')) == 4
+    assert segments.count(ContactFilter(sex='female', age=30)) == 2
+    assert segments.count(ContactFilter(country='Denmark')) == 0
+    assert [contact['id'] for contact in segments.select(ContactFilter(sex='female'), limit=2)] == [2, 3]
+    assert segments.counts({'men': ContactFilter(sex='male'), 'all': ContactFilter()}) == {'men': 1, 'all': 5}
+
+
+def test_segment_evaluator_selects_across_many_contacts():
+    segments = SegmentEvaluator([{'id': index, 'param1': str(index % 7)} for index in range(10000)])
+
+    selected = segments.select(ContactFilter(param1='3'))
+
+    assert len(selected) == segments.count(ContactFilter(param1='3')) == 1429
+    assert [contact['id'] for contact in selected[:3]] == [3, 10, 17]
+
+
+def test_segment_evaluator_keeps_unique_values_as_positions():
+    segments = SegmentEvaluator([
+        {'id': index, 'param1': str(index), 'param2': str(index % 2)} for index in range(50000)
+    ])
+
+    assert segments.count(ContactFilter(param1='49999')) == 1
+    assert [contact['id'] for contact in segments.select(ContactFilter(param1='12345', param2='1'))] == [12345]
+    assert segments.count(ContactFilter(param1='12345', param2='0')) == 0
+    assert all(isinstance(bits, tuple) for bits in segments._bitmaps['param1'].values())
+    assert all(isinstance(bits, int) for bits in segments._bitmaps['param2'].values())
+
+
+def test_contact_list_size_sends_filter(mocker):
+    intellipush = Intellipush(key='key', secret='secret')
+    mocked_post = mocker.patch.object(intellipush, '_post', return_value={'amount': '12'})
+
+    assert intellipush.contact_list_size(contact_list_id=5, contact_list_filter=ContactFilter(sex='female')) == 12
+
+    args, kwargs = mocked_post.call_args
+    assert args[1] == {'contactlist_id': 5, 'contactlist_filter': {'sex': 'female'}}
+
+
+def test_contact_list_send_encodes_filter(mocker):
+    intellipush = Intellipush(key='key', secret='secret')
+    mocked_send = mocker.patch.object(intellipush, '_send_request')
+    mocked_send.return_value.status_code = 200
+    mocked_send.return_value.content = b'{"success": true, "data": {"id": 1}}'
+
+    intellipush.send_sms(SMS(message='Hi', contact_list_id=5, contact_list_filter=ContactFilter(country='Norway')))
+
+    body = urllib.parse.parse_qs(mocked_send.call_args[0][1].decode('utf-8'))
+    assert body['contact_list_id'] == ['5']
+    assert body['contact_list_filter[country]'] == ['Norway']
+    assert 'single_target' not in body
+
+
+def test_contact_list_filter_must_be_a_contact_filter():
+    with pytest.raises(TypeError):
+        Intellipush(key='key', secret='secret').contact_list_size(contact_list_id=5, contact_list_filter={'sex': 'male'})
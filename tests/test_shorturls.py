@@ -0,0 +1,54 @@
+from intellipush.client import Intellipush
+from intellipush.contacts import Target
+from intellipush.shorturls import ShorturlIndex
+
+
+def shorturl(shorturl_id, **kwargs):
+    data = {'id': str(shorturl_id), 'short_url': 'https://ipush.me/c%d' % shorturl_id, 'long_url': 'https://example.com'}
+    data.update(kwargs)
+    return data
+
+
+def test_index_syncs_all_pages(mocker):
+    client = Intellipush(key='key', secret='secret')
+    pages = {1: [shorturl(1), shorturl(2)], 2: [shorturl(3, email='a@example.com')]}
+    mocked = mocker.patch.object(client, 'shorturls', side_effect=lambda **kw: pages.get(kw['page'], []))
+
+    index = ShorturlIndex()
+    assert index.sync(client, items=2) == 3
+    assert mocked.call_args[1]['include_children'] is True
+    assert index.get(shorturl_id=2)['id'] == '2'
+    assert index.get(shorturl='c3')['id'] == '3'
+    assert index.get(shorturl='http://ipush.me/c1')['id'] == '1'
+    assert [s['id'] for s in index.for_target(Target(email='a@example.com'))] == ['3']
+
+
+def test_client_serves_lookups_and_updates_index(mocker):
+    index = ShorturlIndex()
+    client = Intellipush(key='key', secret='secret', shorturl_index=index)
+    mocked_post = mocker.patch.object(client, '_post', return_value=shorturl(10))
+    target = Target(email='b@example.com')
+
+    client.create_shorturl(url='https://example.com', parent_url_id=1, target=target)
+    mocked_post.reset_mock()
+
+    assert client.shorturl(shorturl='https://ipush.me/c10')['id'] == '10'
+    assert client.shorturl(shorturl_id=10)['id'] == '10'
+    assert index.for_target(target)[0]['id'] == '10'
+    assert not mocked_post.called
+
+    client.shorturl(shorturl_id=11)
+    assert mocked_post.called
+
+
+def test_index_save_and_load(tmp_path):
+    index = ShorturlIndex()
+    index.add(shorturl(1))
+    index.add(shorturl(2), target=Target(contact_id=5))
+    index.save(str(tmp_path / 'shorturls.jsonl.gz'))
+
+    loaded = ShorturlIndex()
+    assert loaded.load(str(tmp_path / 'shorturls.jsonl.gz')) == 2
+    assert loaded.get(shorturl='c2')['id'] == '2'
+    assert len(loaded) == 2
+    assert loaded.for_target(Target(contact_id=5))[0]['id'] == '2'
@@ -0,0 +1,51 @@
+import threading
+
+from intellipush.client import Intellipush
+from intellipush.statistics import StatisticsSampler
+
+
+def stats(unsent, contacts=10):
+    return {'numberOf': {'unsentNotifications': unsent, 'contacts': contacts, 'contactlists': 1}}
+
+
+def test_sampler_computes_rates(mocker):
+    client = Intellipush(key='key', secret='secret')
+    mocker.patch.object(client, 'statistics', side_effect=[stats(100, 10), stats(40, 16)])
+    mocked_time = mocker.patch('intellipush.statistics.time.monotonic', side_effect=[100.0, 102.0])
+
+    sampler = StatisticsSampler(client)
+    sampler.sample()
+    sampler.sample()
+
+    assert sampler.latest().unsent == 40
+    assert sampler.rates() == {'drain_rate': 30.0, 'contact_growth': 3.0}
+    assert mocked_time.call_count == 2
+
+
+def test_sampler_backs_off_when_queue_is_unchanged(mocker):
+    client = Intellipush(key='key', secret='secret')
+    mocker.patch.object(client, 'statistics', side_effect=[stats(5), stats(5), stats(5), stats(4)])
+    sampler = StatisticsSampler(client, min_interval=1, max_interval=3, backoff=2)
+
+    intervals = []
+
+    for _ in range(4):
+        sampler.sample()
+        intervals.append(sampler.interval)
+
+    assert intervals == [1, 2, 3, 1]
+
+
+def test_wait_for_capacity(mocker):
+    client = Intellipush(key='key', secret='secret')
+    mocker.patch.object(client, 'statistics', side_effect=[stats(500), stats(50)])
+    sampler = StatisticsSampler(client)
+    sampler.sample()
+
+    assert sampler.should_throttle(max_unsent=100)
+    assert not sampler.wait_for_capacity(max_unsent=100, timeout=0.01)
+
+    timer = threading.Timer(0.05, sampler.sample)
+    timer.start()
+    assert sampler.wait_for_capacity(max_unsent=100, timeout=5)
+    timer.join()
@@ -0,0 +1,98 @@
+import asyncio
+
+from intellipush.client import Intellipush, ServerSideException
+from intellipush.tracking import StatusTracker
+
+
+def test_tracker_records_changes_and_stops_on_final_state(mocker):
+    client = Intellipush(key='key', secret='secret')
+    responses = {
+        1: iter([{'status': 'queued'}, {'status': 'sent'}]),
+        2: iter([{'status': 'queued'}, {'status': 'queued'}, {'status': 'failed'}]),
+    }
+    mocked_fetch = mocker.patch.object(client, 'fetch_sms', side_effect=lambda sms_id: next(responses[sms_id]))
+    seen = []
+
+    tracker = StatusTracker(client, on_change=seen.append, initial_interval=0, max_interval=0)
+    tracker.track_response([
+        {'success': True, 'data': {'id': 1}},
+        {'success': True, 'data': {'id': 2}},
+        {'success': False, 'errorcode': 1},
+    ])
+
+    changes = list(tracker.changes())
+
+    assert mocked_fetch.call_count == 5
+    assert tracker.statuses() == {1: 'sent', 2: 'failed'}
+    assert tracker.pending == 0
+    assert seen == changes
+    assert [(c.notification_id, c.current) for c in changes if c.final] == [(1, 'sent'), (2, 'failed')]
+
+
+def test_tracker_backs_off_for_unchanged_status(mocker):
+    client = Intellipush(key='key', secret='secret')
+    mocker.patch.object(client, 'fetch_sms', return_value={'status': 'queued'})
+
+    tracker = StatusTracker(client, [1], initial_interval=10, max_interval=25, backoff=2)
+    tracker.poll()
+    assert tracker._intervals[1] == 10
+
+    tracker._schedule = [(0, 1)]
+    tracker.poll()
+    assert tracker._intervals[1] == 20
+
+    tracker._schedule = [(0, 1)]
+    tracker.poll()
+    assert tracker._intervals[1] == 25
+
+
+def test_tracker_async_iteration(mocker):
+    client = Intellipush(key='key', secret='secret')
+    mocker.patch.object(client, 'fetch_sms', return_value=None)
+    tracker = StatusTracker(client, [1, 2], initial_interval=0, missing_limit=2)
+
+    async def collect():
+        return [change async for change in tracker]
+
+    changes = asyncio.run(collect())
+    assert sorted(change.notification_id for change in changes) == [1, 2]
+    assert all(change.current == 'deleted' for change in changes)
+
+
+def test_tracker_keeps_polling_notifications_that_fail(mocker):
+    client = Intellipush(key='key', secret='secret')
+    mocker.patch('time.sleep')
+    errors = []
+
+    def fetch_sms(sms_id):
+        if sms_id == 1:
+            raise ServerSideException('Server generated an error code: 502: Bad Gateway')
+
+        if sms_id == 2:
+            return None
+
+        return {'status': 'sent'}
+
+    mocked_fetch = mocker.patch.object(client, 'fetch_sms', side_effect=fetch_sms)
+    tracker = StatusTracker(client, [1, 2, 3], on_error=lambda *error: errors.append(error), initial_interval=10)
+
+    changes = tracker.poll()
+
+    assert [(change.notification_id, change.current) for change in changes] == [(3, 'sent')]
+    assert [call[0][0] for call in mocked_fetch.call_args_list].count(1) == 2
+    assert [notification_id for notification_id, _ in errors] == [1]
+    assert tracker.statuses() == {1: None, 2: None, 3: 'sent'}
+    assert tracker.pending == 2
+    assert sorted(notification_id for _, notification_id in tracker._schedule) == [1, 2]
+    assert tracker.next_poll_in() is not None
+
+
+def test_tracker_only_retries_transport_and_server_errors(mocker):
+    client = Intellipush(key='key', secret='secret')
+    mocked_fetch = mocker.patch.object(client, 'fetch_sms', side_effect=ValueError('bug'))
+    tracker = StatusTracker(client, [1])
+
+    tracker.poll()
+
+    assert mocked_fetch.call_count == 1
+    assert tracker.pending == 1
@@ -0,0 +1,307 @@
+import asyncio
+import concurrent.futures
+import gzip
+import json
+import subprocess
+import sys
+import time
+import urllib.parse
+
+import pytest
+
+from intellipush.client import Intellipush
+from intellipush.messages import SMS
+from intellipush.transports import HTTP2Transport, HTTPClientTransport, RequestsTransport, Response
+
+
+@pytest.mark.parametrize('transport_class', [RequestsTransport, HTTPClientTransport])
+def test_transport_posts_form_data(local_server, transport_class):
+    intellipush = Intellipush(key='key', secret='secret', base_url=local_server.base_url, transport=transport_class())
+
+    first = intellipush.fetch_sms(sms_id='123')
+    intellipush.fetch_sms(sms_id='456')
+
+    assert first['path'] == '/api/notification/getNotification'
+    assert 'notification_id=123' in first['body']
+    assert 'appID=key' in first['body']
+    assert len(local_server.received) == 2
+
+
+def test_http_client_transport_reuses_connections(local_server):
+    transport = HTTPClientTransport()
+    intellipush = Intellipush(key='key', secret='secret', base_url=local_server.base_url, transport=transport)
+
+    intellipush.fetch_sms(sms_id='1')
+    connection = transport._idle[('http', local_server.base_url.split('/')[2])][0]
+    intellipush.fetch_sms(sms_id='2')
+
+    assert transport._idle[('http', local_server.base_url.split('/')[2])] == [connection]
+
+
+def test_http_client_transport_retries_stale_kept_alive_connection(mocker):
+    import http.client
+
+    transport = HTTPClientTransport()
+    stale, fresh = mocker.Mock(), mocker.Mock()
+    response = mocker.Mock()
+    mocker.patch.object(transport, '_acquire', side_effect=[(stale, True), (fresh, False)])
+    request = mocker.patch.object(transport, '_request', side_effect=[http.client.RemoteDisconnected(), response])
+
+    assert transport._send('http://localhost/api/foo', b'', None) == (('http', 'localhost'), fresh, response)
+    assert [call[0][0] for call in request.call_args_list] == [stale, fresh]
+    stale.close.assert_called_once_with()
+
+
+@pytest.mark.parametrize('error', [TimeoutError('timed out'), OSError('network is unreachable')])
+def test_http_client_transport_does_not_retry_ambiguous_failures(mocker, error):
+    transport = HTTPClientTransport()
+    connection = mocker.Mock()
+    mocker.patch.object(transport, '_acquire', return_value=(connection, True))
+    request = mocker.patch.object(transport, '_request', side_effect=error)
+
+    with pytest.raises(type(error)):
+        transport._send('http://localhost/api/foo', b'', None)
+
+    assert request.call_count == 1
+    connection.close.assert_called_once_with()
+
+
+def test_importing_client_does_not_import_requests():
+    loaded = subprocess.check_output([
+        sys.executable, '-c', 'import sys, intellipush.client; print("requests" in sys.modules)',
+    ])
+
+    assert loaded.strip() == b'False'
+
+
+@pytest.mark.parametrize('transport_class', [RequestsTransport, HTTPClientTransport])
+def test_transport_streams_response(local_server, transport_class):
+    transport = transport_class()
+    status_code, reason, chunks = transport.post_stream(local_server.base_url + '/foo', data='a=b', chunk_size=8)
+    chunks = list(chunks)
+
+    assert status_code == 200
+    assert len(chunks) > 1
+    assert b'"path": "/api/foo"' in b''.join(chunks)
+
+
+def test_send_smses_iter_yields_rows_and_records_first_error(mocker):
+    transport = HTTPClientTransport()
+    intellipush = Intellipush(key='key', secret='secret', transport=transport)
+    body = json.dumps([
+        {'success': True, 'data': {'id': 1}},
+        {'success': False, 'errorcode': 7, 'status_message': 'Invalid number'},
+        {'success': True, 'data': {'id': 3}},
+    ]).encode('utf-8')
+    mocked_stream = mocker.patch.object(transport, 'post_stream', return_value=(
+        200, 'OK', iter([body[offset:offset + 10] for offset in range(0, len(body), 10)]),
+    ))
+
+    rows = intellipush.send_smses_iter([SMS(message='foo', receivers=[('0047', '1'), ('0047', '2'), ('0047', '3')])])
+
+    assert next(rows)['data']['id'] == 1
+    assert intellipush.last_error_code is None
+    assert [row['success'] for row in rows] == [False, True]
+    assert intellipush.last_error_code == 7
+    assert b'batch%5B2%5D%5Bsingle_target%5D=3' in mocked_stream.call_args[1]['data']
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'deflate'])
+def test_large_request_bodies_are_compressed(local_server, compression):
+    intellipush = Intellipush(
+        key='key',
+        secret='secret',
+        base_url=local_server.base_url,
+        transport=HTTPClientTransport(),
+        compression=compression,
+        compression_min_size=1000,
+        compression_endpoints=['notification/createBatch'],
+    )
+
+    intellipush.send_smses([SMS(message='x' * 2000, receivers=[('0047', '1234')])])
+    intellipush.fetch_sms(sms_id='1' * 2000)
+
+    (_, batch_headers, batch_body), (_, fetch_headers, _) = local_server.received
+    assert batch_headers['Content-Encoding'] == compression
+    assert len(batch_body) < 1000
+    assert 'Content-Encoding' not in fetch_headers
+
+
+def test_compression_falls_back_when_endpoint_rejects_it(mocker):
+    transport = HTTPClientTransport()
+    intellipush = Intellipush(key='key', secret='secret', transport=transport, compression='gzip', compression_min_size=0)
+    mocked_post = mocker.patch.object(transport, 'post', side_effect=[
+        Response(415, 'Unsupported Media Type', b''),
+        Response(200, 'OK', b'{"success": true, "data": {"id": 1}}'),
+        Response(200, 'OK', b'{"success": true, "data": {"id": 1}}'),
+    ])
+
+    assert intellipush.fetch_sms(sms_id='1') == {'id': 1}
+    assert intellipush.fetch_sms(sms_id='1') == {'id': 1}
+
+    encodings = [call[1]['headers'].get('Content-Encoding') for call in mocked_post.call_args_list]
+    assert encodings == ['gzip', None, None]
+
+
+def test_http_client_transport_decompresses_responses(mocker):
+    transport = HTTPClientTransport()
+    response = mocker.Mock(status=200, reason='OK', will_close=True)
+    response.read.return_value = gzip.compress(b'{"success": true, "data": 1}')
+    response.getheader.return_value = 'gzip'
+    response.getheaders.return_value = []
+    mocker.patch.object(transport, '_send', return_value=(('http', 'localhost'), mocker.Mock(), response))
+
+    assert transport.post('http://localhost/api/foo', data=b'').json() == {'success': True, 'data': 1}
+
+
+def test_http2_transport_requires_httpx(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'httpx', None)
+
+    with pytest.raises(ImportError, match='httpx'):
+        HTTP2Transport().post('http://localhost/api/foo', data=b'')
+
+
+def test_send_sms_async_runs_in_executor_without_async_transport(local_server):
+    transport = HTTPClientTransport()
+    intellipush = Intellipush(key='key', secret='secret', base_url=local_server.base_url, transport=transport)
+
+    async def send():
+        return await asyncio.gather(*(
+            intellipush.send_sms_async(SMS(message='Hello %d' % index, receivers=[('0047', '9000000%d' % index)]))
+            for index in range(3)
+        ))
+
+    responses = asyncio.run(send())
+
+    assert [response['path'] for response in responses] == ['/api/notification/createNotification'] * 3
+    assert len(local_server.received) == 3
+
+
+def test_send_sms_async_uses_post_async(mocker):
+    transport = HTTPClientTransport()
+    transport.post_async = mocker.AsyncMock(return_value=Response(200, 'OK', b'{"success": true, "data": {"id": 1}}'))
+    mocker.patch.object(transport, 'post')
+    intellipush = Intellipush(key='key', secret='secret', transport=transport)
+
+    response = asyncio.run(intellipush.send_sms_async(SMS(message='Hello', receivers=[('0047', '90000000')])))
+
+    assert response == {'id': 1}
+    assert not transport.post.called
+    assert b'appID=key' in transport.post_async.call_args[1]['data']
+
+
+def test_post_async_is_recorded_and_profiled(mocker, tmpdir):
+    from intellipush.capture import TrafficRecorder, read_capture
+    from intellipush.profiling import StageProfiler
+
+    transport = HTTPClientTransport()
+    transport.post_async = mocker.AsyncMock(return_value=Response(200, 'OK', b'{"success": true, "data": {"id": 1}}'))
+    path = str(tmpdir.join('capture.jsonl'))
+    profiler = StageProfiler()
+
+    with TrafficRecorder(path) as recorder:
+        intellipush = Intellipush(key='key', secret='s3cret', transport=transport, recorder=recorder, profiler=profiler)
+        asyncio.run(intellipush.send_sms_async(SMS(message='Hello', receivers=[('0047', '90000000')])))
+
+    entries = list(read_capture(path))
+
+    assert [entry['endpoint'] for entry in entries] == ['notification/createNotification']
+    assert entries[0]['status'] == 200 and 's3cret' not in entries[0]['request']
+    assert set(profiler.report()['notification/createNotification']) >= {'encode', 'request', 'decode'}
+
+
+def test_http2_transport_creates_an_async_client_for_each_event_loop(mocker):
+    httpx = mocker.Mock()
+    httpx.AsyncClient.side_effect = lambda **options: mocker.AsyncMock()
+    mocker.patch.object(HTTP2Transport, '_httpx', return_value=httpx)
+    transport = HTTP2Transport()
+
+    async def clients():
+        first = transport.async_client
+        assert transport.async_client is first
+        await transport.aclose()
+        first.aclose.assert_awaited_once_with()
+        return first, transport.async_client
+
+    first_loop = asyncio.run(clients())
+    second_loop = asyncio.run(clients())
+
+    assert first_loop[0] is not first_loop[1]
+    assert second_loop[0] not in first_loop
+
+
+def test_http2_transport_posts_form_data(local_server):
+    pytest.importorskip('httpx')
+    pytest.importorskip('h2')
+    transport = HTTP2Transport()
+    intellipush = Intellipush(key='key', secret='secret', base_url=local_server.base_url, transport=transport)
+
+    # Without TLS the transport falls back to HTTP/1.1 unless `prior_knowledge` is set
+    response = intellipush.fetch_sms(sms_id='123')
+
+    assert response['path'] == '/api/notification/getNotification'
+    assert 'appID=key' in response['body']
+
+
+def test_http2_transport_sends_from_threads_through_one_event_loop(local_server):
+    pytest.importorskip('httpx')
+    pytest.importorskip('h2')
+    transport = HTTP2Transport()
+    intellipush = Intellipush(key='key', secret='secret', base_url=local_server.base_url, transport=transport)
+
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        responses = list(executor.map(lambda index: intellipush.fetch_sms(sms_id=str(index)), range(20)))
+
+    loop = transport._loop
+    transport.close()
+    deadline = time.monotonic() + 2
+
+    while not loop.is_closed() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert all(response['path'] == '/api/notification/getNotification' for response in responses)
+    assert len(local_server.received) == 20
+    assert transport._loop is None and loop.is_closed()
+
+
+def test_post_does_not_mutate_data_and_adds_defaults(mocker):
+    transport = HTTPClientTransport()
+    mocker.patch.object(transport, 'post', return_value=Response(200, 'OK', b'{"success": true, "data": {"id": 1}}'))
+    intellipush = Intellipush(key='key', secret='secret', transport=transport)
+    data = {'notification_id': '123'}
+
+    intellipush._post('notification/getNotification', data=data)
+
+    assert data == {'notification_id': '123'}
+    body = urllib.parse.parse_qs(transport.post.call_args[1]['data'].decode('utf-8'))
+    assert body['notification_id'] == ['123']
+    assert body['api_secret'] == ['secret']
+    assert body['appID'] == ['key']
+    assert body['v'] == ['4.0']
+    assert body['s'] == ['python']
+    assert abs(int(body['t'][0]) - time.time()) < 5
+
+
+def test_batch_rejected_as_a_whole_is_reported_as_an_error(mocker):
+    transport = HTTPClientTransport()
+    mocker.patch.object(transport, 'post', return_value=Response(
+        200, 'OK', b'{"success": false, "errorcode": 5, "status_message": "Invalid credentials"}',
+    ))
+    intellipush = Intellipush(key='key', secret='secret', transport=transport)
+    smses = [SMS(message='foo', receivers=[('0047', '1234')]), SMS(message='bar', receivers=[('0047', '5678')])]
+
+    assert intellipush.send_smses(smses) is None
+    assert intellipush.last_error_code == 5
+    assert intellipush.last_error_message == 'Invalid credentials'
+
+
+def test_request_templates_are_reused_until_credentials_change():
+    intellipush = Intellipush(key='key', secret='secret', transport=HTTPClientTransport())
+    template = intellipush._template('notification/getNotification')
+
+    assert intellipush._template('notification/getNotification') is template
+    assert template.url == 'https://www.intellipush.com/api/notification/getNotification'
+
+    intellipush.secret = 'rotated'
+
+    assert b'api_secret=rotated' in intellipush._template('notification/getNotification').prefix
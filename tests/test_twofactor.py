@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from intellipush.client import Intellipush, TwoFactorAuthenticationIsAlreadyActive
+from intellipush.transports import HTTPClientTransport
+from intellipush.twofactor import TwoFactorRateLimitExceeded, TwoFactorService
+
+
+@pytest.fixture
+def client():
+    return Intellipush(key='key', secret='secret')
+
+
+def test_send_is_skipped_while_code_is_active(client, mocker):
+    mocked_send = mocker.patch.object(client, 'two_factor_send', return_value={'id': 1})
+    service = TwoFactorService(client)
+
+    assert service.send('0047', '1234') == {'id': 1}
+    assert service.send('0047', '1234') == {'id': 1}
+    assert mocked_send.call_count == 1
+    assert service.has_active_code('0047', '1234')
+
+
+def test_validate_uses_dedicated_client_and_clears_active_code(client, mocker):
+    mocker.patch.object(client, 'two_factor_send', return_value={'id': 1})
+    transport = HTTPClientTransport(pool_size=20)
+    service = TwoFactorService(client, validation_transport=transport)
+    mocked_validate = mocker.patch.object(service.validation_client, 'two_factor_validate', return_value=True)
+
+    service.send('0047', '1234')
+    assert service.validate('0047', '1234', '0000')
+    assert mocked_validate.called
+    assert service.validation_client.transport is transport
+    assert not service.has_active_code('0047', '1234')
+
+
+def test_validation_uses_client_without_validation_transport(client, mocker):
+    mocker.patch.object(client, 'two_factor_send', return_value={'id': 1})
+    service = TwoFactorService(client)
+
+    assert service.validation_client is client
+
+
+def test_wrong_code_or_failed_validation_keeps_active_code(client, mocker):
+    mocked_send = mocker.patch.object(client, 'two_factor_send', return_value={'id': 1})
+    service = TwoFactorService(client)
+    mocker.patch.object(client, 'two_factor_validate', side_effect=[False, OSError('Connection reset'), True])
+
+    service.send('0047', '1234')
+    assert not service.validate('0047', '1234', '0000')
+
+    with pytest.raises(OSError):
+        service.validate('0047', '1234', '1111')
+
+    assert service.has_active_code('0047', '1234')
+    service.send('0047', '1234')
+    assert mocked_send.call_count == 1
+    assert service.validate('0047', '1234', '2222')
+    assert not service.has_active_code('0047', '1234')
+
+
+def test_concurrent_sends_to_a_number_reach_the_api_once(client, mocker):
+    def slow_send(**kwargs):
+        time.sleep(0.1)
+        return {'id': 1}
+
+    mocked_send = mocker.patch.object(client, 'two_factor_send', side_effect=slow_send)
+    service = TwoFactorService(client)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(service.send('0047', '1234'))) for _ in range(5)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert results == [{'id': 1}] * 5
+    assert mocked_send.call_count == 1
+
+
+def test_already_active_code_is_remembered(client, mocker):
+    mocked_send = mocker.patch.object(client, 'two_factor_send', side_effect=TwoFactorAuthenticationIsAlreadyActive())
+    service = TwoFactorService(client)
+
+    assert service.send('0047', '1234') == {'hasCode': True}
+    assert service.send('0047', '1234') == {'hasCode': True}
+    assert mocked_send.call_count == 1
+
+
+def test_sends_are_rate_limited_per_number(client, mocker):
+    mocker.patch.object(client, 'two_factor_send', return_value={'id': 1})
+    service = TwoFactorService(client, code_ttl=0, max_sends=2)
+
+    service.send('0047', '1234')
+    service.send('0047', '1234')
+
+    with pytest.raises(TwoFactorRateLimitExceeded):
+        service.send('0047', '1234')
+
+    service.send('0047', '5678')
+
+
+def test_async_variant(client, mocker):
+    mocker.patch.object(client, 'two_factor_send', return_value={'id': 1})
+    service = TwoFactorService(client)
+    mocker.patch.object(service.validation_client, 'two_factor_validate', return_value=False)
+
+    async def login():
+        await service.send_async('0047', '1234')
+        return await service.validate_async('0047', '1234', '0000')
+
+    assert asyncio.run(login()) is False
@@ -1,3 +1,7 @@
+import json
+
+import pytest
+
 from intellipush import utils
 from urllib.parse import unquote
 
@@ -19,4 +23,53 @@ def test_php_encode_batch_array_ignores_none():
         ],
     }
 
-    assert 'batch[0][name]=foo' == unquote(utils.php_encode(struct))
\ No newline at end of file
+    assert 'batch[0][name]=foo' == unquote(utils.php_encode(struct))
+
+def test_concurrent_map_keeps_order_and_retries():
+    attempts = {}
+
+    def flaky(item):
+        attempts[item] = attempts.get(item, 0) + 1
+
+        if item == 3 and attempts[item] == 1:
+            raise ValueError('first attempt fails')
+
+        return item * 2
+
+    assert utils.concurrent_map(flaky, range(5), max_workers=3, retries=1, retry_delay=0) == [0, 2, 4, 6, 8]
+    assert attempts[3] == 2
+
+
+def test_php_encode_scalars():
+    struct = {
+        'page': 2,
+        'include_children': True,
+        'keyword': None,
+    }
+
+    assert 'page=2&include_children=1' == unquote(utils.php_encode(struct))
+
+
+def test_iter_json_array_yields_elements_across_chunks():
+    document = json.dumps([{'id': index, 'text': 'blåbær'} for index in range(5)]).encode('utf-8')
+    chunks = [document[offset:offset + 7] for offset in range(0, len(document), 7)]
+
+    assert list(utils.iter_json_array(chunks)) == json.loads(document)
+    assert list(utils.iter_json_array([b' [', b' ]'])) == []
+    assert list(utils.iter_json_array([b'{"success": ', b'false}'])) == [{'success': False}]
+
+
+def test_iter_json_array_waits_for_numbers_split_across_chunks():
+    assert list(utils.iter_json_array([b'[1', b'23, 4', b'5]'])) == [123, 45]
+    assert list(utils.iter_json_array([b'[-', b'1.', b'5e', b'2', b']'])) == [-150.0]
+    assert list(utils.iter_json_array([b'[7', b'', b'8', b' ', b']'])) == [78]
+
+
+def test_iter_json_array_waits_for_literals_split_across_chunks():
+    assert list(utils.iter_json_array([b'[tr', b'ue, fal', b'se,nu', b'll]'])) == [True, False, None]
+    assert list(utils.iter_json_array([b'[true', b']'])) == [True]
+
+
+def test_iter_json_array_rejects_truncated_documents():
+    with pytest.raises(ValueError):
+        list(utils.iter_json_array([b'[{"id": 1}, {"id"']))